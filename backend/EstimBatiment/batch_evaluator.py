@@ -0,0 +1,233 @@
+# batch_evaluator.py
+"""
+Vectorized evaluation of a whole formula set against one or more 'qt' tables.
+
+The 'qt' data is stored as a dense NumPy matrix (variant x item x header).
+Every 'qt' reference of every compiled formula is fetched with a single
+fancy-indexing gather, then each expression tree is evaluated once over the
+variant axis. Results follow evaluate_formula semantics: a formula that would
+return None yields NaN, a division by zero yields 0.0, and a missing 'qt'
+value counts as 0.0 without being an error (it is only logged at DEBUG).
+"""
+import logging
+
+import numpy as np
+
+from .formula_evaluator import BinaryOp, FormulaError, Negate, Number, Reference, compile_formula
+from .qt_table import MISSING_HEADER, MISSING_ITEM, MISSING_VALUE, NUMERIC, QtTable
+
+logger = logging.getLogger(__name__)
+
+
+class QtMatrix:
+    """
+    Dense view of one or more 'qt' tables (QtTable, or qt_data dicts
+    {item_lower: {header_lower: float or None}}).
+
+    Attributes:
+        item_index (dict): item name -> row index.
+        header_index (dict): header name -> column index.
+        values (ndarray): float64 array (n_variants, n_items + 1, n_headers + 1).
+        state (ndarray): int8 array of the same shape (MISSING_ITEM, MISSING_HEADER,
+                         MISSING_VALUE or NUMERIC). The extra last row and column
+                         stand for unknown items and unknown headers.
+    """
+
+    def __init__(self, qt_variants):
+        tables = [qt_data if isinstance(qt_data, QtTable) else QtTable.from_dict(qt_data) for qt_data in qt_variants]
+        self.item_index = {}
+        self.header_index = {}
+        for table in tables:
+            for item_name in table.item_index:
+                self.item_index.setdefault(item_name, len(self.item_index))
+            for header_name in table.header_index:
+                self.header_index.setdefault(header_name, len(self.header_index))
+
+        shape = (len(tables), len(self.item_index) + 1, len(self.header_index) + 1)
+        self.values = np.zeros(shape, dtype=np.float64)
+        self.state = np.full(shape, MISSING_ITEM, dtype=np.int8)
+        for variant, table in enumerate(tables):
+            # Copy the whole table into its rows/columns of the union at once
+            rows = np.fromiter(map(self.item_index.__getitem__, table.item_index), dtype=np.intp, count=len(table.item_index))
+            cols = np.fromiter(map(self.header_index.__getitem__, table.header_index), dtype=np.intp, count=len(table.header_index))
+            self.state[variant, rows, :] = MISSING_HEADER
+            block = np.ix_(rows, cols)
+            self.values[variant][block] = table.value_matrix
+            self.state[variant][block] = table.state_matrix
+
+    @classmethod
+    def from_qt_data(cls, qt_data):
+        return cls([qt_data])
+
+    @property
+    def n_variants(self):
+        return self.values.shape[0]
+
+    def locate(self, item_name, header_name):
+        """(row, column) of a reference, using the sentinel row/column for unknown names."""
+        return (self.item_index.get(item_name, len(self.item_index)),
+                self.header_index.get(header_name, len(self.header_index)))
+
+
+def _evaluate_node(node, ref_columns, zero_division):
+    """Evaluates an expression tree over the variant axis; flags divisions by zero in 'zero_division'."""
+    if isinstance(node, Number):
+        return node.value
+    if isinstance(node, Reference):
+        return ref_columns[node.index]
+    if isinstance(node, Negate):
+        return -_evaluate_node(node.operand, ref_columns, zero_division)
+    if isinstance(node, BinaryOp):
+        left = _evaluate_node(node.left, ref_columns, zero_division)
+        right = _evaluate_node(node.right, ref_columns, zero_division)
+        if node.op == '+':
+            return left + right
+        if node.op == '-':
+            return left - right
+        if node.op == '*':
+            return left * right
+        zero_division |= np.asarray(right) == 0
+        return left / np.where(np.asarray(right) == 0, 1, right)
+    raise TypeError(f"Unknown formula node: {node!r}")
+
+
+def evaluate_formulas_batch(formulas, qt_matrix, descriptions=None, missing_values=None):
+    """
+    Evaluates every formula against every variant of qt_matrix.
+
+    Args:
+        formulas (list): Formula values as read from the sheets (str, number or None).
+        qt_matrix (QtMatrix): The 'qt' data.
+        descriptions (list, optional): Item description for each formula, used in errors.
+        missing_values (list, optional): Filled with one list per variant of
+            (formula_index, item_name, header_name) for each missing 'qt' value
+            replaced by 0.0. These are not errors.
+
+    Returns:
+        tuple: (quantities, errors)
+               quantities: float64 array (n_variants, n_formulas), NaN where
+                           evaluate_formula would return None.
+               errors: one list per variant of (formula_index, FormulaError).
+    """
+    n_variants = qt_matrix.n_variants
+    quantities = np.zeros((n_variants, len(formulas)), dtype=np.float64)
+    errors = [[] for _ in range(n_variants)]
+
+    # Parse each distinct formula once and collect all references
+    compiled_by_text = {}
+    ref_rows, ref_cols = [], []
+    for formula in formulas:
+        if isinstance(formula, str) and formula.strip() and formula not in compiled_by_text:
+            compiled = compile_formula(formula)
+            compiled_by_text[formula] = (compiled, len(ref_rows))
+            for item_name, header_name, _ in compiled.refs:
+                row, col = qt_matrix.locate(item_name, header_name)
+                ref_rows.append(row)
+                ref_cols.append(col)
+
+    # Single gather of every referenced value: (n_variants, n_refs)
+    gathered_values = qt_matrix.values[:, ref_rows, ref_cols]
+    gathered_state = qt_matrix.state[:, ref_rows, ref_cols]
+
+    # Evaluate each distinct formula once over all variants
+    results_by_text = {}
+    with np.errstate(all='ignore'):
+        for formula, (compiled, first_ref) in compiled_by_text.items():
+            result = np.full(n_variants, np.nan)
+            formula_errors = []
+            formula_missing = []
+            if compiled.error is not None:
+                formula_errors.append((np.ones(n_variants, dtype=bool), compiled.error))
+                results_by_text[formula] = (result, formula_errors, formula_missing)
+                continue
+
+            failed = np.zeros(n_variants, dtype=bool)
+            ref_columns = []
+            for offset, (item_name, header_name, position) in enumerate(compiled.refs):
+                state = gathered_state[:, first_ref + offset]
+                values = np.where(state == NUMERIC, gathered_values[:, first_ref + offset], 0.0)
+                checks = (
+                    (state == MISSING_ITEM, 'missing_item', f"Item '{item_name}' not found in 'qt' data"),
+                    (state == MISSING_HEADER, 'missing_header', f"Header '{header_name}' not found for item '{item_name}' in 'qt'"),
+                    ((state == NUMERIC) & ~np.isfinite(values), 'invalid_value', f"Non-finite value for '{item_name}[{header_name}]'"),
+                )
+                for mask, kind, message in checks:
+                    mask = mask & ~failed
+                    if mask.any():
+                        formula_errors.append((mask, FormulaError(kind, message, formula, position)))
+                        failed |= mask
+                # Only before the first failing reference, where evaluate_formula stops
+                missing_value = (state == MISSING_VALUE) & ~failed
+                if missing_value.any():
+                    formula_missing.append((missing_value, item_name, header_name))
+                ref_columns.append(values)
+
+            zero_division = np.zeros(n_variants, dtype=bool)
+            result = np.asarray(_evaluate_node(compiled.root, ref_columns, zero_division), dtype=np.float64)
+            result = np.broadcast_to(result, (n_variants,)).copy()
+            zero_division &= ~failed
+            if zero_division.any():
+                formula_errors.append((zero_division, FormulaError('division_by_zero', "Division by zero", formula)))
+            result[zero_division] = 0.0
+            result[failed] = np.nan
+            results_by_text[formula] = (result, formula_errors, formula_missing)
+
+    if missing_values is not None:
+        missing_values.extend([] for _ in range(n_variants))
+    for index, formula in enumerate(formulas):
+        if formula in results_by_text:
+            result, formula_errors, formula_missing = results_by_text[formula]
+            quantities[:, index] = result
+            description = descriptions[index] if descriptions is not None else None
+            for mask, error in formula_errors:
+                for variant in np.flatnonzero(mask):
+                    errors[variant].append((index, error.for_item(description)))
+            if missing_values is not None:
+                for mask, item_name, header_name in formula_missing:
+                    for variant in np.flatnonzero(mask):
+                        missing_values[variant].append((index, item_name, header_name))
+        elif isinstance(formula, (int, float)):
+            quantities[:, index] = float(formula)
+    return quantities, errors
+
+
+class BatchQuantities:
+    """
+    Quantities of a formula set for one 'qt' variant, looked up by formula
+    with the same contract as evaluate_formula.
+    """
+
+    def __init__(self, formulas, quantities_row, variant_errors, variant_missing_values=()):
+        errors_by_index = {}
+        for index, error in variant_errors:
+            errors_by_index.setdefault(index, []).append(error)
+        missing_by_index = {}
+        for index, item_name, header_name in variant_missing_values:
+            missing_by_index.setdefault(index, []).append((item_name, header_name))
+        self._by_formula = {}
+        for index, formula in enumerate(formulas):
+            if isinstance(formula, str) and formula not in self._by_formula:
+                self._by_formula[formula] = (quantities_row[index], errors_by_index.get(index, []), missing_by_index.get(index, []))
+
+    @classmethod
+    def evaluate(cls, formulas, qt_matrix):
+        """Evaluates 'formulas' in one batch and returns one BatchQuantities per variant."""
+        missing_values = []
+        quantities, errors = evaluate_formulas_batch(formulas, qt_matrix, missing_values=missing_values)
+        return [cls(formulas, quantities[variant], errors[variant], missing_values[variant]) for variant in range(qt_matrix.n_variants)]
+
+    def get(self, formula, current_item_description="N/A", errors=None):
+        """
+        Returns the quantity of 'formula' (None where evaluate_formula would
+        return None) and reports its errors for the given item.
+        """
+        if not isinstance(formula, str):
+            return float(formula) if isinstance(formula, (int, float)) else 0.0
+        quantity, formula_errors, missing_values = self._by_formula[formula]
+        for item_name, header_name in missing_values:
+            # Same notice as evaluate_formula (frequent: only logged at DEBUG level)
+            logger.debug("(%s): Missing value (None) for '%s[%s]' in 'qt'. Using 0.0.",
+                         current_item_description, item_name, header_name)
+        if errors is not None:
+            errors.extend(error.for_item(current_item_description) for error in formula_errors)
+        return None if np.isnan(quantity) else float(quantity)
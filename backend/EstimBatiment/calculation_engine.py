@@ -1,15 +1,24 @@
 # calculation_engine.py
-import re
+import logging
+import math
 # Import de la fonction d'écriture Excel avec un import relatif (ajout du '.')
-from .excel_writer import create_excel_table_for_block
+from .excel_writer import OutputSheet, create_excel_table_for_block
 # Import de la fonction de conversion nombre-lettre avec un import relatif (ajout du '.')
 from .number_to_letter_converter import conv_number_letter
-from openpyxl.styles import Font, Border, Side, Alignment, PatternFill
+from .formula_evaluator import FormulaError, compile_formula
+from .qt_table import MISSING_HEADER, MISSING_ITEM, qt_lookup
 
-def evaluate_formula(formula_str, qt_data, current_item_description="N/A"):
+logger = logging.getLogger(__name__)
+
+def evaluate_formula(formula_str, qt_data, current_item_description="N/A", errors=None):
     """
     Evaluates a given mathematical formula, replacing 'qt' sheet item references
     with their numerical values. Handles format conversions and errors.
+
+    Formulas are parsed once (see formula_evaluator.compile_formula) and evaluated
+    without eval(). Errors are reported as FormulaError objects (kind, message,
+    position): appended to 'errors' when a list is given, logged otherwise.
+    Returns None on error (0.0 on division by zero).
     """
     if not isinstance(formula_str, str) or not formula_str.strip():
         # If the formula is empty or not a string, return the value if it's numeric
@@ -17,105 +26,104 @@ def evaluate_formula(formula_str, qt_data, current_item_description="N/A"):
             return float(formula_str)
         return 0.0
 
-    original_formula = formula_str
-    
-    # Replace commas with periods for Python compatibility
-    formula_processed = original_formula.replace(',', '.')
-    ops_and_parens = ['+', '-', '*', '/', '(', ')']
-    # Add spaces around operators and parentheses for easier tokenization
-    for op in ops_and_parens:
-        formula_processed = formula_processed.replace(op, f" {op} ")
-    formula_processed = ' '.join(formula_processed.split()) # Clean up multiple spaces
-    
-    raw_tokens = formula_processed.split(' ')
-    tokens = [t for t in raw_tokens if t] # Remove empty tokens
+    compiled = compile_formula(formula_str)
+    if compiled.error is not None:
+        _report_formula_error(compiled.error.for_item(current_item_description), errors)
+        return None
 
-    processed_tokens = []
-    for token_str in tokens:
-        # Try to match an item reference (e.g., "LONGRINE[ml]")
-        match_item_header = re.fullmatch(r"([a-zA-Z0-9_ÉÈÀÊÛÔÎÇ.\s-]+)\[([a-zA-Z0-9_]+)\]", token_str, re.IGNORECASE)
-        
-        if match_item_header:
-            item_name_formula = match_item_header.group(1).strip().lower()
-            header_name_formula = match_item_header.group(2).strip().lower()
-            
-            if item_name_formula in qt_data:
-                if header_name_formula in qt_data[item_name_formula]:
-                    value = qt_data[item_name_formula][header_name_formula]
-                    if value is None:
-                        # If value is None, use 0.0 and print a warning
-                        print(f"    WARNING [Token ITEM] ({current_item_description}): Missing value (None) for '{item_name_formula}[{header_name_formula}]' in 'qt'. Using 0.0.")
-                        processed_tokens.append("0.0")
-                    elif isinstance(value, (int, float)):
-                        # Add the numerical value
-                        processed_tokens.append(str(float(value)))
-                    else:
-                        # If value is of an unexpected type, use 0.0
-                        print(f"    WARNING [Token ITEM] ({current_item_description}): Non-numeric value '{value}' for '{item_name_formula}[{header_name_formula}]'. Using 0.0.")
-                        processed_tokens.append("0.0")
-                else:
-                    print(f"    ERROR [Token ITEM] ({current_item_description}): Header '{header_name_formula}' not found for item '{item_name_formula}' in 'qt'. Formula: {original_formula}")
-                    return None
-            else:
-                print(f"    ERROR [Token ITEM] ({current_item_description}): Item '{item_name_formula}' not found in 'qt' data. Formula: {original_formula}")
+    # Resolve 'qt' references in formula order
+    ref_values = []
+    lookup = qt_lookup(qt_data)
+    for item_name_formula, header_name_formula, position in compiled.refs:
+        state, value = lookup(item_name_formula, header_name_formula)
+        if state == MISSING_ITEM:
+            _report_formula_error(FormulaError('missing_item', f"Item '{item_name_formula}' not found in 'qt' data",
+                                               formula_str, position, current_item_description), errors)
+            return None
+        if state == MISSING_HEADER:
+            _report_formula_error(FormulaError('missing_header', f"Header '{header_name_formula}' not found for item '{item_name_formula}' in 'qt'",
+                                               formula_str, position, current_item_description), errors)
+            return None
+        if value is None:
+            # If value is None, use 0.0 (frequent: only logged at DEBUG level)
+            logger.debug("(%s): Missing value (None) for '%s[%s]' in 'qt'. Using 0.0.",
+                         current_item_description, item_name_formula, header_name_formula)
+            value = 0.0
+        elif isinstance(value, (int, float)):
+            value = float(value)
+            if not math.isfinite(value):
+                _report_formula_error(FormulaError('invalid_value', f"Non-finite value '{value}' for '{item_name_formula}[{header_name_formula}]'",
+                                                   formula_str, position, current_item_description), errors)
                 return None
-        elif re.fullmatch(r"-?\d+(\.\d+)?", token_str):
-            # It's a number (integer or decimal)
-            processed_tokens.append(token_str)
-        elif token_str in ops_and_parens:
-            # It's an operator or parenthesis
-            processed_tokens.append(token_str)
         else:
-            print(f"    ERROR [Token UNKNOWN] ({current_item_description}): Unrecognized token: '{token_str}' in formula '{original_formula}'.")
-            return None
-
-    final_expression = " ".join(processed_tokens)
-
-    if not final_expression.strip():
-        return 0.0
+            # If value is of an unexpected type, use 0.0
+            logger.warning("(%s): Non-numeric value '%s' for '%s[%s]'. Using 0.0.",
+                           current_item_description, value, item_name_formula, header_name_formula)
+            value = 0.0
+        ref_values.append(value)
 
     try:
-        temp_expr_check = final_expression.lower()
-        for char in temp_expr_check:
-            if not (char.isdigit() or char == '.' or char in ops_and_parens or char.isspace() or char == 'e'):
-                print(f"  ERROR [evaluate_formula] ({current_item_description}): Expression '{final_expression}' contains unauthorized character '{char}'. Original: '{original_formula}'")
-                return None
-
-        result = eval(final_expression, {"__builtins__": {}}, {})
-        return float(result)
-    except SyntaxError as e_syn:
-        print(f"  ERROR Syntax [evaluate_formula] ({current_item_description}): Incorrect syntax in '{final_expression}'. Original: '{original_formula}'. Error: {e_syn}")
-        return None
+        return float(compiled.root.evaluate(ref_values))
     except ZeroDivisionError:
-        print(f"  ERROR Division by zero [evaluate_formula] ({current_item_description}): In '{final_expression}'. Original: '{original_formula}'")
+        _report_formula_error(FormulaError('division_by_zero', "Division by zero", formula_str, None, current_item_description), errors)
         return 0.0
-    except Exception as e:
-        print(f"  ERROR Unexpected [evaluate_formula] ({current_item_description}): While evaluating '{final_expression}' (original: '{original_formula}'): {e}")
+    except RecursionError:
+        _report_formula_error(FormulaError('syntax', "Formula is too deeply nested", formula_str, None, current_item_description), errors)
         return None
 
 
-def parse_calcul_sheet_and_process_blocks(calcul_sheet, qt_data, output_ws, recap_entries):
+def _report_formula_error(error, errors):
+    if errors is not None:
+        errors.append(error)
+    else:
+        logger.error("%s", error)
+
+
+def _evaluate_quantity(formula, qt_data, description, formula_errors, quantities=None):
+    """Quantity of an item: taken from the batch-evaluated 'quantities' when available, else evaluated directly."""
+    if quantities is not None:
+        return quantities.get(formula, description, formula_errors)
+    return evaluate_formula(formula, qt_data, description, formula_errors)
+
+def _log_formula_errors(block_label, formula_errors):
+    """Logs the formula errors collected for one block as a single report."""
+    if formula_errors and logger.isEnabledFor(logging.WARNING):
+        logger.warning("[%s] %d formula error(s):\n%s", block_label, len(formula_errors),
+                       "\n".join(f"    - {error}" for error in formula_errors))
+
+
+def parse_unit_price(pu_raw, description):
+    """Converts a raw unit price cell (number or text with decimal comma) to float, 0.0 if invalid."""
+    unit_price = 0.0
+    if pu_raw is not None:
+        try:
+            if isinstance(pu_raw, str):
+                unit_price = float(pu_raw.replace(',','.'))
+            elif isinstance(pu_raw, (int, float)):
+                unit_price = float(pu_raw)
+        except ValueError:
+            logger.warning("Invalid unit price '%s' for '%s'. Using 0.0.", pu_raw, description)
+            unit_price = 0.0
+    return unit_price
+
+def parse_calcul_sheet_blocks(calcul_sheet):
     """
-    Parses the 'calcul' sheet, identifies blocks and their items,
-    evaluates quantities, and generates tables on the single output sheet.
+    Parses the 'calcul' sheet into its blocks, without evaluating anything.
     
     Args:
         calcul_sheet (openpyxl.worksheet.worksheet.Worksheet): The 'calcul' sheet to read.
-        qt_data (dict): The quantity data from the 'qt' sheet.
-        output_ws (openpyxl.worksheet.worksheet.Worksheet): The output sheet to write results to.
-        recap_entries (list): A list to append recap data (roman_numeral, title, total_cell_ref, numeric_total).
     
     Returns:
-        int: The next available row number after processing all blocks from 'calcul' sheet.
+        list: (roman_numeral, title, items) for each block having items, in sheet order.
+              items is a list of (description, unit, formula, raw_unit_price) tuples.
     """
+    blocks = []
     current_block_roman = None
     current_block_title = None
     current_block_items = []
-    
-    current_excel_row = 1 
 
     max_row_to_iterate = calcul_sheet.max_row
-    print(f"Starting analysis of 'calcul' sheet up to row {max_row_to_iterate}.")
+    logger.debug("Starting analysis of 'calcul' sheet up to row %d.", max_row_to_iterate)
 
     rows_data = list(calcul_sheet.iter_rows(min_row=1, max_row=max_row_to_iterate, values_only=True))
 
@@ -133,70 +141,77 @@ def parse_calcul_sheet_and_process_blocks(calcul_sheet, qt_data, output_ws, reca
         
         if is_roman:
             if current_block_roman and current_block_items:
-                print(f"\nProcessing previous block: {current_block_roman} - {current_block_title} with {len(current_block_items)} items.")
-                processed_items_for_table = []
-                for item in current_block_items:
-                    desc, unit, formula, pu_raw = item
-                    qty_calculated = evaluate_formula(formula, qt_data, desc)
-                    
-                    unit_price = 0.0
-                    if pu_raw is not None:
-                        try:
-                            if isinstance(pu_raw, str):
-                                unit_price = float(pu_raw.replace(',','.'))
-                            elif isinstance(pu_raw, (int, float)):
-                                unit_price = float(pu_raw)
-                        except ValueError:
-                            print(f"WARNING: Invalid unit price '{pu_raw}' for '{desc}'. Using 0.0.")
-                            unit_price = 0.0
-                    
-                    processed_items_for_table.append([desc, unit, qty_calculated if qty_calculated is not None else 0.0, unit_price])
-
-                if processed_items_for_table:
-                     next_row, total_cell_ref, numeric_block_total = create_excel_table_for_block(output_ws, current_excel_row, 
-                                                                        current_block_roman, current_block_title, processed_items_for_table)
-                     recap_entries.append({'roman': current_block_roman, 'title': current_block_title, 
-                                           'total_cell_ref': total_cell_ref, 'numeric_total': numeric_block_total})
-                     current_excel_row = next_row # Update the current_excel_row for the next block
+                blocks.append((current_block_roman, current_block_title, current_block_items))
 
             current_block_roman = col_a_val
             current_block_title = col_b_val if col_b_val else f"Block {current_block_roman}"
             current_block_items = []
-            print(f"Starting new block: {current_block_roman} - {current_block_title}")
+            logger.debug("Starting new block: %s - %s", current_block_roman, current_block_title)
 
         elif current_block_roman and col_b_val: 
             current_block_items.append((col_b_val, col_c_val, col_d_val_formula, col_e_val_pu))
         elif not current_block_roman and col_a_val and not is_roman:
-            print(f"WARNING [parse_calcul_sheet]: Row {i_row+1} (ColA: '{col_a_val}', ColB: '{col_b_val}') before the first Roman block or unknown format, ignored.")
-
+            logger.warning("Row %d (ColA: '%s', ColB: '%s') before the first Roman block or unknown format, ignored.",
+                           i_row + 1, col_a_val, col_b_val)
 
     if current_block_roman and current_block_items:
-        print(f"\nProcessing last block (after loop): {current_block_roman} - {current_block_title} with {len(current_block_items)} items.")
+        blocks.append((current_block_roman, current_block_title, current_block_items))
+    elif current_block_roman and not current_block_items:
+         logger.warning("The last block %s - %s had no items to process.", current_block_roman, current_block_title)
+    
+    return blocks
+
+def parse_calcul_sheet_and_process_blocks(calcul_sheet, qt_data, output_ws, recap_entries, quantities=None):
+    """
+    Parses the 'calcul' sheet, identifies blocks and their items,
+    evaluates quantities, and generates tables on the single output sheet.
+    
+    Args:
+        calcul_sheet (openpyxl.worksheet.worksheet.Worksheet): The 'calcul' sheet to read.
+        qt_data (QtTable): The quantity data from the 'qt' sheet.
+        output_ws (openpyxl.worksheet.worksheet.Worksheet): The output sheet to write results to.
+        recap_entries (list): A list to append recap data (roman_numeral, title, total_cell_ref, numeric_total).
+        quantities (BatchQuantities, optional): Quantities already evaluated in one vectorized pass.
+    
+    Returns:
+        int: The next available row number after processing all blocks from 'calcul' sheet.
+    """
+    return process_calcul_blocks(parse_calcul_sheet_blocks(calcul_sheet), qt_data, output_ws, recap_entries, quantities)
+
+def process_calcul_blocks(calcul_blocks, qt_data, output_ws, recap_entries, quantities=None):
+    """
+    Evaluates the quantities of already parsed 'calcul' blocks and generates
+    their tables on the single output sheet.
+    
+    Args:
+        calcul_blocks (list): Blocks returned by parse_calcul_sheet_blocks.
+        qt_data (QtTable): The quantity data from the 'qt' sheet.
+        output_ws (openpyxl.worksheet.worksheet.Worksheet): The output sheet to write results to.
+        recap_entries (list): A list to append recap data (roman_numeral, title, total_cell_ref, numeric_total).
+        quantities (BatchQuantities, optional): Quantities already evaluated in one vectorized pass.
+    
+    Returns:
+        int: The next available row number after processing all blocks.
+    """
+    current_excel_row = 1 
+
+    for block_roman, block_title, block_items in calcul_blocks:
+        logger.debug("Processing block: %s - %s with %d items.", block_roman, block_title, len(block_items))
         processed_items_for_table = []
-        for item in current_block_items:
+        formula_errors = []
+        for item in block_items:
             desc, unit, formula, pu_raw = item
-            qty_calculated = evaluate_formula(formula, qt_data, desc)
-            unit_price = 0.0
-            if pu_raw is not None:
-                try:
-                    if isinstance(pu_raw, str):
-                        unit_price = float(pu_raw.replace(',','.'))
-                    elif isinstance(pu_raw, (int, float)):
-                        unit_price = float(pu_raw)
-                except ValueError:
-                    print(f"WARNING: Invalid unit price '{pu_raw}' for '{desc}'. Using 0.0.")
-                    unit_price = 0.0
-            
+            qty_calculated = _evaluate_quantity(formula, qt_data, desc, formula_errors, quantities)
+            unit_price = parse_unit_price(pu_raw, desc)
             processed_items_for_table.append([desc, unit, qty_calculated if qty_calculated is not None else 0.0, unit_price])
-        
+        _log_formula_errors(f"Block {block_roman}", formula_errors)
+
         if processed_items_for_table:
             next_row, total_cell_ref, numeric_block_total = create_excel_table_for_block(output_ws, current_excel_row, 
-                                         current_block_roman, current_block_title, processed_items_for_table)
-            recap_entries.append({'roman': current_block_roman, 'title': current_block_title, 
+                                                                block_roman, block_title, processed_items_for_table)
+            recap_entries.append({'roman': block_roman, 'title': block_title, 
                                   'total_cell_ref': total_cell_ref, 'numeric_total': numeric_block_total})
-            current_excel_row = next_row # Update the current_excel_row
-    elif current_block_roman and not current_block_items:
-         print(f"WARNING [parse_calcul_sheet]: The last block {current_block_roman} - {current_block_title} had no items to process.")
+            current_excel_row = next_row # Update the current_excel_row for the next block
     
     return current_excel_row 
 
@@ -206,7 +221,7 @@ def process_menuiserie_block(open_data_list, output_ws, start_row, recap_entries
     and writes it to the output worksheet.
     
     Args:
-        open_data_list (list): List of dictionaries, each representing an opening.
+        open_data_list (list): Opening records from get_open_data.
         output_ws (openpyxl.worksheet.worksheet.Worksheet): The output sheet to write results to.
         start_row (int): The row number from which to start writing this block.
         recap_entries (list): A list to append recap data (roman_numeral, title, total_cell_ref, numeric_total).
@@ -219,12 +234,12 @@ def process_menuiserie_block(open_data_list, output_ws, start_row, recap_entries
     items_for_table = []
 
     for i, item_data in enumerate(open_data_list):
-        designation = item_data.get('designation', '')
-        largeur = item_data.get('l', 0.0)
-        hauteur = item_data.get('h', 0.0)
-        nombre = item_data.get('nombre', 0)
-        type_ouverture = item_data.get('type', '')
-        prix_unitaire = item_data.get('prix unitaire', 0.0)
+        designation = item_data.designation
+        largeur = item_data.l
+        hauteur = item_data.h
+        nombre = item_data.nombre
+        type_ouverture = item_data.type
+        prix_unitaire = item_data.prix_unitaire
 
         description = (f"Fourniture et pose de {designation}, {type_ouverture} "
                        f"({int(largeur*100)}X{int(hauteur*100)})")
@@ -241,7 +256,7 @@ def process_menuiserie_block(open_data_list, output_ws, start_row, recap_entries
         recap_entries.append({'roman': roman_numeral_main, 'title': header_title, 
                               'total_cell_ref': total_cell_ref, 'numeric_total': numeric_block_total})
     else:
-        print("WARNING: No valid items found for 'Menuiserie' block. Skipping table creation.")
+        logger.warning("No valid items found for 'Menuiserie' block. Skipping table creation.")
         next_row = start_row 
         
     return next_row
@@ -253,7 +268,7 @@ def process_simple_block(data_list, output_ws, start_row, roman_numeral, header_
     and writes it to the output worksheet.
     
     Args:
-        data_list (list): List of dictionaries from get_simple_block_data.
+        data_list (list): SimpleBlockItem records from get_simple_block_data.
         output_ws (openpyxl.worksheet.worksheet.Worksheet): The output sheet.
         start_row (int): Starting row for this block.
         roman_numeral (str): Roman numeral for the block (e.g., "V").
@@ -267,10 +282,10 @@ def process_simple_block(data_list, output_ws, start_row, roman_numeral, header_
     items_for_table = []
 
     for i, item_data in enumerate(data_list):
-        designation = item_data.get('designation', '')
-        unit = item_data.get('unit', '')
-        number = item_data.get('number', 0.0)
-        unit_price = item_data.get('unit_price', 0.0)
+        designation = item_data.designation
+        unit = item_data.unit
+        number = item_data.number
+        unit_price = item_data.unit_price
 
         description = f"Fourniture et pose de {designation}"
         
@@ -285,30 +300,32 @@ def process_simple_block(data_list, output_ws, start_row, roman_numeral, header_
         recap_entries.append({'roman': roman_numeral, 'title': header_title, 
                               'total_cell_ref': total_cell_ref, 'numeric_total': numeric_block_total})
     else:
-        print(f"WARNING: No valid items found for '{header_title}' block. Skipping table creation.")
+        logger.warning("No valid items found for '%s' block. Skipping table creation.", header_title)
         next_row = start_row 
         
     return next_row
 
-def process_formula_block(data_list, qt_data, output_ws, start_row, roman_numeral, header_title, item_start_num, recap_entries):
+def process_formula_block(data_list, qt_data, output_ws, start_row, roman_numeral, header_title, item_start_num, recap_entries, quantities=None):
     """
     Processes 'formula' data (like Peinture/Revetement/Toiture with Description, Unit, Formula, P.U.)
     and writes it to the output worksheet, evaluating formulas using qt_data.
     
     Args:
         data_list (list): List of dictionaries from get_formula_block_data.
-        qt_data (dict): The quantity data from the 'qt' sheet.
+        qt_data (QtTable): The quantity data from the 'qt' sheet.
         output_ws (openpyxl.worksheet.worksheet.Worksheet): The output sheet.
         start_row (int): Starting row for this block.
         roman_numeral (str): Roman numeral for the block (e.g., "VII").
         header_title (str): Title for the block (e.g., "PEINTURE").
         item_start_num (int): Starting number for items within the block (e.g., 1 for VII.1).
         recap_entries (list): A list to append recap data (roman_numeral, title, total_cell_ref, numeric_total).
+        quantities (BatchQuantities, optional): Quantities already evaluated in one vectorized pass.
         
     Returns:
         int: The next available row number after processing this block.
     """
     items_for_table = []
+    formula_errors = []
 
     for i, item_data in enumerate(data_list):
         description = item_data.get('description', '')
@@ -316,20 +333,11 @@ def process_formula_block(data_list, qt_data, output_ws, start_row, roman_numera
         formula_or_qty = item_data.get('formula_or_qty', 0.0)
         pu_raw = item_data.get('pu', 0.0)
 
-        qty_calculated = evaluate_formula(formula_or_qty, qt_data, description)
-        
-        unit_price = 0.0
-        if pu_raw is not None:
-            try:
-                if isinstance(pu_raw, str):
-                    unit_price = float(pu_raw.replace(',','.'))
-                elif isinstance(pu_raw, (int, float)):
-                    unit_price = float(pu_raw)
-            except ValueError:
-                print(f"WARNING: Invalid unit price '{pu_raw}' for '{description}'. Using 0.0.")
-                unit_price = 0.0
+        qty_calculated = _evaluate_quantity(formula_or_qty, qt_data, description, formula_errors, quantities)
+        unit_price = parse_unit_price(pu_raw, description)
         
         items_for_table.append([description, unit, qty_calculated if qty_calculated is not None else 0.0, unit_price])
+    _log_formula_errors(f"Block {roman_numeral}", formula_errors)
     
     if items_for_table:
         next_row, total_cell_ref, numeric_block_total = create_excel_table_for_block(output_ws, start_row, 
@@ -337,7 +345,7 @@ def process_formula_block(data_list, qt_data, output_ws, start_row, roman_numera
         recap_entries.append({'roman': roman_numeral, 'title': header_title, 
                               'total_cell_ref': total_cell_ref, 'numeric_total': numeric_block_total})
     else:
-        print(f"WARNING: No valid items found for '{header_title}' block. Skipping table creation.")
+        logger.warning("No valid items found for '%s' block. Skipping table creation.", header_title)
         next_row = start_row 
         
     return next_row
@@ -347,7 +355,7 @@ def write_recap_block(output_ws, start_row, recap_entries):
     Writes the recapitulative block to the Excel worksheet.
     
     Args:
-        output_ws (openpyxl.worksheet.worksheet.Worksheet): The output sheet.
+        output_ws (openpyxl.worksheet.worksheet.Worksheet or OutputSheet): The output sheet.
         start_row (int): The row number from which to start writing this block.
         recap_entries (list): A list of dictionaries, each containing
                               {'roman': str, 'title': str, 'total_cell_ref': str, 'numeric_total': float}.
@@ -355,24 +363,21 @@ def write_recap_block(output_ws, start_row, recap_entries):
     Returns:
         int: The next available row number after writing the recapitulative block.
     """
-    thin_black_side = Side(style='thin', color='000000')
-    black_border = Border(left=thin_black_side, right=thin_black_side, top=thin_black_side, bottom=thin_black_side)
-    bold_font = Font(bold=True)
-    header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-    
-    # Set column widths for recap table (A: Roman, B: Description, F: Montant)
-    output_ws.column_dimensions['A'].width = 6
-    output_ws.column_dimensions['B'].width = 60 # Description will be in B
-    output_ws.column_dimensions['F'].width = 15 # Montant will be in F
+    # Column widths (A: Roman, B: Description, F: Montant) are declared by OutputSheet
+    sheet = output_ws if isinstance(output_ws, OutputSheet) else OutputSheet(output_ws)
 
     current_row = start_row
-    
+    grand_total_row = start_row + len(recap_entries) + 1
+
+    # Merges are declared before any row is written
+    sheet.merge(current_row, 1, current_row, 6) # Title
+    for entry_row in range(start_row + 1, grand_total_row):
+        sheet.merge(entry_row, 2, entry_row, 5) # Block titles
+    sheet.merge(grand_total_row, 1, grand_total_row, 5) # TOTAL GENERAL
+    sheet.merge(grand_total_row + 1, 1, grand_total_row + 1, 6) # Amount in letters
+
     # Title for the recapitulation
-    output_ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=6)
-    output_ws[f'A{current_row}'] = "--- RÉCAPITULATIF ---"
-    output_ws[f'A{current_row}'].font = bold_font
-    output_ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-    output_ws[f'A{current_row}'].fill = header_fill
+    sheet.write_row(current_row, [("--- RÉCAPITULATIF ---", 'block-header-center')] + [(None, 'bordered')] * 5)
     current_row += 1
 
     # Write each block's summary
@@ -380,54 +385,32 @@ def write_recap_block(output_ws, start_row, recap_entries):
     grand_total_numeric_for_letter = 0.0 # To sum numeric totals for the letter conversion
     
     for entry in recap_entries:
-        output_ws[f'A{current_row}'] = entry['roman']
-        output_ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-        
-        output_ws.merge_cells(start_row=current_row, start_column=2, end_row=current_row, end_column=5)
-        output_ws[f'B{current_row}'] = entry['title']
-        output_ws[f'B{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
-        
         # Link to the total of the original block using Excel formula
-        output_ws[f'F{current_row}'] = f"={entry['total_cell_ref']}"
-        output_ws[f'F{current_row}'].number_format = '#,##0.00'
-        output_ws[f'F{current_row}'].alignment = Alignment(horizontal='right', vertical='center')
+        sheet.write_row(current_row, [
+            (entry['roman'], 'item-row-center'),
+            (entry['title'], 'item-row'),
+            (None, 'bordered'), (None, 'bordered'), (None, 'bordered'),
+            (f"={entry['total_cell_ref']}", 'amount'),
+        ])
         
         recap_total_cell_refs.append(f'F{current_row}') # Add this cell to the list for grand total sum
         grand_total_numeric_for_letter += entry['numeric_total'] # Add numeric total for letter conversion
         current_row += 1
     
     # TOTAL GENERAL
-    output_ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=5)
-    output_ws[f'A{current_row}'] = "TOTAL GÉNÉRAL HTVA"
-    output_ws[f'A{current_row}'].font = bold_font
-    output_ws[f'A{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
-    
-    grand_total_cell_ref = f'F{current_row}'
     if recap_total_cell_refs:
         grand_total_formula = f"=SUM({','.join(recap_total_cell_refs)})"
     else:
         grand_total_formula = 0
-    output_ws[grand_total_cell_ref] = grand_total_formula
-    output_ws[grand_total_cell_ref].font = bold_font
-    output_ws[grand_total_cell_ref].number_format = '#,##0.00'
-    output_ws[grand_total_cell_ref].alignment = Alignment(horizontal='right', vertical='center')
+    sheet.write_row(current_row, [("TOTAL GÉNÉRAL HTVA", 'total')] + [(None, 'bordered')] * 4 +
+                                 [(grand_total_formula, 'total-amount')])
     current_row += 1
-
-    # Apply borders to the recap table rows (except the final text line)
-    for row_num in range(start_row, current_row):
-        for col_idx in range(1, 7): # Columns A to F
-            cell = output_ws.cell(row=row_num, column=col_idx)
-            cell.border = black_border
     
     # Amount in letters
     text_total = conv_number_letter(round(grand_total_numeric_for_letter), devise=1, langue=0) # Round to nearest integer for currency in letters
 
     # Line for the amount in letters
-    output_ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=6)
-    output_ws[f'A{current_row}'] = f"Arrêter le présent devis estimatif à la somme de : {text_total}"
-    output_ws[f'A{current_row}'].font = bold_font
-    output_ws[f'A{current_row}'].alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-    output_ws[f'A{current_row}'].fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid") # Light grey fill for the text line
+    sheet.write_row(current_row, [(f"Arrêter le présent devis estimatif à la somme de : {text_total}", 'recap-letter')])
     current_row += 1
 
     return current_row # Return the next available row after the recap
@@ -1,161 +1,161 @@
 # data_reader.py
+import logging
+
+from .qt_table import QtTable, QtTableBuilder
+from .row_decoder import Record, RowDecoder, to_float, to_int, to_text
+
+logger = logging.getLogger(__name__)
+
+def _qt_cell_to_float(cell_value_raw):
+    """Converts a 'qt' value to float (strings may use a decimal comma), None if it is not a number."""
+    if isinstance(cell_value_raw, (int, float)):
+        return float(cell_value_raw)
+    if isinstance(cell_value_raw, str):
+        try:
+            # Try to convert strings to float (handles commas)
+            return float(cell_value_raw.replace(',', '.'))
+        except ValueError:
+            pass # Value remains None if conversion fails
+    return None
 
 def get_qt_data(qt_sheet):
     """
-    Reads data from the 'qt' sheet and organizes it into a dictionary.
-    Dictionary keys are item names (lowercase),
-    and values are another dictionary containing headers and their values.
+    Reads data from the 'qt' sheet into a QtTable.
+    Items are the names of the first column (lowercase), headers the values
+    of the first row (lowercase); each cell holds a float or None.
+    The table can still be read as {item: {header: value}}.
     """
-    data = {}
     # Get values from the first row to identify headers
     header_row_values = [cell.value for cell in qt_sheet[1]] 
 
     if not header_row_values or len(header_row_values) < 2:
-        print("ERROR [get_qt_data]: Insufficient or no headers found in 'qt' sheet at row 1.")
-        return {}
+        logger.error("Insufficient or no headers found in 'qt' sheet at row 1.")
+        return QtTable()
 
     # Convert value headers to lowercase and clean them
     value_headers_qt = [str(h).strip().lower() for h in header_row_values[1:] if h is not None]
 
     if not value_headers_qt:
-        print("ERROR [get_qt_data]: No valid value headers found after the first column in 'qt'.")
-        return {}
+        logger.error("No valid value headers found after the first column in 'qt'.")
+        return QtTable()
+
+    builder = QtTableBuilder(value_headers_qt)
+    # Column of the table for each header; +1 because the first column is the item name
+    header_columns = [(i + 1, builder.header_index[header_key]) for i, header_key in enumerate(value_headers_qt)]
 
     # Iterate over rows starting from the second (min_row=2)
-    for row_num, row_tuple in enumerate(qt_sheet.iter_rows(min_row=2, values_only=True), start=2):
+    for row_tuple in qt_sheet.iter_rows(min_row=2, values_only=True):
         if not row_tuple or row_tuple[0] is None:
             continue # Skip row if it's empty or the first column is empty
         
-        item_name_original = str(row_tuple[0]) 
-        item_name_lower = item_name_original.strip().lower()
-        data[item_name_lower] = {} # Initialize dictionary for the current item
-        
-        # Associate each value with its corresponding header
-        for i, header_key in enumerate(value_headers_qt):
-            actual_col_index_in_row_tuple = i + 1 # +1 because the first column is the item name
-            cell_value_to_assign = None 
-
-            if actual_col_index_in_row_tuple < len(row_tuple):
-                cell_value_raw = row_tuple[actual_col_index_in_row_tuple]
-                
-                if isinstance(cell_value_raw, (int, float)):
-                    cell_value_to_assign = float(cell_value_raw)
-                elif isinstance(cell_value_raw, str):
-                    try:
-                        # Try to convert strings to float (handles commas)
-                        cell_value_to_assign = float(cell_value_raw.replace(',', '.'))
-                    except ValueError:
-                        pass # Value remains None if conversion fails
-            
-            data[item_name_lower][header_key] = cell_value_to_assign
-                
+        item_name_lower = str(row_tuple[0]).strip().lower()
+        row_length = len(row_tuple)
+        builder.set_row(item_name_lower, [
+            (column, _qt_cell_to_float(row_tuple[index]) if index < row_length else None)
+            for index, column in header_columns
+        ])
+
+    data = builder.build()
     if not data:
-        print("WARNING [get_qt_data]: No item data read from 'qt' sheet.")
+        logger.warning("No item data read from 'qt' sheet.")
     return data
 
+def get_qt_data_from_mapping(qt_mapping):
+    """
+    Builds a QtTable (same shape as get_qt_data) from a JSON-like mapping
+    {item_name: {header: value}}. Item names and headers are cleaned and lowercased,
+    values are converted to float the same way as cells of the 'qt' sheet.
+    """
+    if not isinstance(qt_mapping, dict):
+        raise ValueError("A 'qt' table must be an object {item: {header: value}}.")
+
+    for item_name, item_values in qt_mapping.items():
+        if not isinstance(item_values, dict):
+            raise ValueError(f"Values of item '{item_name}' must be an object {{header: value}}.")
+
+    builder = QtTableBuilder(str(header).strip().lower() for item_values in qt_mapping.values() for header in item_values)
+    for item_name, item_values in qt_mapping.items():
+        builder.set_row(str(item_name).strip().lower(), [
+            (builder.header_index[str(header).strip().lower()], _qt_cell_to_float(cell_value_raw))
+            for header, cell_value_raw in item_values.items()
+        ])
+    return builder.build()
+
+class Opening(Record):
+    """Row of the 'open' sheet (Menuiserie)."""
+    __slots__ = ('designation', 'l', 'h', 'nombre', 'type', 'prix_unitaire')
+    KEYS = {'designation': 'designation', 'l': 'l', 'h': 'h', 'nombre': 'nombre',
+            'type': 'type', 'prix unitaire': 'prix_unitaire'}
+
+    def __init__(self, designation, l, h, nombre, type, prix_unitaire):
+        self.designation = designation
+        self.l = l
+        self.h = h
+        self.nombre = nombre
+        self.type = type
+        self.prix_unitaire = prix_unitaire
+
+# (header, converter) of each Opening attribute
+OPEN_FIELDS = [('designation', to_text), ('l', to_float), ('h', to_float),
+               ('nombre', to_int), ('type', to_text), ('prix unitaire', to_float)]
+
+class SimpleBlockItem(Record):
+    """Row of a 'simple' sheet (Electricite, Plomberie)."""
+    __slots__ = ('designation', 'unit', 'number', 'unit_price')
+    KEYS = {'designation': 'designation', 'unit': 'unit', 'number': 'number', 'unit_price': 'unit_price'}
+
+    def __init__(self, designation, unit, number, unit_price):
+        self.designation = designation
+        self.unit = unit
+        self.number = number
+        self.unit_price = unit_price
+
+# (header, converter) of each SimpleBlockItem attribute
+SIMPLE_BLOCK_FIELDS = [('designation', to_text), ('unité', to_text), ('nombre', to_float), ('prix unitaire', to_float)]
+
+def _header_row_values(sheet):
+    return [str(cell.value).strip().lower() if cell.value is not None else "" for cell in sheet[1]]
+
 def get_open_data(open_sheet):
     """
-    Reads data from the 'open' sheet (Menuiserie) and organizes it into a list of dictionaries.
-    Each dictionary represents an opening with 'Designation', 'l' (largeur), 'h' (hauteur),
-    'nombre', 'type', 'prix unitaire'.
+    Reads data from the 'open' sheet (Menuiserie) into a list of Opening records
+    with 'designation', 'l' (largeur), 'h' (hauteur), 'nombre', 'type' and
+    'prix unitaire' (prix_unitaire). Columns are found by header, in any order.
     """
-    data = []
     # Assumes headers are in the first row
-    header_row_values = [str(cell.value).strip().lower() if cell.value is not None else "" for cell in open_sheet[1]]
-
-    # Map expected headers to their column indices
-    # Using a dictionary for faster lookup and robustness to column order changes
-    header_map = {
-        'designation': -1, 'l': -1, 'h': -1, 'nombre': -1, 'type': -1, 'prix unitaire': -1
-    }
-    for idx, header in enumerate(header_row_values):
-        if header in header_map:
-            header_map[header] = idx
-
-    # Check if all required headers are found
-    required_headers_found = True
-    for req_header, idx in header_map.items():
-        if idx == -1:
-            print(f"WARNING [get_open_data]: Required header '{req_header}' not found in 'open' sheet.")
-            required_headers_found = False
-    
-    if not required_headers_found:
-        print("ERROR [get_open_data]: Missing one or more required headers in 'open' sheet. Cannot process.")
+    decoder, missing_headers = RowDecoder.compile(Opening, _header_row_values(open_sheet), OPEN_FIELDS)
+    if decoder is None:
+        for req_header in missing_headers:
+            logger.warning("Required header '%s' not found in 'open' sheet.", req_header)
+        logger.error("Missing one or more required headers in 'open' sheet. Cannot process.")
         return []
 
-    # Iterate over rows starting from the second (min_row=2) for data
-    for row_num, row_tuple in enumerate(open_sheet.iter_rows(min_row=2, values_only=True), start=2):
-        if not row_tuple or not any(row_tuple): # Skip completely empty rows
-            continue
-
-        item = {}
-        try:
-            item['designation'] = str(row_tuple[header_map['designation']]).strip()
-            item['l'] = float(str(row_tuple[header_map['l']]).replace(',', '.') if row_tuple[header_map['l']] is not None else 0.0)
-            item['h'] = float(str(row_tuple[header_map['h']]).replace(',', '.') if row_tuple[header_map['h']] is not None else 0.0)
-            item['nombre'] = int(row_tuple[header_map['nombre']] if row_tuple[header_map['nombre']] is not None else 0)
-            item['type'] = str(row_tuple[header_map['type']]).strip()
-            item['prix unitaire'] = float(str(row_tuple[header_map['prix unitaire']]).replace(',', '.') if row_tuple[header_map['prix unitaire']] is not None else 0.0)
-            data.append(item)
-        except (ValueError, IndexError) as e:
-            print(f"WARNING [get_open_data]: Skipping row {row_num} due to data parsing error: {e}. Row data: {row_tuple}")
-            continue
-            
+    # Rows start from the second (min_row=2) for data
+    data = decoder.decode_rows(open_sheet.iter_rows(min_row=2, values_only=True))
+    if decoder.error_count:
+        logger.warning("%s.", decoder.error_report())
     if not data:
-        print("WARNING [get_open_data]: No valid item data read from 'open' sheet.")
+        logger.warning("No valid item data read from 'open' sheet.")
     return data
 
 def get_simple_block_data(sheet):
     """
-    Reads data from sheets like 'Electricite' or 'Plomberie'
-    and organizes it into a list of dictionaries.
+    Reads data from sheets like 'Electricite' or 'Plomberie' into a list of
+    SimpleBlockItem records ('designation', 'unit', 'number', 'unit_price').
     Assumes columns: Designation, Unité, Nombre, Prix Unitaire.
     """
-    data = []
-    header_row_values = [str(cell.value).strip().lower() if cell.value is not None else "" for cell in sheet[1]]
-
-    header_map = {
-        'designation': -1, 'unité': -1, 'nombre': -1, 'prix unitaire': -1
-    }
-    for idx, header in enumerate(header_row_values):
-        if header in header_map:
-            header_map[header] = idx
-
-    required_headers_found = True
-    for req_header, idx in header_map.items():
-        if idx == -1:
-            print(f"WARNING [get_simple_block_data]: Required header '{req_header}' not found in '{sheet.title}' sheet.")
-            required_headers_found = False
-    
-    if not required_headers_found:
-        print(f"ERROR [get_simple_block_data]: Missing one or more required headers in '{sheet.title}' sheet. Cannot process.")
+    decoder, missing_headers = RowDecoder.compile(SimpleBlockItem, _header_row_values(sheet), SIMPLE_BLOCK_FIELDS)
+    if decoder is None:
+        for req_header in missing_headers:
+            logger.warning("Required header '%s' not found in '%s' sheet.", req_header, sheet.title)
+        logger.error("Missing one or more required headers in '%s' sheet. Cannot process.", sheet.title)
         return []
 
-    for row_num, row_tuple in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-        if not row_tuple or not any(row_tuple):
-            continue
-
-        item = {}
-        try:
-            # Ensure indices exist before accessing
-            if header_map['designation'] >= len(row_tuple) or \
-               header_map['unité'] >= len(row_tuple) or \
-               header_map['nombre'] >= len(row_tuple) or \
-               header_map['prix unitaire'] >= len(row_tuple):
-                print(f"WARNING [get_simple_block_data]: Skipping row {row_num} in '{sheet.title}' due to insufficient columns in row_tuple.")
-                continue
-
-            item['designation'] = str(row_tuple[header_map['designation']]).strip()
-            item['unit'] = str(row_tuple[header_map['unité']]).strip()
-            item['number'] = float(str(row_tuple[header_map['nombre']]).replace(',', '.') if row_tuple[header_map['nombre']] is not None else 0.0)
-            item['unit_price'] = float(str(row_tuple[header_map['prix unitaire']]).replace(',', '.') if row_tuple[header_map['prix unitaire']] is not None else 0.0)
-            data.append(item)
-        except (ValueError, IndexError) as e:
-            print(f"WARNING [get_simple_block_data]: Skipping row {row_num} in '{sheet.title}' due to data parsing error: {e}. Row data: {row_tuple}")
-            continue
-            
+    data = decoder.decode_rows(sheet.iter_rows(min_row=2, values_only=True))
+    if decoder.error_count:
+        logger.warning("%s in '%s' sheet.", decoder.error_report(), sheet.title)
     if not data:
-        print(f"WARNING [get_simple_block_data]: No valid item data read from '{sheet.title}' sheet.")
+        logger.warning("No valid item data read from '%s' sheet.", sheet.title)
     return data
 
 def get_formula_block_data(sheet):
@@ -181,7 +181,8 @@ def get_formula_block_data(sheet):
         try:
             # Ensure row_tuple has enough elements for columns B, C, D, E (indices 1 to 4)
             if len(row_tuple) < 5: 
-                print(f"WARNING [get_formula_block_data]: Skipping row {row_num} in '{sheet.title}' due to insufficient columns. Expected at least 5, got {len(row_tuple)}. Row data: {row_tuple}")
+                logger.warning("Skipping row %d in '%s' due to insufficient columns. Expected at least 5, got %d. Row data: %s",
+                               row_num, sheet.title, len(row_tuple), row_tuple)
                 continue
 
             item['description'] = str(row_tuple[1]).strip() if row_tuple[1] is not None else "" # Column B
@@ -191,9 +192,9 @@ def get_formula_block_data(sheet):
 
             data.append(item)
         except (ValueError, IndexError) as e:
-            print(f"WARNING [get_formula_block_data]: Skipping row {row_num} in '{sheet.title}' due to data parsing error: {e}. Row data: {row_tuple}")
+            logger.warning("Skipping row %d in '%s' due to data parsing error: %s. Row data: %s", row_num, sheet.title, e, row_tuple)
             continue
             
     if not data:
-        print(f"WARNING [get_formula_block_data]: No valid item data read from '{sheet.title}' sheet.")
+        logger.warning("No valid item data read from '%s' sheet.", sheet.title)
     return data
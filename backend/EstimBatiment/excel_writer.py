@@ -1,6 +1,84 @@
 # excel_writer.py
-from openpyxl.styles import Font, Border, Side, Alignment, PatternFill
+import logging
+from copy import copy
+
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+from openpyxl.worksheet.cell_range import CellRange
+
+from output_styles import register_named_styles
+
+logger = logging.getLogger(__name__)
+
+# Column width definitions
+COLUMN_WIDTHS = [6, 60, 6, 12, 10, 15] # A: Num, B: Desc, C: Unité, D: Qté, E: P.U., F: Montant
+
+
+class OutputSheet:
+    """
+    Writes the estimate rows in order, either on a regular worksheet or
+    streamed to a write-only worksheet (openpyxl Workbook(write_only=True)).
+
+    Column widths are declared up front, merges are registered before the
+    rows they cover. Cells use the named styles of output_styles; each style
+    is resolved once per sheet into a template that is copied to the cells.
+    """
+
+    def __init__(self, ws, column_widths=COLUMN_WIDTHS):
+        self.ws = ws
+        self.write_only = isinstance(ws, WriteOnlyWorksheet)
+        self.max_row = 0 if self.write_only else ws.max_row
+        self._templates = {}
+        for i, width in enumerate(column_widths):
+            ws.column_dimensions[get_column_letter(i + 1)].width = width
+
+    def _style_of(self, style_name):
+        style = self._templates.get(style_name)
+        if style is None:
+            register_named_styles(self.ws.parent, [style_name])
+            template = WriteOnlyCell(self.ws)
+            template.style = style_name
+            style = self._templates[style_name] = template._style
+        return style
+
+    def merge(self, start_row, start_column, end_row, end_column):
+        if self.write_only:
+            self.ws.merged_cells.add(CellRange(min_col=start_column, min_row=start_row, max_col=end_column, max_row=end_row))
+        else:
+            self.ws.merge_cells(start_row=start_row, start_column=start_column, end_row=end_row, end_column=end_column)
+
+    def write_row(self, row_idx, cells):
+        """
+        Writes one row. 'cells' lists (value, style_name) for columns A, B, ...
+        (None to leave a cell untouched). Rows must be written in increasing order
+        on a write-only sheet; skipped rows are left empty.
+        """
+        if self.write_only:
+            if row_idx <= self.max_row:
+                raise ValueError(f"Row {row_idx} already written on streamed sheet '{self.ws.title}'.")
+            while self.max_row < row_idx - 1:
+                self.ws.append([])
+                self.max_row += 1
+            row = []
+            for cell_spec in cells:
+                if cell_spec is None:
+                    row.append(None)
+                    continue
+                value, style_name = cell_spec
+                cell = WriteOnlyCell(self.ws, value)
+                cell._style = copy(self._style_of(style_name))
+                row.append(cell)
+            self.ws.append(row)
+        else:
+            for col_idx, cell_spec in enumerate(cells, start=1):
+                if cell_spec is None:
+                    continue
+                value, style_name = cell_spec
+                cell = self.ws.cell(row=row_idx, column=col_idx, value=value)
+                cell._style = copy(self._style_of(style_name))
+        self.max_row = max(self.max_row, row_idx)
+
 
 def create_excel_table_for_block(ws, start_row, roman_numeral_main, header_title, items_data_list):
     """
@@ -8,7 +86,7 @@ def create_excel_table_for_block(ws, start_row, roman_numeral_main, header_title
     starting at 'start_row'.
     
     Args:
-        ws (openpyxl.worksheet.worksheet.Worksheet): The OpenPyXL worksheet to write to.
+        ws (openpyxl.worksheet.worksheet.Worksheet or OutputSheet): The worksheet to write to.
         start_row (int): The row number to start writing this block from.
         roman_numeral_main (str): The Roman numeral for the block (e.g., "I", "II").
         header_title (str): The main title of the block (e.g., "TERRASSEMENT").
@@ -21,32 +99,18 @@ def create_excel_table_for_block(ws, start_row, roman_numeral_main, header_title
                total_cell_reference: The Excel cell coordinate (e.g., "F9") where the block's total is located.
                numeric_block_total: The sum of (quantity * unit_price) for all items in this block.
     """
+    sheet = ws if isinstance(ws, OutputSheet) else OutputSheet(ws)
     num_data_rows = len(items_data_list)
-    
-    # Style definitions
-    thin_black_side = Side(style='thin', color='000000')
-    black_border = Border(left=thin_black_side, right=thin_black_side, top=thin_black_side, bottom=thin_black_side)
-    bold_font = Font(bold=True)
-    header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-
-    # Column width definitions
-    column_widths = [6, 60, 6, 12, 10, 15] # A: Num, B: Desc, C: Unité, D: Qté, E: P.U., F: Montant
-    column_letters = [get_column_letter(i + 1) for i in range(len(column_widths))]
-    for i, width in enumerate(column_widths):
-        ws.column_dimensions[column_letters[i]].width = width
+    last_column = len(COLUMN_WIDTHS)
+    total_row_idx = start_row + num_data_rows + 1
+
+    # Merges are declared before any row is written
+    sheet.merge(start_row, 2, start_row, last_column) # Block title
+    sheet.merge(total_row_idx, 1, total_row_idx, 4) # TOTAL label
 
     # Write main block header (Roman numeral and Title)
-    ws[f'A{start_row}'] = roman_numeral_main
-    ws[f'A{start_row}'].font = bold_font
-    ws[f'A{start_row}'].alignment = Alignment(horizontal='center', vertical='center')
-    ws[f'A{start_row}'].fill = header_fill
-
-    # Merge cells for block title
-    ws.merge_cells(start_row=start_row, start_column=2, end_row=start_row, end_column=len(column_widths))
-    ws[f'B{start_row}'] = header_title
-    ws[f'B{start_row}'].font = bold_font
-    ws[f'B{start_row}'].alignment = Alignment(horizontal='left', vertical='center')
-    ws[f'B{start_row}'].fill = header_fill
+    sheet.write_row(start_row, [(roman_numeral_main, 'block-header-center'), (header_title, 'block-header')] +
+                               [(None, 'bordered')] * (last_column - 2))
 
     # Initialize numeric total for this block
     numeric_block_total = 0.0
@@ -56,61 +120,103 @@ def create_excel_table_for_block(ws, start_row, roman_numeral_main, header_title
     for i, item_data in enumerate(items_data_list):
         description, unit, qty_calculated, unit_price = item_data
         
-        ws[f'A{current_row_idx}'] = f"{roman_numeral_main}.{i + 1}"
-        ws[f'A{current_row_idx}'].alignment = Alignment(horizontal='left', vertical='center')
-        
-        ws[f'B{current_row_idx}'] = description
-        ws[f'B{current_row_idx}'].alignment = Alignment(wrap_text=True, vertical='top')
-        
-        ws[f'C{current_row_idx}'] = unit
-        ws[f'C{current_row_idx}'].alignment = Alignment(horizontal='center', vertical='center')
-        
-        ws[f'D{current_row_idx}'] = qty_calculated
-        ws[f'D{current_row_idx}'].number_format = '#,##0.00'
-        ws[f'D{current_row_idx}'].alignment = Alignment(horizontal='right', vertical='center')
-        
-        ws[f'E{current_row_idx}'] = unit_price
-        ws[f'E{current_row_idx}'].number_format = '#,##0.00'
-        ws[f'E{current_row_idx}'].alignment = Alignment(horizontal='right', vertical='center')
-        
         # Formula for the amount (Qté * P.U.)
         item_amount = (qty_calculated if qty_calculated is not None else 0.0) * (unit_price if unit_price is not None else 0.0)
-        ws[f'F{current_row_idx}'] = f"=D{current_row_idx}*E{current_row_idx}" # Excel formula
-        ws[f'F{current_row_idx}'].number_format = '#,##0.00'
-        ws[f'F{current_row_idx}'].alignment = Alignment(horizontal='right', vertical='center')
+        sheet.write_row(current_row_idx, [
+            (f"{roman_numeral_main}.{i + 1}", 'item-row'),
+            (description, 'item-description'),
+            (unit, 'item-row-center'),
+            (qty_calculated, 'amount'),
+            (unit_price, 'amount'),
+            (f"=D{current_row_idx}*E{current_row_idx}", 'amount'), # Excel formula
+        ])
         
         numeric_block_total += item_amount # Accumulate numeric total
         current_row_idx += 1
 
-    # Write TOTAL row for the block
-    total_row_idx = current_row_idx
-    ws.merge_cells(start_row=total_row_idx, start_column=1, end_row=total_row_idx, end_column=4)
-    ws[f'A{total_row_idx}'] = f"TOTAL {roman_numeral_main}"
-    ws[f'A{total_row_idx}'].font = bold_font
-    ws[f'A{total_row_idx}'].alignment = Alignment(horizontal='left', vertical='center')
-    
-    ws[f'E{total_row_idx}'] = "Somme"
-    ws[f'E{total_row_idx}'].font = bold_font
-    ws[f'E{total_row_idx}'].alignment = Alignment(horizontal='left', vertical='center')
-    
-    # Formula for the total sum of the block
+    # Write TOTAL row for the block, with the formula for the total sum of the block
     total_cell_ref = f"F{total_row_idx}" # Capture the cell reference for the total
     if num_data_rows > 0:
         sum_formula = f"=SUM(F{start_row + 1}:F{total_row_idx - 1})"
     else:
         sum_formula = 0
-    ws[total_cell_ref] = sum_formula
-    ws[total_cell_ref].font = bold_font
-    ws[total_cell_ref].number_format = '#,##0.00'
-    ws[total_cell_ref].alignment = Alignment(horizontal='right', vertical='center')
-
-    # Apply borders to all cells in the block
-    for row_num in range(start_row, total_row_idx + 1):
-        for col_num in range(1, len(column_widths) + 1):
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.border = black_border
+    sheet.write_row(total_row_idx, [
+        (f"TOTAL {roman_numeral_main}", 'total'),
+        (None, 'bordered'), (None, 'bordered'), (None, 'bordered'),
+        ("Somme", 'total'),
+        (sum_formula, 'total-amount'),
+    ])
             
-    print(f"Bloc {roman_numeral_main} generated starting from row {start_row}.")
+    logger.debug("Bloc %s generated starting from row %d.", roman_numeral_main, start_row)
     # Return the next available row (with 2 blank rows for readability) AND the total cell reference AND the numeric total
     return total_row_idx + 2, total_cell_ref, numeric_block_total
 
+def create_scenario_comparison_sheet(ws, scenario_names, blocks, block_totals):
+    """
+    Writes a comparison table of block totals, one column per scenario.
+    
+    Args:
+        ws (openpyxl.worksheet.worksheet.Worksheet): The OpenPyXL worksheet to write to.
+        scenario_names (list): Scenario names, in column order.
+        blocks (list): Blocks of the EstimateTemplate ({'roman': str, 'title': str, ...}).
+        block_totals (ndarray): Totals of shape (n_scenarios, n_blocks).
+    
+    Returns:
+        int: The next available row after the table.
+    """
+    last_column = 2 + len(scenario_names)
+    register_named_styles(ws.parent, ['block-header-center', 'item-row-center', 'item-row', 'amount', 'total', 'bordered', 'total-amount'])
+
+    ws.column_dimensions['A'].width = 6
+    ws.column_dimensions['B'].width = 60
+    for col_num in range(3, last_column + 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = 18
+
+    # Header row
+    for col_num, title in enumerate(["N°", "Désignation"] + list(scenario_names), start=1):
+        ws.cell(row=1, column=col_num, value=title).style = 'block-header-center'
+
+    # One row per block
+    current_row = 2
+    for block_index, block in enumerate(blocks):
+        ws.cell(row=current_row, column=1, value=block['roman']).style = 'item-row-center'
+        ws.cell(row=current_row, column=2, value=block['title']).style = 'item-row'
+        for scenario_index in range(len(scenario_names)):
+            ws.cell(row=current_row, column=3 + scenario_index, value=float(block_totals[scenario_index, block_index])).style = 'amount'
+        current_row += 1
+
+    # TOTAL GENERAL and difference with the first scenario
+    total_row = current_row
+    diff_row = total_row + 1
+    ws.cell(row=total_row, column=1, value="TOTAL GÉNÉRAL HTVA")
+    ws.cell(row=diff_row, column=1, value=f"Écart par rapport à {scenario_names[0]}" if scenario_names else "Écart")
+    for row_num in (total_row, diff_row):
+        ws.cell(row=row_num, column=1).style = 'total'
+        ws.cell(row=row_num, column=2).style = 'bordered'
+        ws.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=2)
+    for col_num in range(3, last_column + 1):
+        col_letter = get_column_letter(col_num)
+        ws.cell(row=total_row, column=col_num, value=f"=SUM({col_letter}2:{col_letter}{total_row - 1})" if blocks else 0).style = 'total-amount'
+        ws.cell(row=diff_row, column=col_num, value=f"={col_letter}{total_row}-$C${total_row}").style = 'total-amount'
+
+    return diff_row + 2
+
+def create_scenario_errors_sheet(ws, scenario_names, errors):
+    """
+    Lists the formula errors of every scenario (scenario, item, kind, message, formula).
+    
+    Args:
+        ws (openpyxl.worksheet.worksheet.Worksheet): The OpenPyXL worksheet to write to.
+        scenario_names (list): Scenario names.
+        errors (list): One list of FormulaError per scenario.
+    """
+    register_named_styles(ws.parent, ['block-header'])
+    for col_letter, width in zip("ABCDE", [20, 60, 16, 60, 40]):
+        ws.column_dimensions[col_letter].width = width
+
+    for col_num, title in enumerate(["Scénario", "Article", "Type", "Message", "Formule"], start=1):
+        ws.cell(row=1, column=col_num, value=title).style = 'block-header'
+
+    for scenario_name, scenario_errors in zip(scenario_names, errors):
+        for error in scenario_errors:
+            ws.append([scenario_name, error.item_description, error.kind, error.message, str(error.formula)])
@@ -0,0 +1,234 @@
+# formula_evaluator.py
+"""
+Arithmetic evaluator for the quantity formulas of the 'calcul', 'Peinture',
+'Revetement' and 'Toiture' sheets (e.g. "DALLE[ms]*0,6-FOUILLE_S[v]").
+
+Formulas are parsed once by a recursive-descent parser into a small tree of
+nodes, memoized by formula text, and evaluated without eval()/compile().
+Supported syntax: numbers (decimal comma or point), ITEM[header] references
+to the 'qt' sheet, + - * /, parentheses and unary minus/plus.
+"""
+import re
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+OPS_AND_PARENS = ['+', '-', '*', '/', '(', ')']
+ITEM_HEADER_PATTERN = re.compile(r"([a-zA-Z0-9_ÉÈÀÊÛÔÎÇ.\s-]+)\[([a-zA-Z0-9_]+)\]", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"\d+(\.\d+)?")
+FORMULA_CACHE_SIZE = 1024
+
+
+class FormulaError(ValueError):
+    """
+    Structured error raised or reported for a formula.
+
+    Attributes:
+        kind (str): 'unknown_token', 'syntax', 'missing_item', 'missing_header',
+                    'invalid_value' or 'division_by_zero'. A missing 'qt' value
+                    is not an error: it is replaced by 0.0 and logged at DEBUG.
+        message (str): Human readable description.
+        formula (str): The original formula text.
+        position (int or None): 0-based character offset in the formula.
+        item_description (str or None): Description of the estimate item being computed.
+    """
+
+    def __init__(self, kind, message, formula, position=None, item_description=None):
+        super().__init__(message)
+        self.kind = kind
+        self.message = message
+        self.formula = formula
+        self.position = position
+        self.item_description = item_description
+
+    def for_item(self, item_description):
+        """Returns a copy of this error attached to an estimate item."""
+        return FormulaError(self.kind, self.message, self.formula, self.position, item_description)
+
+    def to_dict(self):
+        return {'kind': self.kind, 'message': self.message, 'formula': self.formula,
+                'position': self.position, 'item': self.item_description}
+
+    def __str__(self):
+        where = f" at position {self.position}" if self.position is not None else ""
+        item = f" ({self.item_description})" if self.item_description is not None else ""
+        return f"{self.kind}{item}: {self.message}{where} in formula '{self.formula}'"
+
+
+# --- Expression tree ---
+
+class Number:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, ref_values):
+        return self.value
+
+
+class Reference:
+    """Reference to the n-th 'qt' value of the formula (see CompiledFormula.refs)."""
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def evaluate(self, ref_values):
+        return ref_values[self.index]
+
+
+class Negate:
+    __slots__ = ('operand',)
+
+    def __init__(self, operand):
+        self.operand = operand
+
+    def evaluate(self, ref_values):
+        return -self.operand.evaluate(ref_values)
+
+
+class BinaryOp:
+    __slots__ = ('op', 'left', 'right', 'position')
+
+    def __init__(self, op, left, right, position):
+        self.op = op
+        self.left = left
+        self.right = right
+        self.position = position
+
+    def evaluate(self, ref_values):
+        left = self.left.evaluate(ref_values)
+        right = self.right.evaluate(ref_values)
+        if self.op == '+':
+            return left + right
+        if self.op == '-':
+            return left - right
+        if self.op == '*':
+            return left * right
+        return left / right
+
+
+# Parsed formula:
+#   root: expression tree, or None if the formula could not be parsed
+#   refs: (item_lower, header_lower, position) for each Reference index, in formula order
+#   error: FormulaError raised while parsing, if any
+CompiledFormula = namedtuple('CompiledFormula', ['root', 'refs', 'error'])
+
+# Token kinds
+_NUMBER, _REF, _OP, _END = 'number', 'ref', 'op', 'end'
+
+
+def tokenize(formula_str):
+    """
+    Splits a formula into (kind, value, position, text) tokens. Operators and
+    parentheses are tokens on their own, whitespace separates the other tokens.
+    """
+    tokens = []
+    formula_processed = formula_str.replace(',', '.')
+    for match in re.finditer(r"[-+*/()]|[^-+*/()\s]+", formula_processed):
+        token_str, position = match.group(), match.start()
+        if token_str in OPS_AND_PARENS:
+            tokens.append((_OP, token_str, position, token_str))
+            continue
+        match_item_header = ITEM_HEADER_PATTERN.fullmatch(token_str)
+        if match_item_header:
+            # Interned like the QtTable indexes, so reference lookups compare by identity
+            item_name = sys.intern(match_item_header.group(1).strip().lower())
+            header_name = sys.intern(match_item_header.group(2).strip().lower())
+            tokens.append((_REF, (item_name, header_name), position, token_str))
+        elif NUMBER_PATTERN.fullmatch(token_str):
+            value = float(token_str) if '.' in token_str else int(token_str)
+            tokens.append((_NUMBER, value, position, token_str))
+        else:
+            raise FormulaError('unknown_token', f"Unrecognized token '{token_str}'", formula_str, position)
+    tokens.append((_END, None, len(formula_str), ''))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive-descent parser:
+        expression := term (('+' | '-') term)*
+        term       := unary (('*' | '/') unary)*
+        unary      := ('-' | '+') unary | primary
+        primary    := NUMBER | REF | '(' expression ')'
+    """
+
+    def __init__(self, formula_str):
+        self.formula = formula_str
+        self.tokens = tokenize(formula_str)
+        self.pos = 0
+        self.refs = []
+
+    def parse(self):
+        root = self.expression()
+        kind, _, position, text = self.tokens[self.pos]
+        if kind != _END:
+            self.fail(f"Unexpected '{text}'", position)
+        return root
+
+    def fail(self, message, position):
+        raise FormulaError('syntax', message, self.formula, position)
+
+    def expression(self):
+        node = self.term()
+        while self.tokens[self.pos][0] == _OP and self.tokens[self.pos][1] in ('+', '-'):
+            _, op, position, _ = self.tokens[self.pos]
+            self.pos += 1
+            node = BinaryOp(op, node, self.term(), position)
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.tokens[self.pos][0] == _OP and self.tokens[self.pos][1] in ('*', '/'):
+            _, op, position, _ = self.tokens[self.pos]
+            self.pos += 1
+            node = BinaryOp(op, node, self.unary(), position)
+        return node
+
+    def unary(self):
+        kind, value, _, _ = self.tokens[self.pos]
+        if kind == _OP and value in ('-', '+'):
+            self.pos += 1
+            operand = self.unary()
+            return Negate(operand) if value == '-' else operand
+        return self.primary()
+
+    def primary(self):
+        kind, value, position, text = self.tokens[self.pos]
+        if kind == _NUMBER:
+            self.pos += 1
+            return Number(value)
+        if kind == _REF:
+            self.pos += 1
+            self.refs.append((value[0], value[1], position))
+            return Reference(len(self.refs) - 1)
+        if kind == _OP and value == '(':
+            self.pos += 1
+            node = self.expression()
+            kind, value, close_position, _ = self.tokens[self.pos]
+            if not (kind == _OP and value == ')'):
+                self.fail(f"Missing ')' for '(' at position {position}", close_position)
+            self.pos += 1
+            return node
+        if kind == _END:
+            self.fail("Unexpected end of formula", position)
+        self.fail(f"Unexpected '{text}'", position)
+
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def compile_formula(formula_str):
+    """
+    Parses a formula once into an expression tree whose 'qt' references are
+    resolved to (item, header) keys. Results, including parse errors, are
+    memoized by formula text so identical formulas are only parsed once.
+    """
+    try:
+        parser = _Parser(formula_str)
+        root = parser.parse()
+    except FormulaError as error:
+        return CompiledFormula(None, (), error)
+    except RecursionError:
+        return CompiledFormula(None, (), FormulaError('syntax', "Formula is too deeply nested", formula_str))
+    return CompiledFormula(root, tuple(parser.refs), None)
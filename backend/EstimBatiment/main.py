@@ -1,4 +1,5 @@
 # main.py
+import logging
 import tkinter as tk
 from tkinter import filedialog
 import os
@@ -220,4 +221,6 @@ def main():
         print("\nSauvegarde annulée par l'utilisateur.")
 
 if __name__ == "__main__":
+    # Avertissements des modules de calcul affichés dans la console, comme les messages du script
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
     main()
@@ -0,0 +1,174 @@
+# qt_table.py
+"""
+Columnar store for the 'qt' data (item x header quantities).
+
+Values live in one contiguous float64 matrix and a parallel int8 state matrix,
+addressed through interned item and header indexes. A reference ITEM[header]
+is resolved with two dict lookups and one array read. For older callers, a
+QtTable still behaves as a read-only mapping {item_lower: {header_lower: float or None}}.
+"""
+import sys
+from array import array
+from collections.abc import Mapping
+
+import numpy as np
+
+# Cell states, shared with batch_evaluator.QtMatrix
+MISSING_ITEM, MISSING_HEADER, MISSING_VALUE, NUMERIC = 0, 1, 2, 3
+
+
+def _intern(name):
+    return sys.intern(name) if type(name) is str else name
+
+
+class QtTable(Mapping):
+    """
+    Read-only 'qt' table.
+
+    Attributes:
+        item_index (dict): item name -> row index, in first-seen order.
+        header_index (dict): header name -> column index, in first-seen order.
+        value_matrix (ndarray): float64 array (n_items, n_headers), 0.0 where not NUMERIC.
+        state_matrix (ndarray): int8 array of the same shape (MISSING_HEADER, MISSING_VALUE or NUMERIC).
+    """
+    __slots__ = ('item_index', 'header_index', 'value_matrix', 'state_matrix')
+
+    def __init__(self, item_index=None, header_index=None, value_matrix=None, state_matrix=None):
+        self.item_index = item_index if item_index is not None else {}
+        self.header_index = header_index if header_index is not None else {}
+        shape = (len(self.item_index), len(self.header_index))
+        self.value_matrix = value_matrix if value_matrix is not None else np.zeros(shape, dtype=np.float64)
+        self.state_matrix = state_matrix if state_matrix is not None else np.full(shape, MISSING_HEADER, dtype=np.int8)
+
+    @classmethod
+    def from_dict(cls, qt_data):
+        """Builds a table from a {item: {header: value}} dict; non-numeric values count as missing."""
+        builder = QtTableBuilder(header for item_values in qt_data.values() for header in item_values)
+        for item_name, item_values in qt_data.items():
+            builder.set_row(item_name, ((builder.header_index[header], float(value) if isinstance(value, (int, float)) else None)
+                                        for header, value in item_values.items()))
+        return builder.build()
+
+    def lookup(self, item_name, header_name):
+        """(state, value) of ITEM[header]; value is a float for NUMERIC cells, None otherwise."""
+        row = self.item_index.get(item_name)
+        if row is None:
+            return MISSING_ITEM, None
+        col = self.header_index.get(header_name)
+        if col is None:
+            return MISSING_HEADER, None
+        state = self.state_matrix.item(row, col)
+        return state, (self.value_matrix.item(row, col) if state == NUMERIC else None)
+
+    # --- Mapping view: item -> {header: value} ---
+
+    def __getitem__(self, item_name):
+        row = self.item_index.get(item_name)
+        if row is None:
+            raise KeyError(item_name)
+        return QtRow(self, row)
+
+    def __contains__(self, item_name):
+        return item_name in self.item_index
+
+    def __iter__(self):
+        return iter(self.item_index)
+
+    def __len__(self):
+        return len(self.item_index)
+
+    def __repr__(self):
+        return f"<QtTable {len(self.item_index)} items x {len(self.header_index)} headers>"
+
+
+class QtRow(Mapping):
+    """Read-only {header: float or None} view of one item of a QtTable."""
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, header_name):
+        col = self._table.header_index.get(header_name)
+        if col is None:
+            raise KeyError(header_name)
+        state = self._table.state_matrix.item(self._row, col)
+        if state == MISSING_HEADER:
+            raise KeyError(header_name)
+        return self._table.value_matrix.item(self._row, col) if state == NUMERIC else None
+
+    def __iter__(self):
+        present = self._table.state_matrix[self._row] != MISSING_HEADER
+        return (header_name for header_name, col in self._table.header_index.items() if present[col])
+
+    def __len__(self):
+        return int(np.count_nonzero(self._table.state_matrix[self._row] != MISSING_HEADER))
+
+
+class QtTableBuilder:
+    """
+    Fills a QtTable row by row in flat array('d') / bytearray buffers, without
+    one dict per item. Headers are fixed up front (duplicates share a column);
+    a repeated item replaces the previous row, as with the former dict.
+    """
+
+    def __init__(self, header_names):
+        self.header_index = {}
+        for header_name in header_names:
+            self.header_index.setdefault(_intern(header_name), len(self.header_index))
+        self.item_index = {}
+        width = len(self.header_index)
+        self._blank_values = array('d', bytes(8 * width))
+        self._blank_state = bytes([MISSING_HEADER]) * width
+        self._values = array('d')
+        self._state = bytearray()
+
+    def set_row(self, item_name, cells):
+        """
+        Sets the row of 'item_name' from (column, value) pairs, value being a float
+        or None. Columns not given are MISSING_HEADER; a repeated column keeps its
+        last value.
+        """
+        width = len(self.header_index)
+        row = self.item_index.get(item_name)
+        if row is None:
+            row = self.item_index[_intern(item_name)] = len(self.item_index)
+            self._values.extend(self._blank_values)
+            self._state.extend(self._blank_state)
+        else:
+            self._values[row * width:(row + 1) * width] = self._blank_values
+            self._state[row * width:(row + 1) * width] = self._blank_state
+        base = row * width
+        for col, value in cells:
+            if value is None:
+                self._values[base + col] = 0.0
+                self._state[base + col] = MISSING_VALUE
+            else:
+                self._values[base + col] = value
+                self._state[base + col] = NUMERIC
+
+    def build(self):
+        shape = (len(self.item_index), len(self.header_index))
+        values = np.frombuffer(self._values, dtype=np.float64).reshape(shape).copy()
+        state = np.frombuffer(self._state, dtype=np.int8).reshape(shape).copy()
+        return QtTable(self.item_index, self.header_index, values, state)
+
+
+def qt_lookup(qt_data):
+    """
+    Returns the (item_name, header_name) -> (state, value) function of a QtTable
+    or of a plain qt_data dict; value is the stored value (None when missing).
+    """
+    if isinstance(qt_data, QtTable):
+        return qt_data.lookup
+
+    def lookup(item_name, header_name):
+        item_values = qt_data.get(item_name)
+        if item_values is None:
+            return MISSING_ITEM, None
+        if header_name not in item_values:
+            return MISSING_HEADER, None
+        value = item_values[header_name]
+        return (MISSING_VALUE if value is None else NUMERIC), value
+    return lookup
@@ -0,0 +1,140 @@
+# row_decoder.py
+"""
+Typed row decoding for the item sheets ('open', 'Electricite', 'Plomberie').
+
+A RowDecoder is compiled once from the header row of a sheet: it resolves the
+column of every field, then turns each row of iter_rows(values_only=True) into
+a small __slots__ record by applying one converter per field. Rows that cannot
+be decoded are counted (with the first few reasons kept for the report)
+instead of being printed one by one.
+"""
+from operator import call, itemgetter
+
+MAX_REPORTED_ERRORS = 3
+
+
+class Record:
+    """
+    Base class of decoded rows. Fields are __slots__ attributes, set by
+    __init__ in slot order (subclasses spell it out, which is faster); KEYS maps
+    the former dict keys to them so a record can still be read with get() / [].
+    """
+    __slots__ = ()
+    KEYS = {}
+
+    def __init__(self, *values):
+        for attribute, value in zip(self.__slots__, values):
+            setattr(self, attribute, value)
+
+    def get(self, key, default=None):
+        attribute = self.KEYS.get(key)
+        return getattr(self, attribute) if attribute is not None else default
+
+    def __getitem__(self, key):
+        attribute = self.KEYS.get(key)
+        if attribute is None:
+            raise KeyError(key)
+        return getattr(self, attribute)
+
+    def to_dict(self):
+        return {key: getattr(self, attribute) for key, attribute in self.KEYS.items()}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def to_text(value):
+    return str(value).strip()
+
+
+def to_float(value):
+    """Float of a cell, strings may use a decimal comma; None counts as 0.0."""
+    if value is None:
+        return 0.0
+    if type(value) is float:
+        return value
+    if type(value) is int:
+        return float(value)
+    return float(str(value).replace(',', '.'))
+
+
+def to_int(value):
+    """int() of a cell; None counts as 0."""
+    return int(value) if value is not None else 0
+
+
+class RowDecoder:
+    """
+    Decoder of the rows of one sheet into 'record_type' instances.
+
+    Attributes:
+        error_count (int): Number of rows that could not be decoded.
+        errors (list): (row_num, reason) of the first MAX_REPORTED_ERRORS of them.
+    """
+
+    def __init__(self, record_type, columns, converters):
+        self.record_type = record_type
+        self._fetch = itemgetter(*columns) if len(columns) > 1 else (lambda row: (row[columns[0]],))
+        self._converters = tuple(converters)
+        self._min_length = max(columns) + 1
+        self.error_count = 0
+        self.errors = []
+
+    @classmethod
+    def compile(cls, record_type, header_row_values, fields):
+        """
+        Compiles a decoder from the header row of a sheet.
+
+        Args:
+            record_type (type): Record subclass, with one __slots__ attribute per field.
+            header_row_values (list): Cleaned (stripped, lowercase) header names.
+            fields (list): (header, converter) for each attribute, in __slots__ order.
+
+        Returns:
+            tuple: (decoder, missing_headers); decoder is None if a header is missing.
+        """
+        header_columns = {}
+        for idx, header in enumerate(header_row_values):
+            header_columns[header] = idx # The last column of a repeated header wins
+        missing_headers = [header for header, _ in fields if header not in header_columns]
+        if missing_headers:
+            return None, missing_headers
+        columns = [header_columns[header] for header, _ in fields]
+        return cls(record_type, columns, [converter for _, converter in fields]), []
+
+    def decode(self, row_num, row_tuple):
+        """Record of the row, or None (counted as an error) if it cannot be decoded."""
+        if len(row_tuple) < self._min_length:
+            self._add_error(row_num, "insufficient columns")
+            return None
+        try:
+            return self.record_type(*map(call, self._converters, self._fetch(row_tuple)))
+        except ValueError as e:
+            self._add_error(row_num, e)
+            return None
+
+    def decode_rows(self, rows, start=2):
+        """Decodes rows numbered from 'start', skipping completely empty rows."""
+        records = []
+        for row_num, row_tuple in enumerate(rows, start=start):
+            if not row_tuple or not any(row_tuple): # Skip completely empty rows
+                continue
+            record = self.decode(row_num, row_tuple)
+            if record is not None:
+                records.append(record)
+        return records
+
+    def _add_error(self, row_num, reason):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_num, str(reason)))
+
+    def error_report(self):
+        """One-line summary of the skipped rows, or None if there were none."""
+        if not self.error_count:
+            return None
+        examples = "; ".join(f"row {row_num}: {reason}" for row_num, reason in self.errors)
+        return f"{self.error_count} row(s) skipped due to data parsing errors (first: {examples})"
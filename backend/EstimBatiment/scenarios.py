@@ -0,0 +1,90 @@
+# scenarios.py
+"""
+What-if evaluation of one estimate template against several 'qt' tables.
+
+The template (calcul blocks, Menuiserie, Electricite, Plomberie and the
+Revetement/Peinture/Toiture formula blocks) is parsed once. All quantity
+formulas of all blocks are then evaluated for every scenario in a single
+vectorized batch (see batch_evaluator), with evaluate_formula semantics.
+"""
+import logging
+
+import numpy as np
+
+from .batch_evaluator import QtMatrix, evaluate_formulas_batch
+from .calculation_engine import parse_unit_price
+
+logger = logging.getLogger(__name__)
+
+
+class EstimateTemplate:
+    """
+    Blocks of an estimate in output order, independent of the 'qt' data.
+
+    Each block is a dict {'roman', 'title', 'formulas', 'descriptions', 'unit_prices'}
+    for blocks whose quantities come from formulas, or {'roman', 'title', 'fixed_total'}
+    for blocks whose quantities are given directly (Menuiserie, Electricite, Plomberie).
+    """
+
+    def __init__(self):
+        self.blocks = []
+
+    def add_formula_block(self, roman_numeral, title, items):
+        """items: (description, unit, formula_or_qty, raw_unit_price) tuples."""
+        if not items:
+            return
+        self.blocks.append({
+            'roman': roman_numeral,
+            'title': title,
+            'formulas': [formula for _, _, formula, _ in items],
+            'descriptions': [description for description, _, _, _ in items],
+            'unit_prices': [parse_unit_price(pu_raw, description) for description, _, _, pu_raw in items],
+        })
+
+    def add_fixed_block(self, roman_numeral, title, items):
+        """items: (quantity, unit_price) tuples."""
+        if not items:
+            return
+        fixed_total = 0.0
+        for qty, pu in items:
+            fixed_total += (qty if qty is not None else 0.0) * (pu if pu is not None else 0.0)
+        self.blocks.append({'roman': roman_numeral, 'title': title, 'fixed_total': fixed_total})
+
+    def evaluate(self, qt_variants):
+        """
+        Evaluates every block for every 'qt' table.
+
+        Args:
+            qt_variants (list): QtTable (or qt_data dicts), one per scenario.
+
+        Returns:
+            tuple: (block_totals, errors)
+                   block_totals: float64 array (n_scenarios, n_blocks).
+                   errors: one list of FormulaError per scenario.
+        """
+        formulas, descriptions, unit_prices, spans = [], [], [], []
+        for block in self.blocks:
+            start = len(formulas)
+            if 'formulas' in block:
+                formulas.extend(block['formulas'])
+                descriptions.extend(block['descriptions'])
+                unit_prices.extend(block['unit_prices'])
+            spans.append((start, len(formulas)))
+
+        missing_values = [] if logger.isEnabledFor(logging.DEBUG) else None
+        quantities, variant_errors = evaluate_formulas_batch(formulas, QtMatrix(qt_variants), descriptions, missing_values)
+        for scenario_index, scenario_missing in enumerate(missing_values or ()):
+            for index, item_name, header_name in scenario_missing:
+                logger.debug("(%s) scenario %d: Missing value (None) for '%s[%s]' in 'qt'. Using 0.0.",
+                             descriptions[index], scenario_index, item_name, header_name)
+        # Same as the tables: a quantity that cannot be computed counts as 0.0
+        amounts = np.where(np.isnan(quantities), 0.0, quantities) * np.asarray(unit_prices, dtype=np.float64)
+
+        block_totals = np.zeros((len(qt_variants), len(self.blocks)), dtype=np.float64)
+        for index, (block, (start, stop)) in enumerate(zip(self.blocks, spans)):
+            if 'fixed_total' in block:
+                block_totals[:, index] = block['fixed_total']
+            else:
+                block_totals[:, index] = amounts[:, start:stop].sum(axis=1)
+        errors = [[error for _, error in scenario_errors] for scenario_errors in variant_errors]
+        return block_totals, errors
@@ -1,22 +1,37 @@
 # app.py
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+import logging
 import os
 
 # Import des "Blueprints" (groupes de routes) depuis les nouveaux fichiers
 from estim_batiment_routes import estim_batiment_bp
 from armature_routes import armature_bp
 from utility_routes import utility_bp
+from job_routes import jobs_bp
+from result_cache import result_cache
+from jobs import job_queue
+from metrics import PROMETHEUS_CONTENT_TYPE, install_request_tracing, render_prometheus
+from app_logging import configure_logging, install_request_logging
+
+# Niveau, format et échantillonnage DEBUG lus dans LOG_LEVEL, LOG_FORMAT, LOG_DEBUG_SAMPLE_RATE
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # --- Configuration de l'application Flask ---
 app = Flask(__name__)
 CORS(app)
+# Durées par étape des traitements : en-tête Server-Timing et route /metrics
+install_request_tracing(app)
+# Identifiant de corrélation X-Request-ID sur chaque requête et ses journaux
+install_request_logging(app)
 
 # --- Enregistrement des Blueprints ---
 # Chaque blueprint contient les routes pour une fonctionnalité spécifique
 app.register_blueprint(estim_batiment_bp)
 app.register_blueprint(armature_bp)
 app.register_blueprint(utility_bp)
+app.register_blueprint(jobs_bp)
 
 # --- Route Principale (Health Check) ---
 @app.route('/')
@@ -43,6 +58,19 @@ def health_check():
     """
     return html, 200, {'Content-Type': 'text/html'}
 
+# --- Statistiques du cache de résultats ---
+@app.route('/cache-stats')
+def cache_stats():
+    """Compteurs hits/misses et occupation du cache des fichiers générés."""
+    return jsonify(result_cache.stats()), 200
+
+# --- Métriques Prometheus ---
+@app.route('/metrics')
+def metrics():
+    """Histogrammes des étapes de traitement et jauges du cache et des jobs (format texte Prometheus)."""
+    body = render_prometheus({'result_cache': result_cache.stats(), 'jobs': job_queue.stats()})
+    return body, 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+
 # --- Lancement de l'application ---
 if __name__ == '__main__':
     # Configuration pour le déploiement
@@ -51,5 +79,5 @@ if __name__ == '__main__':
     # Le mode debug ne devrait pas être activé en production
     debug = os.environ.get('FLASK_ENV') != 'production'
     
-    print(f"Démarrage du serveur Flask sur {host}:{port}")
+    logger.info("Démarrage du serveur Flask sur %s:%s", host, port)
     app.run(debug=debug, host=host, port=port)
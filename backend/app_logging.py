@@ -0,0 +1,162 @@
+# app_logging.py
+"""
+Journalisation commune du backend, avec le module logging standard.
+
+Les modules déclarent logger = logging.getLogger(__name__) et passent les
+valeurs en arguments ('%s'), formatées seulement si le message est émis. Les
+détails coûteux à produire (aperçu d'un DataFrame, une ligne par cellule...)
+sont en plus gardés par debug_enabled(logger).
+
+Chaque requête HTTP reçoit un identifiant de corrélation (en-tête
+X-Request-ID, repris s'il est fourni par le client) qui figure sur toutes ses
+lignes de journal, y compris celles des jobs qu'elle lance. Avec
+LOG_DEBUG_SAMPLE_RATE, le niveau DEBUG n'est actif que pour une fraction
+des requêtes, tirée au hasard.
+
+Configuration par variables d'environnement :
+    LOG_LEVEL             (DEBUG, INFO, WARNING, ERROR ; défaut INFO)
+    LOG_FORMAT            ('text' par défaut, ou 'json' : un objet JSON par ligne)
+    LOG_DEBUG_SAMPLE_RATE (fraction des requêtes journalisées en DEBUG, défaut 0)
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+_REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+# Attributs standard d'un LogRecord : les autres viennent de 'extra' et sont ajoutés au JSON
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+_request_id = ContextVar('request_id', default='-')
+# None hors requête : le niveau LOG_LEVEL s'applique seul
+_debug_active = ContextVar('debug_active', default=None)
+
+_debug_always = False # LOG_LEVEL=DEBUG
+_debug_sample_rate = 0.0
+
+
+class _ContextFilter(logging.Filter):
+    """Ajoute request_id aux messages et écarte les DEBUG des requêtes non échantillonnées."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return record.levelno > logging.DEBUG or _is_debug_active()
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objet JSON par message : time, level, logger, request_id, message, plus les champs 'extra'."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=None, log_format=None, debug_sample_rate=None):
+    """
+    Installe le handler du logger racine (une seule fois, même si appelée à
+    nouveau). Les arguments non fournis sont lus dans l'environnement.
+    """
+    global _debug_always, _debug_sample_rate
+    level_name = (level or os.environ.get('LOG_LEVEL', 'INFO')).strip().upper()
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        level = logging.INFO
+    log_format = (log_format or os.environ.get('LOG_FORMAT', 'text')).strip().lower()
+    if debug_sample_rate is None:
+        debug_sample_rate = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0))
+
+    _debug_always = level <= logging.DEBUG
+    _debug_sample_rate = 0.0 if _debug_always else min(max(debug_sample_rate, 0.0), 1.0)
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    handler.addFilter(_ContextFilter())
+    handler._app_logging = True
+
+    root = logging.getLogger()
+    for previous in [h for h in root.handlers if getattr(h, '_app_logging', False)]:
+        root.removeHandler(previous)
+    root.addHandler(handler)
+    # En mode échantillonné, DEBUG reste ouvert et le filtre du handler trie par requête
+    root.setLevel(logging.DEBUG if _debug_sample_rate else level)
+
+
+def _is_debug_active():
+    active = _debug_active.get()
+    return _debug_always if active is None else active
+
+
+def debug_enabled(logger):
+    """Vrai si un message DEBUG de 'logger' serait émis pour la requête en cours."""
+    return logger.isEnabledFor(logging.DEBUG) and _is_debug_active()
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+# --- Contexte transmis aux jobs ---
+
+def capture_log_context():
+    """(request_id, debug actif) de la requête en cours, pour run_with_log_context()."""
+    return _request_id.get(), _is_debug_active()
+
+
+def run_with_log_context(context, func, *args):
+    """Exécute func(*args) (dans un thread ou un processus du pool) avec le contexte capturé."""
+    request_id, debug_active = context
+    request_token = _request_id.set(request_id)
+    debug_token = _debug_active.set(debug_active)
+    try:
+        return func(*args)
+    finally:
+        _debug_active.reset(debug_token)
+        _request_id.reset(request_token)
+
+
+# --- Requêtes HTTP ---
+
+def install_request_logging(app):
+    """Identifiant de corrélation et tirage du mode DEBUG pour chaque requête."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_logging():
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not _REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex[:16]
+        sampled = _debug_always or (_debug_sample_rate > 0 and random.random() < _debug_sample_rate)
+        g.request_id = request_id
+        g.log_tokens = (_request_id.set(request_id), _debug_active.set(sampled))
+
+    @app.after_request
+    def _add_request_id(response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+    @app.teardown_request
+    def _end_request_logging(exc):
+        tokens = g.pop('log_tokens', None)
+        if tokens is not None:
+            request_token, debug_token = tokens
+            _debug_active.reset(debug_token)
+            _request_id.reset(request_token)
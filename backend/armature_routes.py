@@ -1,6 +1,7 @@
 # armature_routes.py
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify
 from combineArm import process_armature_csvs # On suppose que cette fonction est dans combineArm.py
+from result_cache import result_cache, xlsx_response
 
 armature_bp = Blueprint('armature', __name__)
 
@@ -18,16 +19,20 @@ def combine_armatures_route():
     if not files_data:
         return jsonify({"error": "Aucuns fichiers valides trouvés dans la requête."}), 400
 
+    # Les noms des fichiers font partie de la clé : ils apparaissent dans le résultat
+    cache_key = result_cache.make_key('combine-armatures', [f['bytes'] for f in files_data],
+                                      {'names': [f['name'] for f in files_data]})
+    cached = result_cache.get(cache_key)
+    if cached:
+        return xlsx_response(cached[0], cached[1], 'HIT')
+
     try:
         output_excel_io, output_filename = process_armature_csvs(files_data)
         
         if output_excel_io and output_filename:
-            return send_file(
-                output_excel_io,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name=output_filename
-            )
+            output_bytes = output_excel_io.getvalue()
+            result_cache.put(cache_key, output_bytes, output_filename)
+            return xlsx_response(output_bytes, output_filename, 'MISS')
         else:
             error_message = output_filename or "Erreur lors de la combinaison"
             return jsonify({"error": error_message}), 500
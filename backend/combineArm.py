@@ -1,10 +1,20 @@
+import numpy as np
 import pandas as pd
+import codecs
 import io
 import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
 import csv
+import logging
+
+from app_logging import debug_enabled
+from metrics import operation_trace
+from output_styles import register_named_styles
 
 # --- Constantes (inspirées du VBA) ---
 PRIX_TONNE = 525000
@@ -18,6 +28,8 @@ NBR_BARRE_TONNE_MAP = {
 }
 HA_TYPES = [6, 8, 10, 12, 14] # Types d'armatures à traiter
 
+logger = logging.getLogger(__name__)
+
 def clean_value_for_numeric_conversion(value):
     """Nettoie les préfixes et convertit la virgule décimale en point.
        Prépare la valeur pour une conversion en type numérique.
@@ -36,108 +48,264 @@ def clean_value_for_numeric_conversion(value):
         return None
     return s_value
 
-def process_armature_csvs(csv_file_contents_list):
+def clean_numeric_column(series):
+    """Équivalent de clean_value_for_numeric_conversion appliqué à chaque valeur
+       puis pd.to_numeric(errors='coerce') : même résultat, valeur par valeur et dtype.
+       Chaque valeur distincte n'est nettoyée et convertie qu'une fois.
     """
-    Fonction principale pour traiter une liste de contenus de fichiers CSV.
-    Chaque item de csv_file_contents_list est un dictionnaire 
-    comme {'name': 'filename.csv', 'bytes': b'contenu_csv'}
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return pd.to_numeric(series, errors='coerce') # Rien à nettoyer
+    codes, uniques = pd.factorize(series) # Valeurs vides -> code -1
+    cleaned_uniques = [clean_value_for_numeric_conversion(value) for value in uniques]
+    numeric_uniques = pd.to_numeric(pd.Series(cleaned_uniques, dtype=object), errors='coerce').to_numpy()
+    if (codes < 0).any():
+        numeric_uniques = np.append(numeric_uniques.astype(np.float64), np.nan) # Indice -1 -> NaN
+    return pd.Series(numeric_uniques[codes], index=series.index, name=series.name)
+
+def calculate_k_column(df, col_G_name, col_H_name, col_I_name):
+    """Colonne K, calculée sur toutes les lignes à la fois :
+         - si I est vide (NaN) : K = G * H
+         - sinon               : K = G * (H * 2 + I * 2 + 0.05)
     """
-    print(f"=== DÉBUT TRAITEMENT CSV ===")
-    print(f"Nombre de fichiers reçus: {len(csv_file_contents_list)}")
-    for i, file_info in enumerate(csv_file_contents_list):
-        file_name = file_info['name']
-        file_size = len(file_info['bytes'])
-        print(f"  Fichier {i+1}: {file_name} - Taille: {file_size} bytes")
-    print(f"=== DÉBUT LECTURE ET COMBINAISON ===")
-    
-    all_data_frames = []
-    column_names_from_first_csv = None
+    g_values, h_values, i_values = df[col_G_name], df[col_H_name], df[col_I_name]
+    i_is_empty = i_values.isna()
+    k_without_i = g_values * h_values
+    if i_is_empty.all() and not all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+        # Aucun I renseigné : K garde le type de G * H (entier si G et H le sont)
+        return k_without_i
+    k_with_i = g_values * (h_values * 2 + i_values * 2 + 0.05)
+    return pd.Series(np.where(i_is_empty, k_without_i, k_with_i), index=df.index, dtype=np.float64)
 
-    # 1. Lire et Combiner tous les fichiers CSV
-    for i, file_info in enumerate(csv_file_contents_list):
-        file_bytes = file_info['bytes']
-        file_name = file_info['name']
-        print(f"Traitement du fichier: {file_name}...")
-        content_str = None
-        encodings_to_try = ['utf-8-sig', 'latin1', 'cp1252'] # Ordre des essais
-        
-        for encoding in encodings_to_try:
-            try:
-                content_str = file_bytes.decode(encoding)
-                print(f"  Fichier {file_name} décodé avec succès en utilisant {encoding}.")
-                break # Sortir de la boucle si le décodage réussit
-            except UnicodeDecodeError:
-                print(f"  Échec du décodage de {file_name} avec {encoding}.")
-                continue # Essayer l\'encodage suivant
-        
-        if content_str is None:
-            print(f"Erreur: Impossible de décoder le fichier {file_name} avec les encodages testés.")
-            # Selon la robustesse désirée, on pourrait sauter le fichier ou lever une erreur.
-            continue
+# --- Lecture des CSV ---
+# Encodages essayés dans l'ordre ; latin1 décode n'importe quel octet
+CSV_ENCODINGS = ('utf-8-sig', 'latin1')
+CSV_DETECTION_PREFIX_BYTES = 64 * 1024 # Préfixe utilisé pour détecter l'encodage
+CSV_SNIFF_LINES = 3 # Lignes valides utilisées pour détecter le séparateur
+CSV_SCAN_BLOCK_BYTES = 8 * 1024 * 1024 # Blocs de la recherche des lignes à ignorer
+# Lecture parallèle des fichiers (le parseur C de pandas libère le GIL) ;
+# ARMATURE_CSV_WORKERS=1 force la lecture séquentielle
+CSV_READ_WORKERS = int(os.environ.get('ARMATURE_CSV_WORKERS', min(8, os.cpu_count() or 1)))
+CSV_PARALLEL_MIN_FILES = 4 # En dessous, le pool coûte plus qu'il ne rapporte
+# Mode incrémental (process_armature_csvs_streaming) à partir de cette taille de lot
+STREAMING_MIN_BYTES = int(os.environ.get('ARMATURE_STREAMING_MIN_BYTES', 64 * 1024 * 1024))
+CSV_CHUNK_ROWS = int(os.environ.get('ARMATURE_CSV_CHUNK_ROWS', 100000)) # Lignes par morceau en mode incrémental
+UTF8_BOM = b'\xef\xbb\xbf'
+# Octets blancs au sens de str.strip() (ASCII, plus NEL et espace insécable en latin1)
+_ASCII_WHITESPACE = np.zeros(256, dtype=bool)
+_ASCII_WHITESPACE[list(b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f')] = True
+_LATIN1_WHITESPACE = _ASCII_WHITESPACE.copy()
+_LATIN1_WHITESPACE[[0x85, 0xa0]] = True
+# Octets d'une ligne "séparateurs seulement", ignorée comme une ligne vide
+_SEPARATOR_ONLY = np.zeros(256, dtype=bool)
+_SEPARATOR_ONLY[list(b';\t, \n')] = True # '\n' : fin de ligne, jamais dans une ligne
 
+def detect_csv_encoding(file_bytes, whole_file=False):
+    """Premier encodage de CSV_ENCODINGS qui décode le début du fichier
+       (tout le fichier, bloc par bloc, si 'whole_file')."""
+    end = len(file_bytes) if whole_file else min(len(file_bytes), CSV_DETECTION_PREFIX_BYTES)
+    for encoding in CSV_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
         try:
-            # Afficher les premières lignes brutes pour diagnostic
-            first_lines = content_str.split('\n')[:5]  # Prendre plus de lignes pour diagnostic
-            print(f"  >>> Premières lignes brutes de {file_name}:")
-            for j, line in enumerate(first_lines):
-                print(f"    Ligne {j+1}: {repr(line[:100])}")  # Limiter à 100 chars pour lisibilité
-            
-            # Nettoyer le contenu en supprimant les lignes vides au début
-            lines = content_str.split('\n')
-            non_empty_lines = []
-            for line in lines:
-                if line.strip() and not all(c in ';\t, ' for c in line):  # Ignorer les lignes vides ou avec que des séparateurs
-                    non_empty_lines.append(line)
-            
-            if not non_empty_lines:
-                print(f"  >>> Fichier {file_name} ne contient aucune ligne de données valide.")
-                continue
-                
-            cleaned_content = '\n'.join(non_empty_lines)
-            print(f"  >>> Fichier {file_name}: {len(lines)} lignes brutes -> {len(non_empty_lines)} lignes après nettoyage")
-            
-            # Détecter le séparateur automatiquement sur le contenu nettoyé
-            sample_content = '\n'.join(non_empty_lines[:3])
-            sniffer = csv.Sniffer()
-            try:
-                dialect = sniffer.sniff(sample_content, delimiters=';,\t|')
-                detected_separator = dialect.delimiter
-                print(f"  >>> Séparateur détecté pour {file_name}: '{detected_separator}'")
-            except:
-                detected_separator = ';'  # Fallback
-                print(f"  >>> Échec détection séparateur pour {file_name}, utilisation de ';' par défaut")
-            
-            # Lire le CSV nettoyé
-            if i == 0:
-                df = pd.read_csv(io.StringIO(cleaned_content), sep=detected_separator, header=0, engine='python')
-                column_names_from_first_csv = df.columns.tolist() # Sauvegarder les noms de colonnes
-                print(f"  >>> Premier CSV ({file_name}): Noms de colonnes dérivés: {column_names_from_first_csv}")
-                print(f"  >>> Premier CSV ({file_name}): Shape: {df.shape}")
-                print(f"  >>> Premier CSV ({file_name}): Head(2):\\n{df.head(2).to_string()}")
-            else:
-                df = pd.read_csv(io.StringIO(cleaned_content), sep=detected_separator, header=None, names=column_names_from_first_csv, skiprows=1, engine='python')
-                print(f"  >>> CSV Suivant ({file_name}): Shape après lecture (skiprows=1, names={column_names_from_first_csv}): {df.shape}")
-                print(f"  >>> CSV Suivant ({file_name}): Head(2):\\n{df.head(2).to_string()}")
-            
-            all_data_frames.append(df)
-        except Exception as e:
-            print(f"Erreur lors de la lecture des données CSV du fichier {file_name} après décodage: {e}")
-            # Selon la robustesse désirée, on pourrait sauter le fichier ou lever une erreur.
+            # Décodage incrémental : un caractère coupé en fin de bloc n'est pas une erreur
+            for offset in range(0, end, CSV_SCAN_BLOCK_BYTES):
+                block_end = min(offset + CSV_SCAN_BLOCK_BYTES, end)
+                decoder.decode(file_bytes[offset:block_end], final=block_end == len(file_bytes))
+            return encoding
+        except UnicodeDecodeError:
             continue
-    
-    if not all_data_frames:
-        print("Aucune donnée CSV n'a été chargée.")
-        return None, "error_no_data.xlsx" # Retourner None pour indiquer une erreur
+    return CSV_ENCODINGS[-1]
+
+def decode_csv_line(file_bytes, start, end, encoding):
+    """Texte d'une ligne ; le BOM n'est retiré qu'en tout début de fichier."""
+    if encoding == 'utf-8-sig' and start > 0:
+        encoding = 'utf-8'
+    return file_bytes[start:end].decode(encoding)
+
+def find_csv_lines(file_bytes, encoding):
+    """Découpe le fichier en lignes (sur '\\n') sans le décoder.
+
+    Retourne (starts, ends, valid) : bornes en octets de chaque ligne et masque
+    des lignes à lire. Une ligne vide, blanche ou ne contenant que des
+    séparateurs (';', ',', tabulation, espace) est ignorée. Le fichier est
+    parcouru par blocs de CSV_SCAN_BLOCK_BYTES pour borner la mémoire.
+    """
+    data = np.frombuffer(file_bytes, dtype=np.uint8)
+    newlines = np.concatenate([np.flatnonzero(data[offset:offset + CSV_SCAN_BLOCK_BYTES] == 0x0A) + offset
+                               for offset in range(0, len(data), CSV_SCAN_BLOCK_BYTES)] or [np.zeros(0, dtype=np.int64)])
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(data)]))
+    whitespace_table = _LATIN1_WHITESPACE if encoding == 'latin1' else _ASCII_WHITESPACE
+
+    valid = np.zeros(len(starts), dtype=bool)
+    first_line = 0
+    while first_line < len(starts):
+        # Groupe de lignes entières d'environ CSV_SCAN_BLOCK_BYTES octets (au moins une ligne)
+        stop_line = max(first_line + 1, int(np.searchsorted(starts, starts[first_line] + CSV_SCAN_BLOCK_BYTES)))
+        block_start = starts[first_line]
+        block = data[block_start:ends[stop_line - 1]]
+        line_starts = starts[first_line:stop_line] - block_start
+        line_ends = ends[first_line:stop_line] - block_start
+
+        is_whitespace = whitespace_table[block]
+        is_separator = _SEPARATOR_ONLY[block]
+        # Octets non ASCII d'un fichier UTF-8 : blancs ou non, selon le caractère décodé
+        is_undecided = (block >= 0x80) if encoding != 'latin1' else np.zeros(len(block), dtype=bool)
+        if first_line == 0 and encoding == 'utf-8-sig' and file_bytes.startswith(UTF8_BOM):
+            is_whitespace[:3] = is_separator[:3] = True # Le BOM n'est pas une donnée
+            is_undecided[:3] = False
+
+        # Lignes non vides, en évitant les segments vides que reduceat ne sait pas traiter
+        non_empty = line_ends > line_starts
+        def any_per_line(flags):
+            found = np.zeros(len(line_starts), dtype=bool)
+            if non_empty.any():
+                found[non_empty] = np.logical_or.reduceat(flags, line_starts[non_empty])
+            return found
+
+        has_text = any_per_line(~is_whitespace & ~is_undecided)
+        has_undecided = any_per_line(is_undecided)
+        blank = ~has_text & ~has_undecided
+        for line in np.flatnonzero(~has_text & has_undecided):
+            blank[line] = not decode_csv_line(file_bytes, starts[first_line + line], ends[first_line + line], encoding).strip()
+        valid[first_line:stop_line] = ~blank & any_per_line(~is_separator)
+        first_line = stop_line
+    return starts, ends, valid
+
+def csv_read_options(file_bytes, file_name, first_file=True, column_names=None, encoding=None):
+    """Prépare la lecture d'un CSV d'armatures par le moteur C de pandas.
+
+    Détecte l'encodage et le séparateur, et liste les lignes à sauter (lignes
+    ignorées et, hors premier fichier, la ligne d'en-tête). Retourne les
+    arguments de pd.read_csv, ou None si le fichier ne contient aucune ligne valide.
+    """
+    if encoding is None:
+        encoding = detect_csv_encoding(file_bytes)
+    starts, ends, valid = find_csv_lines(file_bytes, encoding)
+    valid_lines = np.flatnonzero(valid)
+    if len(valid_lines) == 0:
+        logger.warning("Fichier %s: aucune ligne de données valide.", file_name)
+        return None
+    logger.debug("Fichier %s lu avec l'encodage %s: %d lignes brutes -> %d lignes après nettoyage",
+                 file_name, encoding, len(starts), len(valid_lines))
+
+    # Détecter le séparateur sur les premières lignes valides
+    sample_content = '\n'.join(decode_csv_line(file_bytes, starts[line], ends[line], encoding)
+                               for line in valid_lines[:CSV_SNIFF_LINES])
+    try:
+        detected_separator = csv.Sniffer().sniff(sample_content, delimiters=';,\t|').delimiter
+        logger.debug("Séparateur détecté pour %s: '%s'", file_name, detected_separator)
+    except csv.Error:
+        detected_separator = ';'  # Fallback
+        logger.info("Échec détection séparateur pour %s, utilisation de ';' par défaut", file_name)
+
+    # Les lignes ignorées sont sautées par le parseur, sans recopier le texte
+    skipped_lines = set(np.flatnonzero(~valid).tolist())
+    read_options = dict(sep=detected_separator, skiprows=skipped_lines, skip_blank_lines=True,
+                        encoding=encoding, engine='c', float_precision='round_trip')
+    if first_file:
+        read_options['header'] = 0
+    else:
+        skipped_lines.add(int(valid_lines[0])) # Ligne d'en-tête de ce fichier
+        read_options.update(header=None, names=column_names)
+    return read_options
 
-    combined_df = pd.concat(all_data_frames, ignore_index=True)
-    print(f"CSVs combinés. Nombre total de lignes après concaténation: {len(combined_df)}") # DEBUG: Nombre de lignes
-    print(f"Dimensions du DataFrame après concaténation: {combined_df.shape}")
-    print(f"Noms des colonnes du DataFrame combiné initial: {combined_df.columns.tolist()}")
+def read_armature_csv(file_bytes, file_name, first_file=True, column_names=None, encoding=None):
+    """Lit un CSV d'armatures directement depuis ses octets (moteur C de pandas).
 
-    # --- AJOUT : Création de la feuille "Raw_Concatenated_Data" ---
-    # Copier le DataFrame brut immédiatement après la concaténation
-    df_raw_concat_info = combined_df.copy()
+    Le premier fichier fournit les noms de colonnes par sa première ligne
+    valide ; pour les suivants, cette ligne d'en-tête est sautée et
+    'column_names' (ceux du premier fichier) est utilisé. Retourne un
+    DataFrame, ou None si le fichier ne contient aucune ligne valide.
+    """
+    if encoding is None:
+        encoding = detect_csv_encoding(file_bytes)
+    try:
+        read_options = csv_read_options(file_bytes, file_name, first_file, column_names, encoding)
+        if read_options is None:
+            return None
+        df = pd.read_csv(io.BytesIO(file_bytes), **read_options)
+        logger.debug("CSV %s: dimensions %s", file_name, df.shape)
+        return df
+    except UnicodeDecodeError:
+        # Octet invalide après le préfixe de détection : on passe à l'encodage suivant
+        next_index = CSV_ENCODINGS.index(encoding) + 1
+        if next_index >= len(CSV_ENCODINGS):
+            raise
+        logger.info("Échec du décodage de %s avec %s, essai avec %s.", file_name, encoding, CSV_ENCODINGS[next_index])
+        return read_armature_csv(file_bytes, file_name, first_file, column_names, CSV_ENCODINGS[next_index])
+
+def iter_armature_csv_chunks(file_bytes, file_name, first_file=True, column_names=None, chunksize=None):
+    """Comme read_armature_csv, mais produit le fichier par morceaux de 'chunksize' lignes.
+
+    L'encodage est vérifié sur tout le fichier avant le premier morceau : un
+    changement d'encodage en cours de lecture n'est plus possible une fois
+    des morceaux rendus.
+    """
+    encoding = detect_csv_encoding(file_bytes, whole_file=True)
+    read_options = csv_read_options(file_bytes, file_name, first_file, column_names, encoding)
+    if read_options is None:
+        return
+    with pd.read_csv(io.BytesIO(file_bytes), chunksize=chunksize or CSV_CHUNK_ROWS, **read_options) as reader:
+        yield from reader
+
+def _read_armature_file(index, file_info, column_names):
+    """Lit un fichier de la liste ; une erreur de lecture est journalisée et le fichier ignoré (None)."""
+    file_name = file_info['name']
+    logger.debug("Traitement du fichier: %s", file_name)
+    try:
+        return read_armature_csv(file_info['bytes'], file_name, index == 0, column_names)
+    except Exception as e:
+        logger.warning("Erreur lors de la lecture des données CSV du fichier %s: %s", file_name, e)
+        # Selon la robustesse désirée, on pourrait sauter le fichier ou lever une erreur.
+        return None
+
+def read_armature_files(csv_file_contents_list, max_workers=None):
+    """Lit tous les fichiers, dans l'ordre de la liste, et retourne leurs DataFrames
+       (None pour un fichier ignoré).
 
+       Le premier fichier est lu d'abord : il fournit les noms de colonnes des
+       suivants, lus ensuite en parallèle par au plus 'max_workers' threads
+       (CSV_READ_WORKERS par défaut). Les petits lots sont lus séquentiellement.
+    """
+    if not csv_file_contents_list:
+        return []
+    if max_workers is None:
+        max_workers = CSV_READ_WORKERS
+    first_df = _read_armature_file(0, csv_file_contents_list[0], None)
+    column_names = first_df.columns.tolist() if first_df is not None else None
+    if column_names is not None:
+        logger.debug("Premier CSV (%s): noms de colonnes dérivés: %s", csv_file_contents_list[0]['name'], column_names)
+
+    indexes = range(1, len(csv_file_contents_list))
+    others = csv_file_contents_list[1:]
+    if max_workers <= 1 or len(csv_file_contents_list) < CSV_PARALLEL_MIN_FILES:
+        other_dfs = [_read_armature_file(index, file_info, column_names) for index, file_info in zip(indexes, others)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(others))) as executor:
+            # map() rend les résultats dans l'ordre des fichiers
+            other_dfs = list(executor.map(_read_armature_file, indexes, others, repeat(column_names)))
+    return [first_df] + other_dfs
+
+def append_dataframe(ws, df, with_header=True):
+    """Écrit l'en-tête (si 'with_header') puis les lignes de 'df' dans une
+       feuille en écriture seule. Retourne False (rien d'écrit) si le DataFrame est vide.
+    """
+    if df.empty:
+        return False
+    if with_header:
+        ws.append(df.columns.tolist())
+    for row in df.itertuples(index=False, name=None):
+        ws.append(row)
+    return True
+
+def styled_cell(ws, value, style_name):
+    """Cellule d'une feuille en écriture seule portant un style nommé."""
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style_name
+    return cell
+
+def map_armature_columns(columns):
+    """Noms des colonnes VBA (E, G, H, I) pris par indice, ou None s'il manque des colonnes."""
     # Définir les indices des colonnes basé sur les noms (plus robuste)
     # Ces noms doivent correspondre aux en-têtes réels de vos fichiers CSV.
     # Exemple: si vos colonnes sont nommées 'Diametre', 'CoeffG', 'CoeffH', 'CoeffI'
@@ -152,80 +320,63 @@ def process_armature_csvs(csv_file_contents_list):
     # VBA Col I (pour calc K) -> Supposons 9ème col (index 8)
     try:
         col_E_idx, col_G_idx, col_H_idx, col_I_idx = 4, 6, 7, 8 # Indices supposés
-        col_E_name = combined_df.columns[col_E_idx]
-        col_G_name = combined_df.columns[col_G_idx]
-        col_H_name = combined_df.columns[col_H_idx]
-        col_I_name = combined_df.columns[col_I_idx]
-        print(f"Mapping des colonnes utilisé : E (Type HA) -> '{col_E_name}', G -> '{col_G_name}', H -> '{col_H_name}', I -> '{col_I_name}'") # DEBUG
+        col_E_name = columns[col_E_idx]
+        col_G_name = columns[col_G_idx]
+        col_H_name = columns[col_H_idx]
+        col_I_name = columns[col_I_idx]
     except IndexError:
-        print("Erreur: Le CSV ne contient pas assez de colonnes pour mapper E, G, H, I par indice.")
-        return None, "error_column_mapping.xlsx"
+        logger.error("Le CSV ne contient pas assez de colonnes pour mapper E, G, H, I par indice.")
+        return None
+    logger.debug("Mapping des colonnes utilisé : E (Type HA) -> '%s', G -> '%s', H -> '%s', I -> '%s'",
+                 col_E_name, col_G_name, col_H_name, col_I_name)
+    return col_E_name, col_G_name, col_H_name, col_I_name
 
+def prepare_armature_data(df, col_E_name, col_G_name, col_H_name, col_I_name):
+    """Nettoie E, G, H, I et ajoute la colonne 'K_Calculated' (en place).
+       *** AUCUNE LIGNE N'EST SUPPRIMÉE *** : les NaN sont gérés colonne par colonne.
+    """
     # 2. Nettoyer et Convertir les Données
-    cols_to_clean_numeric = [col_G_name, col_H_name, col_I_name]
-    for col_name in cols_to_clean_numeric:
-        combined_df[col_name] = combined_df[col_name].apply(clean_value_for_numeric_conversion)
-        combined_df[col_name] = pd.to_numeric(combined_df[col_name], errors='coerce')
+    for col_name in [col_G_name, col_H_name, col_I_name]:
+        df[col_name] = clean_numeric_column(df[col_name])
 
-    combined_df[col_E_name] = pd.to_numeric(combined_df[col_E_name], errors='coerce')
-    
-    # *** AUCUNE LIGNE NE DOIT ÊTRE SUPPRIMÉE ***
-    # Au lieu de supprimer les lignes avec des NaN, on va les gérer intelligemment
-    
-    print(f"Avant traitement des valeurs manquantes: {len(combined_df)} lignes")
-    
-    # Traitement spécial pour chaque colonne critique :
-    
     # Colonne E (Type HA) : Remplacer NaN par 0 (sera ignoré dans les calculs)
-    combined_df[col_E_name] = combined_df[col_E_name].fillna(0)
-    
-    # Colonne G : Remplacer NaN par 0 
-    combined_df[col_G_name] = combined_df[col_G_name].fillna(0)
-    
-    # Colonne H : Remplacer NaN par 0
-    combined_df[col_H_name] = combined_df[col_H_name].fillna(0)
-    
+    df[col_E_name] = pd.to_numeric(df[col_E_name], errors='coerce').fillna(0)
+    # Colonnes G et H : Remplacer NaN par 0
+    df[col_G_name] = df[col_G_name].fillna(0)
+    df[col_H_name] = df[col_H_name].fillna(0)
     # Colonne I : NE PAS remplacer les NaN - on va les traiter dans le calcul de K
-    # combined_df[col_I_name] = combined_df[col_I_name].fillna(1)  # Supprimé
-    
-    print(f"Après traitement des valeurs manquantes: {len(combined_df)} lignes (aucune suppression)")
-    print(f"Valeurs manquantes par colonne critique:")
-    print(f"  {col_E_name}: {combined_df[col_E_name].isna().sum()}")
-    print(f"  {col_G_name}: {combined_df[col_G_name].isna().sum()}")
-    print(f"  {col_H_name}: {combined_df[col_H_name].isna().sum()}")
-    print(f"  {col_I_name}: {combined_df[col_I_name].isna().sum()}")
 
     # 3. Calculer la Colonne K avec logique conditionnelle
     # Si I est vide (NaN) : K = G * H
     # Si I contient une valeur ≠ 0 : K = G * (H * 2 + I * 2 + 0.05)
-    def calculate_k_conditional(row):
-        G_val = row[col_G_name]
-        H_val = row[col_H_name] 
-        I_val = row[col_I_name]
-        
-        # Si I est NaN (vide), utiliser K = G * H
-        if pd.isna(I_val):
-            result = G_val * H_val
-            return result
-        else:
-            # Si I a une valeur, utiliser la formule complète K = G * (H * 2 + I * 2 + 0.05)
-            result = G_val * (H_val * 2 + I_val * 2 + 0.05)
-            return result
-    
-    combined_df['K_Calculated'] = combined_df.apply(calculate_k_conditional, axis=1)
-    print("Colonne 'K_Calculated' calculée avec logique conditionnelle :")
-    print("  - Si I vide : K = G * H")
-    print("  - Si I non vide : K = G * (H * 2 + I * 2 + 0.05)")
+    df['K_Calculated'] = calculate_k_column(df, col_G_name, col_H_name, col_I_name)
+    return df
 
-    # --- AJOUT : Création de la feuille "Info_Brute_K" ---
-    # Copier le DataFrame avant le groupby pour la feuille d'info
-    df_info_brute_k = combined_df.copy() # Renommé pour clarté
+def sum_k_by_ha_type(df, col_E_name):
+    """Longueur développée (somme de K) par type d'armature de HA_TYPES."""
+    return df.groupby(col_E_name)['K_Calculated'].sum().reindex(HA_TYPES, fill_value=0)
 
-    # 4. Agréger par type d'armature (Colonne E)
-    summary_by_ha = combined_df.groupby(col_E_name)['K_Calculated'].sum().reindex(HA_TYPES, fill_value=0)
-    print("Synthèse par type d'HA (longueur développée):")
-    print(summary_by_ha)
+def create_output_workbook():
+    """Classeur en écriture seule : les lignes sont écrites au fil de l'eau dans
+       l'ordre des feuilles "Resultat", "Raw_Concatenated_Data", "Info_Brute_K".
+       Retourne (wb, ws_resultat, ws_raw_concat, ws_info_k).
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws_resultat = wb.create_sheet(title="Resultat") # Remplie en dernier, après l'agrégation
+    ws_raw_concat = wb.create_sheet(title="Raw_Concatenated_Data")
+    ws_info_k = wb.create_sheet(title="Info_Brute_K") # Nom de variable ws_info_k pour clarté
+    return wb, ws_resultat, ws_raw_concat, ws_info_k
+
+def discard_output_workbook(wb):
+    """Abandonne un classeur en écriture seule non enregistré : flux des
+       feuilles fermés et fichiers temporaires supprimés tout de suite.
+    """
+    for ws in wb.worksheets:
+        ws.close()
+        ws._writer.cleanup()
 
+def write_result_sheet(wb, ws_resultat, summary_by_ha):
+    """Construit le tableau de synthèse (prix par type d'HA) et l'écrit dans "Resultat"."""
     # 5. Construire le DataFrame de résultat final
     result_data_rows = {
         "Armature": [
@@ -264,102 +415,235 @@ def process_armature_csvs(csv_file_contents_list):
 
     result_df = pd.DataFrame(result_data_rows)
     
-    # 6. Générer le fichier Excel en mémoire
-    output_excel_filename = "Synthese_Armatures.xlsx"
-    wb = openpyxl.Workbook()
-    ws_resultat = wb.active
-    ws_resultat.title = "Resultat"
-
-    # --- AJOUT : Écrire la feuille "Raw_Concatenated_Data" ---
-    ws_raw_concat = wb.create_sheet(title="Raw_Concatenated_Data")
-    # Écrire les en-têtes pour la feuille de données brutes concaténées
-    if not df_raw_concat_info.empty:
-        ws_raw_concat.append(df_raw_concat_info.columns.tolist())
-        # Écrire les données
-        for r_idx, row in enumerate(df_raw_concat_info.itertuples(index=False), 1):
-            for c_idx, value in enumerate(row, 1):
-                ws_raw_concat.cell(row=r_idx + 1, column=c_idx, value=value)
-        print(f"Feuille 'Raw_Concatenated_Data' ajoutée avec {len(df_raw_concat_info)} lignes.")
-    else:
-        print("Le DataFrame df_raw_concat_info est vide, la feuille 'Raw_Concatenated_Data' ne sera pas remplie.")
-
-    # --- AJOUT : Écrire la feuille "Info_Brute_K" --- 
-    ws_info_k = wb.create_sheet(title="Info_Brute_K") # Nom de variable ws_info_k pour clarté
-    # Écrire les en-têtes pour la feuille info_k
-    if not df_info_brute_k.empty:
-        ws_info_k.append(df_info_brute_k.columns.tolist())
-        # Écrire les données
-        for r_idx, row in enumerate(df_info_brute_k.itertuples(index=False), 1):
-            for c_idx, value in enumerate(row, 1):
-                ws_info_k.cell(row=r_idx + 1, column=c_idx, value=value)
-        print(f"Feuille 'Info_Brute_K' ajoutée avec {len(df_info_brute_k)} lignes.")
-    else:
-        print("Le DataFrame df_info_brute_k est vide, la feuille 'Info_Brute_K' ne sera pas remplie.")
-
-    # Écrire les en-têtes du tableau de synthèse sur la feuille "Resultat"
+    # 6. Écrire la feuille "Resultat" (styles nommés partagés, enregistrés une fois)
+    register_named_styles(wb, ['armature-header', 'armature-label', 'armature-length', 'armature-integer', 'armature-total'])
     header_list = ["Armature"] + [f"HA{ha}" for ha in HA_TYPES] + ["Prix total du fer"]
-    ws_resultat.append(header_list)
 
-    # Écrire les données du DataFrame de synthèse
-    for index in range(len(result_df["Armature"])):
-        row_to_append = [result_df["Armature"][index]]
-        for ha_type in HA_TYPES:
-            col_header_name = f"HA{ha_type}"
-            row_to_append.append(result_df[col_header_name][index])
-        
-        # Ajouter le prix total global sur la dernière ligne "Prix"
-        if result_df["Armature"][index] == "Prix":
-            row_to_append.append(round(total_prix_global))
-        else:
-            row_to_append.append(None) # Cellule vide pour les autres lignes dans cette colonne
-        ws_resultat.append(row_to_append)
-
-    # Appliquer le formatage (inspiré du VBA)
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid") # Bleu
-    for cell in ws_resultat[1]: # Première ligne (en-têtes)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-
-    for row_idx in range(2, ws_resultat.max_row + 1):
-        ws_resultat[f'A{row_idx}'].font = Font(bold=True) # Colonne "Armature" en gras
-
-    # Format des nombres (approximatif du style "Millier" et spécifique)
-    # Colonnes B à F (HA6 à HA14)
-    for col_idx_letter in [get_column_letter(c) for c in range(2, 2 + len(HA_TYPES))]:
-        for row_idx in range(2, ws_resultat.max_row + 1):
-            cell = ws_resultat[f'{col_idx_letter}{row_idx}']
-            if isinstance(cell.value, (int, float)):
-                armature_label = ws_resultat[f'A{row_idx}'].value
-                if armature_label == "longeur en ml":
-                    cell.number_format = '#,##0.00'
-                else:
-                    cell.number_format = '#,##0' # Entier avec séparateur de milliers
-    
-    # Cellule du prix total global (G7 dans l'image, dernière ligne/colonne ici)
-    cell_prix_total_global = ws_resultat.cell(row=ws_resultat.max_row, column=len(header_list))
-    cell_prix_total_global.font = Font(bold=True, color="FFFFFF", size=14)
-    cell_prix_total_global.fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid") # Rouge
-    cell_prix_total_global.number_format = '#,##0'
-
-    # Ajuster largeur des colonnes
+    # Largeurs des colonnes : à définir avant la première ligne en mode écriture seule
     ws_resultat.column_dimensions['A'].width = 20
     for i, _ in enumerate(HA_TYPES):
         ws_resultat.column_dimensions[get_column_letter(2 + i)].width = 15
     ws_resultat.column_dimensions[get_column_letter(len(header_list))].width = 18
 
+    ws_resultat.append([styled_cell(ws_resultat, header, 'armature-header') for header in header_list])
+
+    # Écrire les données du DataFrame de synthèse (formatage inspiré du VBA)
+    last_index = len(result_df["Armature"]) - 1
+    for index in range(len(result_df["Armature"])):
+        armature_label = result_df["Armature"][index]
+        row_to_append = [styled_cell(ws_resultat, armature_label, 'armature-label')] # Colonne "Armature" en gras
+        for ha_type in HA_TYPES:
+            value = result_df[f"HA{ha_type}"][index]
+            # Format des nombres (approximatif du style "Millier" et spécifique)
+            if isinstance(value, (int, float)):
+                style = 'armature-length' if armature_label == "longeur en ml" else 'armature-integer'
+                row_to_append.append(styled_cell(ws_resultat, value, style))
+            else:
+                row_to_append.append(value)
+
+        # Prix total global sur la ligne "Prix" ; vide pour les autres lignes
+        total_cell = round(total_prix_global) if armature_label == "Prix" else None
+        if index == last_index: # Cellule du prix total global (G7 dans l'image)
+            total_cell = styled_cell(ws_resultat, total_cell, 'armature-total')
+        row_to_append.append(total_cell)
+        ws_resultat.append(row_to_append)
+
+def save_output_workbook(wb, output_excel_filename):
     # Sauvegarder dans un flux binaire
     output_io = io.BytesIO()
     wb.save(output_io)
     output_io.seek(0)
     
-    print(f"Fichier Excel '{output_excel_filename}' généré en mémoire.")
+    logger.info("Fichier Excel '%s' généré en mémoire.", output_excel_filename)
     return output_io, output_excel_filename
 
+def _log_received_files(csv_file_contents_list):
+    logger.info("Traitement de %d fichier(s) CSV (%d octets)", len(csv_file_contents_list),
+                sum(len(file_info['bytes']) for file_info in csv_file_contents_list))
+    if debug_enabled(logger):
+        for i, file_info in enumerate(csv_file_contents_list):
+            logger.debug("Fichier %d: %s - Taille: %d bytes", i + 1, file_info['name'], len(file_info['bytes']))
+
+def process_armature_csvs(csv_file_contents_list, max_workers=None, streaming=None):
+    """
+    Fonction principale pour traiter une liste de contenus de fichiers CSV.
+    Chaque item de csv_file_contents_list est un dictionnaire 
+    comme {'name': 'filename.csv', 'bytes': b'contenu_csv'}
+
+    streaming=None choisit le mode incrémental (process_armature_csvs_streaming)
+    dès que le lot atteint ARMATURE_STREAMING_MIN_BYTES octets.
+    Les durées des étapes (read, evaluate, write, save) sont mesurées (voir metrics).
+    """
+    if streaming is None:
+        streaming = sum(len(file_info['bytes']) for file_info in csv_file_contents_list) >= STREAMING_MIN_BYTES
+    if streaming:
+        return process_armature_csvs_streaming(csv_file_contents_list)
+
+    with operation_trace('combine-armatures') as trace:
+        return _process_armature_csvs(csv_file_contents_list, max_workers, trace)
+
+def _process_armature_csvs(csv_file_contents_list, max_workers, trace):
+    _log_received_files(csv_file_contents_list)
+    
+    # 1. Lire (en parallèle si le lot est assez grand) et Combiner tous les fichiers CSV
+    with trace.span('read', bytes=sum(len(file_info['bytes']) for file_info in csv_file_contents_list)) as stage:
+        all_data_frames = [df for df in read_armature_files(csv_file_contents_list, max_workers) if df is not None]
+        
+        if not all_data_frames:
+            logger.warning("Aucune donnée CSV n'a été chargée.")
+            return None, "error_no_data.xlsx" # Retourner None pour indiquer une erreur
+
+        combined_df = pd.concat(all_data_frames, ignore_index=True)
+        stage.add(rows=len(combined_df), cells=combined_df.size)
+    logger.info("CSVs combinés: %d lignes, %d colonnes", *combined_df.shape)
+    if debug_enabled(logger):
+        logger.debug("Noms des colonnes du DataFrame combiné initial: %s", combined_df.columns.tolist())
+
+    column_mapping = map_armature_columns(combined_df.columns)
+    if column_mapping is None:
+        return None, "error_column_mapping.xlsx"
+    col_E_name = column_mapping[0] # Type HA
+
+    output_excel_filename = "Synthese_Armatures.xlsx"
+    wb, ws_resultat, ws_raw_concat, ws_info_k = create_output_workbook()
+
+    # --- AJOUT : Écrire la feuille "Raw_Concatenated_Data" ---
+    # Données brutes écrites avant le nettoyage, sans copie du DataFrame
+    with trace.span('write', rows=len(combined_df), cells=combined_df.size):
+        raw_written = append_dataframe(ws_raw_concat, combined_df)
+    if not raw_written:
+        logger.info("Le DataFrame combiné est vide, la feuille 'Raw_Concatenated_Data' ne sera pas remplie.")
+
+    # 2 et 3. Nettoyer les données et calculer la colonne K
+    # (K = G * H si I est vide, sinon K = G * (H * 2 + I * 2 + 0.05))
+    with trace.span('evaluate', rows=len(combined_df)):
+        prepare_armature_data(combined_df, *column_mapping)
+    if debug_enabled(logger):
+        logger.debug("Valeurs manquantes par colonne critique après nettoyage: %s",
+                     combined_df[list(column_mapping)].isna().sum().to_dict())
+
+    # --- AJOUT : Écrire la feuille "Info_Brute_K" ---
+    # Données nettoyées avec la colonne K, avant le groupby
+    with trace.span('write', rows=len(combined_df), cells=combined_df.size):
+        info_written = append_dataframe(ws_info_k, combined_df)
+    if not info_written:
+        logger.info("Le DataFrame combiné est vide, la feuille 'Info_Brute_K' ne sera pas remplie.")
+
+    # 4. Agréger par type d'armature (Colonne E)
+    with trace.span('evaluate'):
+        summary_by_ha = sum_k_by_ha_type(combined_df, col_E_name)
+    if debug_enabled(logger):
+        logger.debug("Synthèse par type d'HA (longueur développée):\n%s", summary_by_ha.to_string())
+
+    with trace.span('write'):
+        write_result_sheet(wb, ws_resultat, summary_by_ha)
+    with trace.span('save') as stage:
+        output_io, output_excel_filename = save_output_workbook(wb, output_excel_filename)
+        stage.add(bytes=output_io.getbuffer().nbytes)
+    return output_io, output_excel_filename
+
+def process_armature_csvs_streaming(csv_file_contents_list, chunksize=None):
+    """
+    Variante incrémentale de process_armature_csvs, sans DataFrame global.
+
+    Chaque fichier est lu par morceaux de 'chunksize' lignes (CSV_CHUNK_ROWS par
+    défaut). Chaque morceau est écrit dans "Raw_Concatenated_Data", nettoyé,
+    écrit dans "Info_Brute_K" puis réduit à ses sommes partielles par type
+    d'HA, fusionnées dans la synthèse finale : la mémoire utilisée suit le plus
+    gros morceau, pas le projet entier.
+
+    Les valeurs calculées sont celles du mode normal : les sommes d'un fichier
+    ne rejoignent la synthèse qu'une fois tout le fichier lu, et un fichier en
+    erreur avant son premier morceau est ignoré comme en mode normal. Seule
+    différence, le type (entier ou réel) d'une colonne est déduit morceau par
+    morceau. Les feuilles en écriture seule ne pouvant pas être reprises, une
+    erreur après le premier morceau écrit d'un fichier fait échouer le
+    traitement (None, message d'erreur) au lieu de produire un classeur qui
+    contiendrait une partie de ce fichier.
+    """
+    with operation_trace('combine-armatures-streaming') as trace:
+        return _process_armature_csvs_streaming(csv_file_contents_list, chunksize, trace)
+
+def _process_armature_csvs_streaming(csv_file_contents_list, chunksize, trace):
+    _log_received_files(csv_file_contents_list)
+    output_excel_filename = "Synthese_Armatures.xlsx"
+    wb, ws_resultat, ws_raw_concat, ws_info_k = create_output_workbook()
+
+    column_names_from_first_csv = None
+    column_mapping = None
+    summary_by_ha = None
+    raw_header_written = info_header_written = False
+    total_rows = 0
+
+    for i, file_info in enumerate(csv_file_contents_list):
+        file_name = file_info['name']
+        logger.debug("Traitement du fichier: %s", file_name)
+        file_rows = 0
+        file_summary = None # Sommes du fichier, ajoutées à la synthèse s'il est lu en entier
+        file_written = False
+        try:
+            chunks = iter_armature_csv_chunks(file_info['bytes'], file_name, i == 0,
+                                              column_names_from_first_csv, chunksize)
+            while True:
+                with trace.span('read', bytes=len(file_info['bytes']) if file_rows == 0 else 0) as stage:
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        stage.add(rows=len(chunk), cells=chunk.size)
+                if chunk is None:
+                    break
+                if i == 0 and column_names_from_first_csv is None:
+                    column_names_from_first_csv = chunk.columns.tolist() # Sauvegarder les noms de colonnes
+                    logger.debug("Premier CSV (%s): noms de colonnes dérivés: %s", file_name, column_names_from_first_csv)
+                if column_mapping is None:
+                    column_mapping = map_armature_columns(chunk.columns)
+                    if column_mapping is None:
+                        discard_output_workbook(wb)
+                        return None, "error_column_mapping.xlsx"
+
+                file_written = True
+                with trace.span('write', rows=len(chunk), cells=chunk.size):
+                    raw_header_written |= append_dataframe(ws_raw_concat, chunk, not raw_header_written)
+                with trace.span('evaluate', rows=len(chunk)):
+                    prepare_armature_data(chunk, *column_mapping)
+                with trace.span('write', rows=len(chunk), cells=chunk.size):
+                    info_header_written |= append_dataframe(ws_info_k, chunk, not info_header_written)
+
+                with trace.span('evaluate'):
+                    partial_sums = sum_k_by_ha_type(chunk, column_mapping[0])
+                    file_summary = partial_sums if file_summary is None else file_summary.add(partial_sums)
+                file_rows += len(chunk)
+        except Exception as e:
+            if file_written:
+                logger.error("Erreur lors de la lecture des données CSV du fichier %s après %d lignes: %s", file_name, file_rows, e)
+                discard_output_workbook(wb)
+                return None, f"Le fichier {file_name} est illisible après {file_rows} lignes déjà écrites: {e}"
+            logger.warning("Erreur lors de la lecture des données CSV du fichier %s: %s", file_name, e)
+            continue
+        if file_summary is not None:
+            summary_by_ha = file_summary if summary_by_ha is None else summary_by_ha.add(file_summary)
+        total_rows += file_rows
+        logger.debug("CSV %s: %d lignes traitées", file_name, file_rows)
+
+    if summary_by_ha is None:
+        logger.warning("Aucune donnée CSV n'a été chargée.")
+        discard_output_workbook(wb)
+        return None, "error_no_data.xlsx" # Retourner None pour indiquer une erreur
+
+    logger.info("CSVs traités par morceaux: %d lignes", total_rows)
+    if debug_enabled(logger):
+        logger.debug("Synthèse par type d'HA (longueur développée):\n%s", summary_by_ha.to_string())
+
+    with trace.span('write'):
+        write_result_sheet(wb, ws_resultat, summary_by_ha)
+    with trace.span('save') as stage:
+        output_io, output_excel_filename = save_output_workbook(wb, output_excel_filename)
+        stage.add(bytes=output_io.getbuffer().nbytes)
+    return output_io, output_excel_filename
 
 if __name__ == '__main__':
     # Bloc de test pour exécuter le script localement
+    from app_logging import configure_logging
+    configure_logging()
     print("Exécution du script combineArm.py en mode test...")
     # Simuler des fichiers CSV venant de Flutter
     # IMPORTANT: Adaptez ces données et surtout les NOMS DE COLONNES aux vôtres!
@@ -1,9 +1,13 @@
 # estim_batiment_routes.py
+import logging
+
 from flask import Blueprint, request, jsonify, send_file
-from estim_engine import process_estim_batiment
+from estim_engine import process_estim_batiment, process_estim_scenarios
+from result_cache import result_cache, xlsx_response
 
 # Création d'un "Blueprint" pour regrouper les routes liées à l'estimation
 estim_batiment_bp = Blueprint('estim_batiment', __name__)
+logger = logging.getLogger(__name__)
 
 @estim_batiment_bp.route('/estim-batiment', methods=['POST'])
 def estim_batiment_route():
@@ -18,28 +22,79 @@ def estim_batiment_route():
     if not uploaded_file or not uploaded_file.filename:
         return jsonify({"error": "Fichier Excel valide requis."}), 400
 
-    print(f"Fichier reçu pour estimation bâtiment: {uploaded_file.filename}")
+    logger.info("Fichier reçu pour estimation bâtiment: %s", uploaded_file.filename)
 
     try:
         file_bytes = uploaded_file.read()
         if not file_bytes:
             return jsonify({"error": "Le fichier envoyé est vide."}), 400
 
+        # Même fichier déjà traité : on renvoie le résultat en cache
+        cache_key = result_cache.make_key('estim-batiment', [file_bytes])
+        cached = result_cache.get(cache_key)
+        if cached:
+            logger.info("Envoi du fichier d'estimation depuis le cache: %s", cached[1])
+            return xlsx_response(cached[0], cached[1], 'HIT')
+
         # Appel de la logique métier centralisée
         output_excel_io, output_filename = process_estim_batiment(file_bytes)
         
         if output_excel_io and output_filename:
-            print(f"Envoi du fichier d'estimation: {output_filename}")
-            return send_file(
-                output_excel_io,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name=output_filename
-            )
+            output_bytes = output_excel_io.getvalue()
+            result_cache.put(cache_key, output_bytes, output_filename)
+            logger.info("Envoi du fichier d'estimation: %s", output_filename)
+            return xlsx_response(output_bytes, output_filename, 'MISS')
         else:
             error_message = output_filename or "Erreur inconnue lors du traitement"
             return jsonify({"error": error_message}), 500
             
     except Exception as e:
-        print(f"Exception critique dans la route /estim-batiment: {e}")
+        logger.exception("Exception critique dans la route /estim-batiment: %s", e)
+        return jsonify({"error": f"Erreur serveur critique: {str(e)}"}), 500
+
+@estim_batiment_bp.route('/estim-batiment/scenarios', methods=['POST'])
+def estim_batiment_scenarios_route():
+    """
+    Endpoint "what-if" : évalue un modèle d'estimation pour plusieurs tables 'qt'.
+    
+    Form-data:
+        excel_file: classeur modèle (ses feuilles 'qt' et 'qt_<nom>' sont des scénarios).
+        scenarios (optionnel): JSON [{"name": ..., "qt": {item: {header: valeur}}}] ou {nom: qt}.
+        format (optionnel): "json" (défaut) pour les totaux par scénario, "xlsx" pour un classeur comparatif.
+    """
+    if 'excel_file' not in request.files:
+        return jsonify({"error": "Fichier Excel requis avec la clé 'excel_file'."}), 400
+
+    uploaded_file = request.files['excel_file']
+    
+    if not uploaded_file or not uploaded_file.filename:
+        return jsonify({"error": "Fichier Excel valide requis."}), 400
+
+    output_format = (request.form.get('format') or request.args.get('format') or 'json').strip().lower()
+    json_scenarios = request.form.get('scenarios')
+    logger.info("Fichier reçu pour scénarios d'estimation: %s", uploaded_file.filename)
+
+    try:
+        file_bytes = uploaded_file.read()
+        if not file_bytes:
+            return jsonify({"error": "Le fichier envoyé est vide."}), 400
+
+        result, detail = process_estim_scenarios(file_bytes, json_scenarios, output_format)
+
+        if result is None:
+            error_message = detail or "Erreur inconnue lors du traitement"
+            return jsonify({"error": error_message}), 400
+        if output_format == 'json':
+            return jsonify(result), 200
+
+        logger.info("Envoi du classeur des scénarios: %s", detail)
+        return send_file(
+            result,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=detail
+        )
+            
+    except Exception as e:
+        logger.exception("Exception critique dans la route /estim-batiment/scenarios: %s", e)
         return jsonify({"error": f"Erreur serveur critique: {str(e)}"}), 500
@@ -1,15 +1,102 @@
 # estim_engine.py
 import openpyxl
 import io
+import json
+import logging
+
+from workbook_reader import DualViewWorkbook
+from metrics import operation_trace
 
 # Import des modules de traitement depuis le sous-dossier "EstimBatiment"
-from EstimBatiment.data_reader import get_qt_data, get_open_data, get_simple_block_data, get_formula_block_data
-from EstimBatiment.calculation_engine import parse_calcul_sheet_and_process_blocks, process_menuiserie_block, process_simple_block, process_formula_block, write_recap_block
+from EstimBatiment.data_reader import get_qt_data, get_qt_data_from_mapping, get_open_data, get_simple_block_data, get_formula_block_data
+from EstimBatiment.calculation_engine import parse_calcul_sheet_blocks, parse_calcul_sheet_and_process_blocks, process_menuiserie_block, process_simple_block, process_formula_block, write_recap_block
+from EstimBatiment.batch_evaluator import QtMatrix, BatchQuantities
+from EstimBatiment.scenarios import EstimateTemplate
+from EstimBatiment.excel_writer import OutputSheet, create_scenario_comparison_sheet, create_scenario_errors_sheet
+from EstimBatiment.number_to_letter_converter import conv_number_letter
+
+REQUIRED_FORMULA_SHEETS = ["calcul", "Peinture", "Revetement", "Toiture"]
+REQUIRED_VALUE_SHEETS = ["qt", "open", "Electricite", "Plomberie"]
+logger = logging.getLogger(__name__)
+
+# Feuilles 'qt' supplémentaires d'un classeur de scénarios : "qt_<nom du scénario>"
+SCENARIO_SHEET_PREFIX = "qt_"
+MAX_SCENARIOS = 200
+
+def _load_estimate_sheets(excel_file_bytes, scenario_sheets=False, json_scenario_count=0):
+    """
+    Lit une seule fois les feuilles utiles du classeur d'estimation.
+    Avec scenario_sheets, les feuilles 'qt_<nom>' sont aussi lues, sauf si le
+    nombre de scénarios (feuille 'qt', feuilles 'qt_<nom>' et json_scenario_count
+    scénarios JSON) dépasse MAX_SCENARIOS : aucune feuille n'est alors décodée.
+    
+    Returns:
+        tuple: (sheets_formulas, sheets_values, scenario_qt_sheets, None)
+               ou (None, None, None, error_message)
+    """
+    try:
+        logger.debug("Traitement EstimBatiment - Chargement du classeur (%d octets)", len(excel_file_bytes))
+        # Une seule lecture du fichier : formules et valeurs en cache sont décodées ensemble
+        input_wb = DualViewWorkbook(excel_file_bytes)
+    except Exception as e:
+        logger.warning("Erreur lors de l'ouverture du fichier d'estimation: %s", e)
+        return None, None, None, f"Erreur lors de l'ouverture du fichier: {str(e)}"
+
+    scenario_sheet_names = []
+    if scenario_sheets:
+        scenario_sheet_names = [name for name in input_wb.sheetnames
+                                if name.lower().startswith(SCENARIO_SHEET_PREFIX) and len(name) > len(SCENARIO_SHEET_PREFIX)]
+        scenario_count = len(scenario_sheet_names) + ("qt" in input_wb.sheetnames) + json_scenario_count
+        if scenario_count > MAX_SCENARIOS:
+            input_wb.close()
+            return None, None, None, f"Trop de scénarios ({scenario_count}), maximum {MAX_SCENARIOS}."
+
+    # --- CORRECTION APPLIQUÉE ICI ---
+    # On utilise la bonne méthode pour récupérer les feuilles du classeur.
+    # Seules ces huit feuilles (et les feuilles de scénarios) sont décompressées et décodées.
+    try:
+        sheets_formulas = {}
+        for name in REQUIRED_FORMULA_SHEETS:
+            if name in input_wb.sheetnames:
+                sheets_formulas[name] = input_wb.formula_sheet(name)
+            else:
+                sheets_formulas[name] = None
+
+        sheets_values = {}
+        for name in REQUIRED_VALUE_SHEETS:
+            if name in input_wb.sheetnames:
+                sheets_values[name] = input_wb.value_sheet(name)
+            else:
+                sheets_values[name] = None
+
+        scenario_qt_sheets = {}
+        for name in scenario_sheet_names:
+            scenario_qt_sheets[name[len(SCENARIO_SHEET_PREFIX):]] = input_wb.value_sheet(name)
+    except Exception as e:
+        logger.warning("Erreur lors de la lecture des feuilles d'estimation: %s", e)
+        return None, None, None, f"Erreur lors de l'ouverture du fichier: {str(e)}"
+    finally:
+        input_wb.close()
+    # --- FIN DE LA CORRECTION ---
+
+    return sheets_formulas, sheets_values, scenario_qt_sheets, None
+
+def _read_block_data(sheets_formulas, sheets_values):
+    """Lit les données des feuilles de blocs (hors 'qt' et 'calcul')."""
+    return {
+        "open": get_open_data(sheets_values.get("open")) if sheets_values.get("open") else [],
+        "Electricite": get_simple_block_data(sheets_values.get("Electricite")) if sheets_values.get("Electricite") else [],
+        "Plomberie": get_simple_block_data(sheets_values.get("Plomberie")) if sheets_values.get("Plomberie") else [],
+        "Peinture": get_formula_block_data(sheets_formulas.get("Peinture")) if sheets_formulas.get("Peinture") else [],
+        "Revetement": get_formula_block_data(sheets_formulas.get("Revetement")) if sheets_formulas.get("Revetement") else [],
+        "Toiture": get_formula_block_data(sheets_formulas.get("Toiture")) if sheets_formulas.get("Toiture") else [],
+    }
 
 def process_estim_batiment(excel_file_bytes):
     """
     Traite un fichier Excel d'estimation et génère un devis détaillé.
     C'est la logique métier principale, sans code web.
+    Les durées des étapes (load, read, evaluate, write, save) sont mesurées (voir metrics).
     
     Args:
         excel_file_bytes: Bytes du fichier Excel d'entrée
@@ -17,33 +104,14 @@ def process_estim_batiment(excel_file_bytes):
     Returns:
         tuple: (output_excel_io, output_filename) ou (None, error_message)
     """
-    try:
-        print("Traitement EstimBatiment - Chargement du classeur...")
-        input_wb_formulas = openpyxl.load_workbook(io.BytesIO(excel_file_bytes), data_only=False)
-        input_wb_values = openpyxl.load_workbook(io.BytesIO(excel_file_bytes), data_only=True)
-    except Exception as e:
-        print(f"Erreur lors de l'ouverture du fichier d'estimation: {e}")
-        return None, f"Erreur lors de l'ouverture du fichier: {str(e)}"
+    with operation_trace('estim-batiment') as trace:
+        return _process_estim_batiment(excel_file_bytes, trace)
 
-    required_formula_sheets = ["calcul", "Peinture", "Revetement", "Toiture"]
-    required_value_sheets = ["qt", "open", "Electricite", "Plomberie"]
-
-    # --- CORRECTION APPLIQUÉE ICI ---
-    # On utilise la bonne méthode pour récupérer les feuilles du classeur
-    sheets_formulas = {}
-    for name in required_formula_sheets:
-        if name in input_wb_formulas.sheetnames:
-            sheets_formulas[name] = input_wb_formulas[name]
-        else:
-            sheets_formulas[name] = None
-
-    sheets_values = {}
-    for name in required_value_sheets:
-        if name in input_wb_values.sheetnames:
-            sheets_values[name] = input_wb_values[name]
-        else:
-            sheets_values[name] = None
-    # --- FIN DE LA CORRECTION ---
+def _process_estim_batiment(excel_file_bytes, trace):
+    with trace.span('load', bytes=len(excel_file_bytes)):
+        sheets_formulas, sheets_values, _, error_message = _load_estimate_sheets(excel_file_bytes)
+    if error_message:
+        return None, error_message
 
     qt_sheet = sheets_values.get("qt")
     calcul_sheet = sheets_formulas.get("calcul")
@@ -54,53 +122,203 @@ def process_estim_batiment(excel_file_bytes):
         return None, "La feuille 'calcul' est obligatoire et manquante dans le fichier."
 
     # --- Lecture des données ---
-    print("Lecture des données...")
-    qt_data_dict = get_qt_data(qt_sheet)
-    open_data_list = get_open_data(sheets_values.get("open")) if sheets_values.get("open") else []
-    electricite_data_list = get_simple_block_data(sheets_values.get("Electricite")) if sheets_values.get("Electricite") else []
-    plomberie_data_list = get_simple_block_data(sheets_values.get("Plomberie")) if sheets_values.get("Plomberie") else []
-    peinture_data_list = get_formula_block_data(sheets_formulas.get("Peinture")) if sheets_formulas.get("Peinture") else []
-    revetement_data_list = get_formula_block_data(sheets_formulas.get("Revetement")) if sheets_formulas.get("Revetement") else []
-    toiture_data_list = get_formula_block_data(sheets_formulas.get("Toiture")) if sheets_formulas.get("Toiture") else []
+    with trace.span('read') as stage:
+        logger.debug("Lecture des données...")
+        qt_data_dict = get_qt_data(qt_sheet)
+        block_data = _read_block_data(sheets_formulas, sheets_values)
+        stage.add(rows=len(qt_data_dict) + sum(len(data_list) for data_list in block_data.values()),
+                  cells=qt_data_dict.value_matrix.size)
+    open_data_list = block_data["open"]
+    electricite_data_list = block_data["Electricite"]
+    plomberie_data_list = block_data["Plomberie"]
+    peinture_data_list = block_data["Peinture"]
+    revetement_data_list = block_data["Revetement"]
+    toiture_data_list = block_data["Toiture"]
+
+    # --- Évaluation vectorisée de toutes les formules de quantité ---
+    # Colonne D de 'calcul' et formules de Revetement/Peinture/Toiture, en une seule passe NumPy
+    with trace.span('evaluate') as stage:
+        formulas = [row[3] for row in calcul_sheet.iter_rows(values_only=True) if len(row) > 3]
+        for data_list in (revetement_data_list, peinture_data_list, toiture_data_list):
+            formulas.extend(item.get('formula_or_qty', 0.0) for item in data_list)
+        quantities = BatchQuantities.evaluate(formulas, QtMatrix.from_qt_data(qt_data_dict))[0]
+        stage.add(rows=len(formulas))
 
     # --- Configuration et traitement du classeur de sortie ---
-    output_wb = openpyxl.Workbook()
-    main_output_sheet = output_wb.active
-    main_output_sheet.title = "Estimation Globale"
-    
-    recap_entries = []
-    current_excel_row = 1 
-
-    print("Analyse de la feuille 'calcul' et génération des tableaux...")
-    current_excel_row = parse_calcul_sheet_and_process_blocks(calcul_sheet, qt_data_dict, main_output_sheet, recap_entries)
-
-    if open_data_list:
-        current_excel_row = process_menuiserie_block(open_data_list, main_output_sheet, current_excel_row, recap_entries)
-    if electricite_data_list:
-        current_excel_row = process_simple_block(electricite_data_list, main_output_sheet, current_excel_row, "V", "ELECTRICITE", 1, recap_entries)
-    if plomberie_data_list:
-        current_excel_row = process_simple_block(plomberie_data_list, main_output_sheet, current_excel_row, "VI", "PLOMBERIE SANITAIRE", 1, recap_entries)
-    if revetement_data_list:
-        current_excel_row = process_formula_block(revetement_data_list, qt_data_dict, main_output_sheet, current_excel_row, "VII", "REVETEMENT", 1, recap_entries)
-    if peinture_data_list:
-        current_excel_row = process_formula_block(peinture_data_list, qt_data_dict, main_output_sheet, current_excel_row, "VIII", "PEINTURE", 1, recap_entries)
-    if toiture_data_list:
-        current_excel_row = process_formula_block(toiture_data_list, qt_data_dict, main_output_sheet, current_excel_row, "IX", "TOITURE", 1, recap_entries)
-
-    if recap_entries:
-        write_recap_block(main_output_sheet, current_excel_row, recap_entries)
+    # Feuille en écriture seule : les lignes sont émises dans l'ordre puis compressées à la sauvegarde
+    with trace.span('write') as stage:
+        output_wb = openpyxl.Workbook(write_only=True)
+        main_output_sheet = OutputSheet(output_wb.create_sheet("Estimation Globale"))
+        
+        recap_entries = []
+        current_excel_row = 1 
+
+        logger.debug("Analyse de la feuille 'calcul' et génération des tableaux...")
+        current_excel_row = parse_calcul_sheet_and_process_blocks(calcul_sheet, qt_data_dict, main_output_sheet, recap_entries, quantities)
+
+        if open_data_list:
+            current_excel_row = process_menuiserie_block(open_data_list, main_output_sheet, current_excel_row, recap_entries)
+        if electricite_data_list:
+            current_excel_row = process_simple_block(electricite_data_list, main_output_sheet, current_excel_row, "V", "ELECTRICITE", 1, recap_entries)
+        if plomberie_data_list:
+            current_excel_row = process_simple_block(plomberie_data_list, main_output_sheet, current_excel_row, "VI", "PLOMBERIE SANITAIRE", 1, recap_entries)
+        if revetement_data_list:
+            current_excel_row = process_formula_block(revetement_data_list, qt_data_dict, main_output_sheet, current_excel_row, "VII", "REVETEMENT", 1, recap_entries, quantities)
+        if peinture_data_list:
+            current_excel_row = process_formula_block(peinture_data_list, qt_data_dict, main_output_sheet, current_excel_row, "VIII", "PEINTURE", 1, recap_entries, quantities)
+        if toiture_data_list:
+            current_excel_row = process_formula_block(toiture_data_list, qt_data_dict, main_output_sheet, current_excel_row, "IX", "TOITURE", 1, recap_entries, quantities)
+
+        if recap_entries:
+            write_recap_block(main_output_sheet, current_excel_row, recap_entries)
+        stage.add(rows=main_output_sheet.max_row)
 
     if main_output_sheet.max_row <= 1: 
         return None, "Aucun bloc n'a été traité ou aucune donnée valide trouvée."
 
     # --- Sauvegarde en mémoire ---
     try:
-        output_filename = "Estimation_Batiment_Calculee.xlsx"
+        with trace.span('save') as stage:
+            output_filename = "Estimation_Batiment_Calculee.xlsx"
+            output_io = io.BytesIO()
+            output_wb.save(output_io)
+            output_io.seek(0)
+            stage.add(bytes=output_io.getbuffer().nbytes)
+        logger.info("Fichier d'estimation généré avec succès.")
+        return output_io, output_filename
+    except Exception as e:
+        logger.exception("Erreur lors de la sauvegarde du fichier d'estimation: %s", e)
+        return None, f"Erreur lors de la sauvegarde: {str(e)}"
+
+
+def _parse_json_scenarios(json_scenarios):
+    """
+    Normalise les scénarios JSON : liste [{"name": ..., "qt": {...}}] ou objet {nom: {...}}.
+    Accepte aussi le texte JSON brut. Lève ValueError si le format est invalide.
+    Retourne [(nom, table qt JSON)] : les QtTable ne sont construites qu'une fois
+    le nombre total de scénarios vérifié.
+    """
+    if json_scenarios is None:
+        return []
+    if isinstance(json_scenarios, (str, bytes)):
+        try:
+            json_scenarios = json.loads(json_scenarios)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON des scénarios invalide: {e}")
+    if isinstance(json_scenarios, dict):
+        json_scenarios = [{"name": name, "qt": qt} for name, qt in json_scenarios.items()]
+    if not isinstance(json_scenarios, list):
+        raise ValueError("Les scénarios doivent être une liste [{\"name\": ..., \"qt\": {...}}] ou un objet {nom: qt}.")
+
+    scenarios = []
+    for index, scenario in enumerate(json_scenarios, start=1):
+        if not isinstance(scenario, dict) or "qt" not in scenario:
+            raise ValueError(f"Le scénario n°{index} doit contenir une table 'qt'.")
+        name = str(scenario.get("name") or f"Scénario {index}")
+        scenarios.append((name, scenario["qt"]))
+    return scenarios
+
+def _build_estimate_template(calcul_sheet, block_data):
+    """Assemble les blocs du devis dans le même ordre que process_estim_batiment."""
+    template = EstimateTemplate()
+    for block_roman, block_title, block_items in parse_calcul_sheet_blocks(calcul_sheet):
+        template.add_formula_block(block_roman, block_title, block_items)
+    template.add_fixed_block("IV", "MENUISERIE", [(item.nombre, item.prix_unitaire) for item in block_data["open"]])
+    template.add_fixed_block("V", "ELECTRICITE", [(item.number, item.unit_price) for item in block_data["Electricite"]])
+    template.add_fixed_block("VI", "PLOMBERIE SANITAIRE", [(item.number, item.unit_price) for item in block_data["Plomberie"]])
+    for roman_numeral, title, sheet_name in (("VII", "REVETEMENT", "Revetement"), ("VIII", "PEINTURE", "Peinture"), ("IX", "TOITURE", "Toiture")):
+        template.add_formula_block(roman_numeral, title, [
+            (item.get('description', ''), item.get('unit', ''), item.get('formula_or_qty', 0.0), item.get('pu', 0.0))
+            for item in block_data[sheet_name]
+        ])
+    return template
+
+def process_estim_scenarios(excel_file_bytes, json_scenarios=None, output_format="json"):
+    """
+    Évalue un même modèle d'estimation pour plusieurs tables 'qt' (scénarios "what-if").
+    Le modèle est lu une seule fois et toutes les formules de tous les scénarios
+    sont évaluées en un seul lot vectorisé.
+    
+    Args:
+        excel_file_bytes: Bytes du classeur modèle. Sa feuille 'qt' (si présente) et ses
+                          feuilles 'qt_<nom>' sont autant de scénarios.
+        json_scenarios: Scénarios supplémentaires, liste [{"name": ..., "qt": {item: {header: valeur}}}],
+                        objet {nom: qt} ou texte JSON.
+        output_format (str): "json" pour les totaux par scénario, "xlsx" pour un classeur comparatif.
+        
+    Returns:
+        tuple: (result_dict, None) en JSON, (output_excel_io, output_filename) en xlsx,
+               ou (None, error_message)
+    """
+    if output_format not in ("json", "xlsx"):
+        return None, f"Format de sortie inconnu '{output_format}' (attendu: json ou xlsx)."
+    try:
+        json_qt_tables = _parse_json_scenarios(json_scenarios)
+    except ValueError as e:
+        return None, str(e)
+
+    # Nombre de scénarios vérifié avant de décoder les feuilles et de construire les tables
+    sheets_formulas, sheets_values, scenario_qt_sheets, error_message = _load_estimate_sheets(
+        excel_file_bytes, scenario_sheets=True, json_scenario_count=len(json_qt_tables))
+    if error_message:
+        return None, error_message
+
+    calcul_sheet = sheets_formulas.get("calcul")
+    if calcul_sheet is None:
+        return None, "La feuille 'calcul' est obligatoire et manquante dans le fichier."
+
+    # --- Scénarios : feuille 'qt', feuilles 'qt_<nom>', puis scénarios JSON ---
+    scenarios = []
+    if sheets_values.get("qt") is not None:
+        scenarios.append(("qt", get_qt_data(sheets_values["qt"])))
+    for name, sheet in scenario_qt_sheets.items():
+        scenarios.append((name, get_qt_data(sheet)))
+    try:
+        scenarios.extend((name, get_qt_data_from_mapping(qt_mapping)) for name, qt_mapping in json_qt_tables)
+    except ValueError as e:
+        return None, str(e)
+
+    if not scenarios:
+        return None, "Aucun scénario : fournir une feuille 'qt', des feuilles 'qt_<nom>' ou des scénarios JSON."
+    scenario_names = [name for name, _ in scenarios]
+    if len(set(scenario_names)) != len(scenario_names):
+        return None, "Les noms de scénarios doivent être uniques."
+
+    # --- Modèle lu une seule fois, évaluation de tous les scénarios en un lot ---
+    logger.info("Évaluation de %d scénario(s)...", len(scenarios))
+    template = _build_estimate_template(calcul_sheet, _read_block_data(sheets_formulas, sheets_values))
+    block_totals, errors = template.evaluate([qt_data for _, qt_data in scenarios])
+
+    if output_format == "json":
+        result = {"scenarios": []}
+        for scenario_index, name in enumerate(scenario_names):
+            blocks = [{"roman": block['roman'], "title": block['title'], "total": float(block_totals[scenario_index, block_index])}
+                      for block_index, block in enumerate(template.blocks)]
+            total = float(block_totals[scenario_index].sum())
+            result["scenarios"].append({
+                "name": name,
+                "blocks": blocks,
+                "total": total,
+                "total_en_lettres": conv_number_letter(round(total), devise=1, langue=0),
+                "errors": [error.to_dict() for error in errors[scenario_index]],
+            })
+        return result, None
+
+    # --- Classeur comparatif ---
+    try:
+        output_wb = openpyxl.Workbook()
+        comparison_sheet = output_wb.active
+        comparison_sheet.title = "Comparaison scénarios"
+        create_scenario_comparison_sheet(comparison_sheet, scenario_names, template.blocks, block_totals)
+        if any(errors):
+            create_scenario_errors_sheet(output_wb.create_sheet("Erreurs"), scenario_names, errors)
+
+        output_filename = "Estimation_Batiment_Scenarios.xlsx"
         output_io = io.BytesIO()
         output_wb.save(output_io)
         output_io.seek(0)
-        print("Fichier d'estimation généré avec succès.")
+        logger.info("Classeur comparatif des scénarios généré avec succès.")
         return output_io, output_filename
     except Exception as e:
-        print(f"Erreur lors de la sauvegarde du fichier d'estimation: {e}")
+        logger.exception("Erreur lors de la sauvegarde du classeur des scénarios: %s", e)
         return None, f"Erreur lors de la sauvegarde: {str(e)}"
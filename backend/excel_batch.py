@@ -0,0 +1,169 @@
+# excel_batch.py
+"""
+Traitement d'un lot de classeurs (/process-excel-batch) : chaque classeur,
+avec sa propre liste de feuilles, est traité dans un pool local (processus ou
+threads) et le résultat est renvoyé dans une archive ZIP écrite au fil de
+l'eau : un fichier est envoyé au client dès que son classeur est terminé,
+dans l'ordre de fin. Le rapport du lot (rapport.json) termine l'archive.
+
+Configuration par variables d'environnement :
+    EXCEL_BATCH_EXECUTOR  ('process' par défaut, ou 'thread')
+    EXCEL_BATCH_WORKERS   (défaut : nombre de processeurs, 4 au plus)
+    EXCEL_BATCH_MAX_FILES (classeurs par requête, défaut 50)
+"""
+import io
+import json
+import logging
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from app_logging import capture_log_context, run_with_log_context
+from metrics import record_trace, run_traced
+from result_cache import result_cache
+
+BATCH_EXECUTOR = os.environ.get('EXCEL_BATCH_EXECUTOR', 'process').strip().lower()
+BATCH_WORKERS = max(1, int(os.environ.get('EXCEL_BATCH_WORKERS', min(4, os.cpu_count() or 1))))
+BATCH_MAX_FILES = int(os.environ.get('EXCEL_BATCH_MAX_FILES', 50))
+REPORT_NAME = 'rapport.json'
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem:
+    """Un classeur du lot : fichier envoyé, feuilles demandées, puis nom et statut dans l'archive."""
+
+    def __init__(self, filename, file_bytes, sheet_names, cache_key=None):
+        self.filename = filename
+        self.file_bytes = file_bytes
+        self.sheet_names = sheet_names
+        self.cache_key = cache_key
+        self.output_name = None
+        self.cache_status = 'MISS'
+        self.error = None
+
+    def to_dict(self):
+        info = {'file': self.filename, 'sheet_names': self.sheet_names}
+        if self.error is None:
+            info.update({'output': self.output_name, 'cache': self.cache_status})
+        else:
+            info['error'] = self.error
+        return info
+
+
+class _ZipStream(io.RawIOBase):
+    """Flux non positionnable dans lequel zipfile écrit ; les octets sont repris par pop()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def output_name(filename, used_names):
+    """Nom du classeur traité dans l'archive ("Devis.xlsx" -> "Devis_traite.xlsx"), unique dans le lot."""
+    stem = os.path.splitext(os.path.basename(filename.replace('\\', '/')))[0] or 'classeur'
+    name, counter = f"{stem}_traite.xlsx", 2
+    while name.lower() in used_names:
+        name, counter = f"{stem}_traite ({counter}).xlsx", counter + 1
+    used_names.add(name.lower())
+    return name
+
+
+def _create_executor(max_workers):
+    if BATCH_EXECUTOR == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='excel-batch')
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+
+def stream_batch_zip(items, process, log_context=None, max_workers=None):
+    """
+    Générateur des octets de l'archive ZIP du lot. 'process'(octets, feuilles)
+    retourne (fichier BytesIO, nom) ou (None, message d'erreur), comme
+    traiter_fichier_excel_core ; il doit pouvoir être transmis à un processus
+    du pool. Les résultats déjà en cache sont écrits en premier, sans passer
+    par le pool ; un seul classeur à traiter l'est sans pool.
+
+    Le générateur est parcouru après la fin de la vue Flask, quand
+    l'identifiant de requête est déjà retiré : 'log_context' doit être capturé
+    (capture_log_context) dans la vue.
+    """
+    if max_workers is None:
+        max_workers = BATCH_WORKERS
+    if log_context is None:
+        log_context = capture_log_context()
+    stream = _ZipStream()
+    used_names = {REPORT_NAME}
+    pending = []
+
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        def add_result(item, data):
+            item.output_name = output_name(item.filename, used_names)
+            # Un .xlsx est déjà compressé : stocké tel quel
+            archive.writestr(item.output_name, data)
+            item.file_bytes = None
+
+        def finish(item, get_outcome):
+            try:
+                (output_io, filename_or_error), traces = get_outcome()
+            except Exception as e:
+                item.error = f"Erreur serveur critique: {e}"
+                logger.error("Lot: '%s': %s", item.filename, e, exc_info=e)
+                return
+            for record in traces:
+                record_trace(record)
+            if output_io is None:
+                item.error = filename_or_error or "Erreur inconnue lors du traitement"
+                logger.warning("Lot: '%s' non traité: %s", item.filename, item.error)
+                return
+            data = output_io.getvalue()
+            if item.cache_key:
+                result_cache.put(item.cache_key, data, filename_or_error)
+            add_result(item, data)
+
+        for item in items:
+            cached = result_cache.get(item.cache_key) if item.cache_key else None
+            if cached:
+                item.cache_status = 'HIT'
+                add_result(item, cached[0])
+            else:
+                pending.append(item)
+        yield stream.pop()
+
+        if len(pending) == 1 or max_workers == 1:
+            for item in pending:
+                run_with_log_context(log_context, finish, item, lambda: run_traced(process, item.file_bytes, item.sheet_names))
+                yield stream.pop()
+        elif pending:
+            executor = _create_executor(min(max_workers, len(pending)))
+            try:
+                futures = {executor.submit(run_with_log_context, log_context, run_traced, process, item.file_bytes, item.sheet_names): item
+                           for item in pending}
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        run_with_log_context(log_context, finish, futures.pop(future), future.result)
+                    yield stream.pop()
+            finally:
+                # Client déconnecté : les classeurs pas encore commencés sont abandonnés
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        report = {
+            'processed': sum(1 for item in items if item.error is None),
+            'failed': sum(1 for item in items if item.error is not None),
+            'files': [item.to_dict() for item in items],
+        }
+        archive.writestr(REPORT_NAME, json.dumps(report, ensure_ascii=False, indent=2))
+        run_with_log_context(log_context, logger.info, "Lot de %d classeurs: %d traités, %d en erreur",
+                             len(items), report['processed'], report['failed'])
+    yield stream.pop()
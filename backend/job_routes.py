@@ -0,0 +1,116 @@
+# job_routes.py
+import logging
+
+from flask import Blueprint, request, jsonify, url_for
+from combineArm import process_armature_csvs
+from estim_engine import process_estim_batiment
+from jobs import DONE, FAILED, QUEUED, JobQueueFull, job_queue
+from metrics import server_timing_header
+from result_cache import result_cache, xlsx_response
+from utility_routes import cle_cache_process_excel, traiter_fichier_excel_core
+
+# Blueprint des traitements asynchrones : même contenu de requête que les routes
+# synchrones, plus le champ 'type' qui désigne le traitement
+jobs_bp = Blueprint('jobs', __name__)
+logger = logging.getLogger(__name__)
+
+# --- Préparation des jobs : (fonction, arguments, clé de cache) ou message d'erreur ---
+
+def _estim_batiment_job():
+    uploaded_file = request.files.get('excel_file')
+    if not uploaded_file or not uploaded_file.filename:
+        return "Fichier Excel requis avec la clé 'excel_file'."
+    file_bytes = uploaded_file.read()
+    if not file_bytes:
+        return "Le fichier envoyé est vide."
+    return process_estim_batiment, (file_bytes,), result_cache.make_key('estim-batiment', [file_bytes])
+
+def _combine_armatures_job():
+    files_data = [{'name': f.filename, 'bytes': f.read()} for f in request.files.getlist('csv_files') if f and f.filename]
+    if not files_data:
+        return "Aucun fichier trouvé avec la clé 'csv_files'."
+    cache_key = result_cache.make_key('combine-armatures', [f['bytes'] for f in files_data],
+                                      {'names': [f['name'] for f in files_data]})
+    return process_armature_csvs, (files_data,), cache_key
+
+def _process_excel_job():
+    uploaded_file = request.files.get('excel_file')
+    if not uploaded_file:
+        return "Aucun fichier ('excel_file') envoyé"
+    sheet_names_str = request.form.get('sheet_names')
+    if not sheet_names_str:
+        return "Noms de feuilles à traiter non fournis ('sheet_names')"
+    file_bytes = uploaded_file.read()
+    return traiter_fichier_excel_core, (file_bytes, sheet_names_str), cle_cache_process_excel(file_bytes, sheet_names_str)
+
+JOB_TYPES = {
+    'estim-batiment': _estim_batiment_job,
+    'combine-armatures': _combine_armatures_job,
+    'process-excel': _process_excel_job,
+}
+
+def _job_status(job):
+    position = job_queue.queue_position(job) if job.status == QUEUED else None
+    info = job.to_dict(position)
+    info['status_url'] = url_for('jobs.job_status_route', job_id=job.id)
+    if job.status == DONE:
+        info['result_url'] = url_for('jobs.job_result_route', job_id=job.id)
+    return info
+
+# --- Routes ---
+
+@jobs_bp.route('/jobs', methods=['POST'])
+def submit_job_route():
+    """
+    Lance un traitement en arrière-plan et répond tout de suite 202 {job_id}.
+
+    Form-data:
+        type: 'estim-batiment', 'combine-armatures' ou 'process-excel'.
+        + les champs de la route synchrone correspondante (excel_file, csv_files, sheet_names).
+    """
+    job_type = (request.form.get('type') or request.args.get('type') or '').strip().lower()
+    prepare = JOB_TYPES.get(job_type)
+    if prepare is None:
+        return jsonify({"error": f"Type de traitement inconnu: '{job_type}'. Types possibles: {', '.join(JOB_TYPES)}."}), 400
+
+    prepared = prepare()
+    if isinstance(prepared, str):
+        return jsonify({"error": prepared}), 400
+    func, args, cache_key = prepared
+
+    try:
+        job = job_queue.submit(job_type, func, args, cache_key)
+    except JobQueueFull as e:
+        return jsonify({"error": f"Serveur occupé, réessayez plus tard ({e})"}), 503, {'Retry-After': '30'}
+
+    logger.info("Job %s (%s) soumis, statut: %s", job.id, job_type, job.status)
+    info = _job_status(job)
+    return jsonify(info), 202, {'Location': info['status_url']}
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status_route(job_id):
+    """État du job : queued (avec sa position), running, done ou failed."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job inconnu ou expiré."}), 404
+    return jsonify(_job_status(job)), 200
+
+@jobs_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result_route(job_id):
+    """Fichier produit par le job ; 409 tant qu'il n'est pas terminé."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job inconnu ou expiré."}), 404
+    if job.status == FAILED:
+        return jsonify({"error": job.error, "status": job.status}), 500
+    if job.status != DONE:
+        return jsonify({"error": "Le traitement n'est pas terminé.", "status": job.status}), 409
+    response = xlsx_response(job.result, job.filename, job.cache_status)
+    if job.traces:
+        response.headers['Server-Timing'] = server_timing_header(job.traces)
+    return response
+
+@jobs_bp.route('/jobs-stats', methods=['GET'])
+def jobs_stats_route():
+    """Compteurs et occupation de la file des jobs."""
+    return jsonify(job_queue.stats()), 200
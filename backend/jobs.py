@@ -0,0 +1,302 @@
+# jobs.py
+"""
+File de traitements asynchrones pour les classeurs volumineux.
+
+Un job exécute une fonction de traitement (process_estim_batiment,
+process_armature_csvs, traiter_fichier_excel_core...) hors de la requête HTTP,
+dans un pool local de processus (ou de threads). Le client interroge ensuite
+son état puis télécharge le fichier produit. L'état ne comporte pas
+d'avancement en pourcentage : seuls la position dans la file et le temps
+écoulé sont connus.
+
+Les jobs sont gardés en mémoire du processus serveur : terminés, ils sont
+supprimés au-delà d'un nombre, d'une taille totale de résultats ou d'une durée.
+Un résultat réussi est aussi enregistré dans le cache des résultats.
+
+Configuration par variables d'environnement :
+    JOB_EXECUTOR        ('process' par défaut, ou 'thread')
+    JOB_WORKERS         (défaut 2)
+    JOB_MAX_PENDING     (jobs en attente ou en cours, défaut 32)
+    JOB_MAX_FINISHED    (jobs terminés conservés, défaut 100)
+    JOB_MAX_RESULT_BYTES (taille totale des résultats conservés, défaut 512 Mo)
+    JOB_TTL             (secondes de conservation d'un job terminé, défaut 3600)
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app_logging import capture_log_context, run_with_log_context
+from metrics import record_trace, run_traced
+from result_cache import result_cache
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 32
+DEFAULT_MAX_FINISHED = 100
+DEFAULT_MAX_RESULT_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 3600
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Trop de jobs en attente : la requête doit être refusée (503)."""
+
+
+class Job:
+    """État d'un job ; 'result' contient les octets du fichier une fois le job terminé."""
+
+    def __init__(self, kind, cache_key=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.cache_key = cache_key
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.filename = None
+        self.error = None
+        self.cache_status = 'MISS'
+        self.future = None
+        self.traces = [] # Traces (metrics) du traitement, pour l'en-tête Server-Timing
+        self.log_context = capture_log_context() # Journaux du job rattachés à la requête qui l'a soumis
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self, queue_position=None):
+        now = time.time()
+        info = {
+            'job_id': self.id,
+            'type': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == QUEUED:
+            info['queue_position'] = queue_position
+        if self.started_at is not None:
+            info['elapsed_seconds'] = round((self.finished_at or now) - self.started_at, 3)
+        if self.status == DONE:
+            info.update({'filename': self.filename, 'size': len(self.result)})
+        if self.status == FAILED:
+            info['error'] = self.error
+        return info
+
+
+def _run_in_thread(job, func, args):
+    """Exécution en mode 'thread' : le début du traitement est connu exactement."""
+    job.started_at = time.time()
+    job.status = RUNNING
+    return job.started_at, run_with_log_context(job.log_context, run_traced, func, *args)
+
+
+def _run_in_process(log_context, func, args):
+    """
+    Exécution en mode 'process' : l'heure de début, inconnue du serveur tant
+    que le job tourne, est renvoyée avec le résultat.
+    """
+    started_at = time.time()
+    return started_at, run_with_log_context(log_context, run_traced, func, *args)
+
+
+class JobQueue:
+    """
+    Jobs indexés par identifiant, exécutés par un pool local. Utilisable
+    depuis plusieurs threads.
+    """
+
+    def __init__(self, executor='process', max_workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 max_finished=DEFAULT_MAX_FINISHED, max_result_bytes=DEFAULT_MAX_RESULT_BYTES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.max_result_bytes = max_result_bytes
+        self.ttl_seconds = ttl_seconds
+        self._executor = None # Créé au premier job
+        self._jobs = OrderedDict() # job_id -> Job, dans l'ordre de soumission
+        self._finished = OrderedDict() # job_id -> Job terminé, dans l'ordre de fin
+        self._result_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'done': 0, 'failed': 0, 'rejected': 0, 'evicted': 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            executor=os.environ.get('JOB_EXECUTOR', 'process').strip().lower(),
+            max_workers=max(1, int(os.environ.get('JOB_WORKERS', DEFAULT_WORKERS))),
+            max_pending=int(os.environ.get('JOB_MAX_PENDING', DEFAULT_MAX_PENDING)),
+            max_finished=int(os.environ.get('JOB_MAX_FINISHED', DEFAULT_MAX_FINISHED)),
+            max_result_bytes=int(os.environ.get('JOB_MAX_RESULT_BYTES', DEFAULT_MAX_RESULT_BYTES)),
+            ttl_seconds=int(os.environ.get('JOB_TTL', DEFAULT_TTL_SECONDS)),
+        )
+
+    def submit(self, kind, func, args, cache_key=None):
+        """
+        Crée un job exécutant func(*args), qui doit retourner (fichier BytesIO,
+        nom du fichier) ou (None, message d'erreur). Si 'cache_key' est déjà en
+        cache, le job est terminé immédiatement. Lève JobQueueFull si trop de
+        jobs sont en attente.
+        """
+        job = Job(kind, cache_key)
+        cached = result_cache.get(cache_key) if cache_key else None
+        with self._lock:
+            self._evict_expired()
+            if not cached and len(self._jobs) - len(self._finished) >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise JobQueueFull(f"{self.max_pending} jobs déjà en attente ou en cours.")
+            self._jobs[job.id] = job
+            self._counters['submitted'] += 1
+            if cached:
+                job.started_at = job.created_at
+                job.cache_status = 'HIT'
+                self._finish(job, cached[0], cached[1], None)
+                return job
+
+        try:
+            try:
+                job.future = self._submit(job, func, args)
+            except BrokenProcessPool:
+                # Un processus du pool est mort (mémoire...) : nouveau pool
+                self._reset_executor()
+                job.future = self._submit(job, func, args)
+        except Exception as e:
+            # Sans cela le job resterait 'queued' indéfiniment
+            logger.error("Job %s (%s): soumission impossible: %s", job.id, job.kind, e, exc_info=e)
+            with self._lock:
+                job.started_at = job.created_at
+                self._finish(job, None, None, f"Erreur serveur critique: {e}")
+            return job
+        job.future.add_done_callback(lambda future: run_with_log_context(job.log_context, self._on_done, job, future))
+        return job
+
+    def get(self, job_id):
+        """Retourne le job (état à jour) ou None s'il est inconnu ou expiré."""
+        with self._lock:
+            self._evict_expired()
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == QUEUED and job.future is not None and job.future.running():
+                # Pool de processus : le job a été confié à un processus du pool ;
+                # heure approchée (première interrogation), remplacée à la fin du job
+                job.status = RUNNING
+                job.started_at = time.time()
+        return job
+
+    def queue_position(self, job):
+        """Nombre de jobs soumis avant 'job' et pas encore démarrés (0 = prochain)."""
+        with self._lock:
+            position = 0
+            for other in self._jobs.values():
+                if other is job:
+                    return position
+                if other.status == QUEUED:
+                    position += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'executor': self.executor_kind,
+                'workers': self.max_workers,
+                'pending': len(self._jobs) - len(self._finished),
+                'finished': len(self._finished),
+                'result_bytes': self._result_bytes,
+            })
+        return stats
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _submit(self, job, func, args):
+        with self._lock:
+            if self._executor is None:
+                if self.executor_kind == 'thread':
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+                else:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            executor = self._executor
+        if self.executor_kind == 'thread':
+            return executor.submit(_run_in_thread, job, func, args)
+        return executor.submit(_run_in_process, job.log_context, func, args)
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _on_done(self, job, future):
+        data, filename, error, started_at = None, None, None, None
+        try:
+            started_at, ((output_io, filename_or_error), job.traces) = future.result()
+            # Traces collectées dans le processus du pool : enregistrées ici
+            for record in job.traces:
+                record_trace(record)
+            if output_io is not None and filename_or_error:
+                data, filename = output_io.getvalue(), filename_or_error
+            else:
+                error = filename_or_error or "Erreur inconnue lors du traitement"
+        except BrokenProcessPool as e:
+            error = f"Erreur serveur critique: {e}"
+            logger.error("Job %s (%s): pool de processus interrompu: %s", job.id, job.kind, e)
+            self._reset_executor()
+        except Exception as e:
+            error = f"Erreur serveur critique: {e}"
+            logger.error("Job %s (%s): %s", job.id, job.kind, e, exc_info=e)
+        if data is not None and job.cache_key:
+            result_cache.put(job.cache_key, data, filename)
+        with self._lock:
+            if started_at is not None:
+                job.started_at = started_at
+            elif job.started_at is None:
+                job.started_at = job.created_at
+            self._finish(job, data, filename, error)
+
+    # --- Rétention (appelé avec self._lock) ---
+
+    def _finish(self, job, data, filename, error):
+        job.finished_at = time.time()
+        job.future = None
+        if error is None:
+            job.result, job.filename, job.status = data, filename, DONE
+            self._result_bytes += len(data)
+            self._counters['done'] += 1
+        else:
+            job.error, job.status = error, FAILED
+            self._counters['failed'] += 1
+        self._finished[job.id] = job
+        # Les plus anciens jobs terminés partent en premier ; le dernier est toujours gardé
+        while len(self._finished) > 1 and (len(self._finished) > self.max_finished or self._result_bytes > self.max_result_bytes):
+            self._evict(next(iter(self._finished)))
+
+    def _evict_expired(self):
+        now = time.time()
+        while self._finished:
+            job_id, job = next(iter(self._finished.items()))
+            if now - job.finished_at <= self.ttl_seconds:
+                break
+            self._evict(job_id)
+
+    def _evict(self, job_id):
+        job = self._finished.pop(job_id)
+        self._jobs.pop(job_id, None)
+        if job.result is not None:
+            self._result_bytes -= len(job.result)
+        self._counters['evicted'] += 1
+
+
+# Instance partagée par les routes
+job_queue = JobQueue.from_env()
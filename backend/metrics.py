@@ -0,0 +1,264 @@
+# metrics.py
+"""
+Mesure du temps passé par étape de traitement (load, read, evaluate, write, save).
+
+Un traitement ouvre une trace, et chaque étape un span :
+
+    with operation_trace('estim-batiment') as trace:
+        with trace.span('load', bytes=len(file_bytes)):
+            ...
+        with trace.span('read') as stage:
+            ...
+            stage.add(rows=n_rows, cells=n_cells)
+
+Les spans d'une même étape s'additionnent (ex. les morceaux d'un CSV lu en
+streaming). À la fin de la trace, chaque étape donne une observation dans des
+histogrammes en mémoire du processus : durée, lignes, cellules et octets.
+Ils sont exposés au format texte Prometheus (render_prometheus, route /metrics)
+et les traces d'une requête alimentent son en-tête Server-Timing.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRIC_PREFIX = 'excel_api'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTES_BUCKETS = (10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000)
+
+# Traces terminées de la requête en cours (None hors requête)
+_request_traces = ContextVar('request_traces', default=None)
+# False dans un job : les traces sont renvoyées au processus serveur qui les enregistre
+_record_traces = ContextVar('record_traces', default=True)
+
+
+class Histogram:
+    """Histogramme Prometheus à étiquettes, utilisable depuis plusieurs threads."""
+
+    def __init__(self, name, documentation, buckets, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {} # valeurs des étiquettes -> [compte par borne..., somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for label_values, series in snapshot:
+            labels = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{_format_number(bound)}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {_format_number(series[-2])}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+STAGE_DURATION = Histogram(f"{METRIC_PREFIX}_stage_duration_seconds",
+                           "Durée d'une étape de traitement, en secondes.", DURATION_BUCKETS, ('operation', 'stage'))
+STAGE_ROWS = Histogram(f"{METRIC_PREFIX}_stage_rows",
+                       "Lignes traitées par une étape.", COUNT_BUCKETS, ('operation', 'stage'))
+STAGE_CELLS = Histogram(f"{METRIC_PREFIX}_stage_cells",
+                        "Cellules traitées par une étape.", COUNT_BUCKETS, ('operation', 'stage'))
+STAGE_BYTES = Histogram(f"{METRIC_PREFIX}_stage_bytes",
+                        "Octets lus (load) ou produits (save) par une étape.", BYTES_BUCKETS, ('operation', 'stage'))
+HISTOGRAMS = (STAGE_DURATION, STAGE_ROWS, STAGE_CELLS, STAGE_BYTES)
+_COUNT_HISTOGRAMS = {'rows': STAGE_ROWS, 'cells': STAGE_CELLS, 'bytes': STAGE_BYTES}
+
+
+class StageTotals:
+    """Durée et compteurs cumulés d'une étape ; add() ajoute des compteurs."""
+    __slots__ = ('duration', 'counts')
+
+    def __init__(self):
+        self.duration = 0.0
+        self.counts = {}
+
+    def add(self, **counts):
+        for name, value in counts.items():
+            if name not in _COUNT_HISTOGRAMS:
+                raise ValueError(f"Compteur inconnu: {name}")
+            self.counts[name] = self.counts.get(name, 0) + value
+
+
+class OperationTrace:
+    """Étapes d'un traitement, dans l'ordre de leur premier span."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.stages = {} # stage -> StageTotals
+        self.duration = 0.0
+
+    @contextmanager
+    def span(self, stage, **counts):
+        totals = self.stages.get(stage)
+        if totals is None:
+            totals = self.stages[stage] = StageTotals()
+        totals.add(**counts)
+        start = time.perf_counter()
+        try:
+            yield totals
+        finally:
+            totals.duration += time.perf_counter() - start
+
+    def to_record(self):
+        """(operation, durée totale, [(étape, durée, compteurs)]) : forme transmise depuis un job."""
+        return (self.operation, self.duration,
+                [(stage, totals.duration, dict(totals.counts)) for stage, totals in self.stages.items()])
+
+
+@contextmanager
+def operation_trace(operation):
+    """Trace d'un traitement ; enregistrée (ou transmise) à la sortie du bloc, même en cas d'erreur."""
+    trace = OperationTrace(operation)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.duration = time.perf_counter() - start
+        record = trace.to_record()
+        if _record_traces.get():
+            record_trace(record)
+        request_traces = _request_traces.get()
+        if request_traces is not None:
+            request_traces.append(record)
+
+
+def record_trace(record):
+    """Ajoute une trace terminée aux histogrammes."""
+    operation, duration, stages = record
+    STAGE_DURATION.observe(duration, operation, 'total')
+    for stage, stage_duration, counts in stages:
+        STAGE_DURATION.observe(stage_duration, operation, stage)
+        for name, value in counts.items():
+            _COUNT_HISTOGRAMS[name].observe(value, operation, stage)
+
+
+def run_traced(func, *args):
+    """
+    Exécute func(*args) en collectant ses traces sans les enregistrer (job en
+    processus séparé ou non). Retourne (résultat, traces) ; le serveur les
+    enregistre avec record_trace().
+    """
+    records = []
+    traces_token = _request_traces.set(records)
+    record_token = _record_traces.set(False)
+    try:
+        return func(*args), records
+    finally:
+        _record_traces.reset(record_token)
+        _request_traces.reset(traces_token)
+
+
+# --- Requêtes HTTP ---
+
+def start_request_traces():
+    """Début d'une requête : ses traces seront collectées. Retourne le jeton pour end_request_traces()."""
+    return _request_traces.set([])
+
+
+def end_request_traces(token):
+    _request_traces.reset(token)
+
+
+def current_request_traces():
+    return _request_traces.get() or []
+
+
+def server_timing_header(records, total_seconds=None):
+    """
+    Valeur de l'en-tête Server-Timing : une entrée par étape (durées en ms),
+    précédée du nom du traitement quand la réponse en regroupe plusieurs.
+    """
+    entries = []
+    prefix_operations = len(records) > 1
+    for operation, _, stages in records:
+        for stage, duration, _ in stages:
+            name = f"{operation}.{stage}" if prefix_operations else stage
+            entries.append(f'{_timing_token(name)};dur={duration * 1000:.1f};desc="{operation}"')
+    if total_seconds is not None:
+        entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def install_request_tracing(app):
+    """Collecte les traces de chaque requête et ajoute Server-Timing aux réponses fichier."""
+    from flask import g
+
+    @app.before_request
+    def _start_request_tracing():
+        g.metrics_token = start_request_traces()
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _add_server_timing(response):
+        is_file = response.headers.get('Content-Disposition', '').startswith('attachment')
+        if is_file and 'Server-Timing' not in response.headers and 'metrics_start' in g:
+            response.headers['Server-Timing'] = server_timing_header(
+                current_request_traces(), time.perf_counter() - g.metrics_start)
+        return response
+
+    @app.teardown_request
+    def _end_request_tracing(exc):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            end_request_traces(token)
+
+
+# --- Format texte Prometheus ---
+
+def render_prometheus(gauges=None):
+    """
+    Histogrammes des étapes, suivis des jauges 'gauges' ({nom: {clé: valeur}}) :
+    chaque valeur numérique devient la métrique '<préfixe>_<nom>_<clé>'.
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for group, values in (gauges or {}).items():
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                name = f"{METRIC_PREFIX}_{_metric_token(group)}_{_metric_token(key)}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _metric_token(name):
+    return "".join(char if char.isascii() and (char.isalnum() or char == '_') else '_' for char in str(name))
+
+
+def _timing_token(name):
+    return "".join(char if char.isascii() and (char.isalnum() or char in '_.-') else '_' for char in str(name))
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
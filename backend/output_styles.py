@@ -0,0 +1,68 @@
+# output_styles.py
+"""
+Registre des styles nommés des classeurs générés (EstimBatiment et combineArm).
+
+Les définitions sont partagées au niveau du module ; chaque classeur reçoit
+ses propres objets NamedStyle (un NamedStyle est lié à un seul classeur),
+enregistrés une seule fois par register_named_styles(). Une cellule reçoit
+ensuite son style par son nom : cell.style = "amount".
+"""
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
+
+thin_black_side = Side(style='thin', color='000000')
+black_border = Border(left=thin_black_side, right=thin_black_side, top=thin_black_side, bottom=thin_black_side)
+bold_font = Font(bold=True)
+header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+letter_fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
+
+# Nom du style -> attributs (font, fill, border, alignment, number_format) ;
+# police et bordure absentes = celles par défaut du classeur
+STYLE_DEFINITIONS = {
+    # --- EstimBatiment : tableaux des blocs et récapitulatif ---
+    'block-header': {'font': bold_font, 'fill': header_fill, 'border': black_border,
+                     'alignment': Alignment(horizontal='left', vertical='center')},
+    'block-header-center': {'font': bold_font, 'fill': header_fill, 'border': black_border,
+                            'alignment': Alignment(horizontal='center', vertical='center')},
+    'bordered': {'border': black_border},
+    'item-row': {'border': black_border,
+                 'alignment': Alignment(horizontal='left', vertical='center')},
+    'item-row-center': {'border': black_border,
+                        'alignment': Alignment(horizontal='center', vertical='center')},
+    'item-description': {'border': black_border,
+                         'alignment': Alignment(wrap_text=True, vertical='top')},
+    'amount': {'border': black_border, 'number_format': '#,##0.00',
+               'alignment': Alignment(horizontal='right', vertical='center')},
+    'total': {'font': bold_font, 'border': black_border,
+              'alignment': Alignment(horizontal='left', vertical='center')},
+    'total-amount': {'font': bold_font, 'border': black_border, 'number_format': '#,##0.00',
+                     'alignment': Alignment(horizontal='right', vertical='center')},
+    'recap-letter': {'font': bold_font, 'fill': letter_fill,
+                     'alignment': Alignment(horizontal='left', vertical='center', wrap_text=True)},
+    # --- combineArm : feuille "Resultat" ---
+    'armature-header': {'font': Font(bold=True, color="FFFFFF"),
+                        'fill': PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid"), # Bleu
+                        'alignment': Alignment(horizontal="center")},
+    'armature-label': {'font': bold_font},
+    'armature-length': {'number_format': '#,##0.00'},
+    'armature-integer': {'number_format': '#,##0'}, # Entier avec séparateur de milliers
+    'armature-total': {'font': Font(bold=True, color="FFFFFF", size=14),
+                       'fill': PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid"), # Rouge
+                       'number_format': '#,##0'},
+}
+
+
+def register_named_styles(wb, names=None):
+    """
+    Enregistre dans le classeur 'wb' les styles nommés demandés (tous par défaut)
+    qui n'y sont pas encore. Retourne le classeur.
+    """
+    existing = set(wb.named_styles)
+    for name in (names if names is not None else STYLE_DEFINITIONS):
+        if name not in existing:
+            attributes = {'font': DEFAULT_FONT, 'border': DEFAULT_BORDER}
+            attributes.update(STYLE_DEFINITIONS[name])
+            wb.add_named_style(NamedStyle(name=name, **attributes))
+            existing.add(name)
+    return wb
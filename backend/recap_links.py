@@ -0,0 +1,100 @@
+# recap_links.py
+"""
+Réécriture des liens des feuilles récapitulatives copiées.
+
+Dans le classeur traité, chaque feuille copiée s'appelle "<feuille>_copie" :
+une référence Bordereau!F5, 'Gros oeuvre'!F9 ou [1]Bordereau!F3 (classeur
+externe) d'une feuille récap doit viser la copie, soit Bordereau_copie!F5.
+Toutes les références d'une formule sont réécrites en un seul passage d'une
+expression compilée (=A!F5+B!F9 compris) ; les chaînes entre guillemets et
+les références 3D (Feuil1:Feuil3!A1) ne sont pas modifiées.
+"""
+import re
+
+COPY_SUFFIX = "_copie"
+
+# Chaîne littérale ou référence 3D Feuil1:Feuil3! (laissées telles quelles),
+# nom de feuille entre apostrophes, ou nom de feuille simple, éventuellement
+# précédé d'un classeur externe [1]. Une référence 3D ne suit jamais '!' ni
+# '$' : dans Bordereau!F1:Bordereau!F3, F1:Bordereau! n'en est pas une.
+_SHEET_REFERENCE = re.compile(
+    r'"(?:[^"]|"")*"'
+    r"|(?<![\w.\]'!$])(?:\[[^\]]*\])?[^\W\d][\w.]*:[^\W\d][\w.]*!"
+    r"|'((?:[^']|'')+)'!"
+    r"|(?<![\w.\]'])((?:\[[^\]]*\])?[^\W\d][\w.]*)!"
+)
+_NEEDS_QUOTES = re.compile(r"[\s!@#$%^&*()+={}\[\]:;\"'<>,.?/\\|-]")
+
+
+def add_quotes_if_necessary(sheet_name):
+    if _NEEDS_QUOTES.search(sheet_name) or sheet_name.lower() in ("true", "false") or sheet_name[:1].isdigit():
+        escaped_name = sheet_name.replace("'", "''")
+        return f"'{escaped_name}'"
+    return sheet_name
+
+
+class RecapLinkRewriter:
+    """
+    Réécrit les références aux feuilles sources vers leurs copies présentes
+    dans 'sheet_names' (feuilles du classeur de destination). La recherche
+    d'une feuille source ignore la casse, comme Excel.
+    """
+
+    def __init__(self, sheet_names):
+        # nom de la feuille source (minuscules) -> référence à sa copie, déjà entre apostrophes si besoin
+        self.targets = {
+            name[:-len(COPY_SUFFIX)].strip().lower(): add_quotes_if_necessary(name) + "!"
+            for name in sheet_names if name.endswith(COPY_SUFFIX)
+        }
+        self.existing = {name.strip().lower() for name in sheet_names}
+
+    def rewrite_formula(self, formula, missing=None):
+        """
+        Retourne (formule réécrite, nombre de références réécrites). Les feuilles
+        référencées sans copie sont ajoutées à l'ensemble 'missing' s'il est fourni.
+        """
+        rewritten = 0
+
+        def replace(match):
+            nonlocal rewritten
+            quoted, plain = match.group(1), match.group(2)
+            if quoted is None and plain is None:
+                return match.group(0)
+            raw_name = quoted.replace("''", "'") if quoted is not None else plain
+            # Sans le classeur externe ([1]Feuille, 'C:\...\[Devis.xlsx]Feuille') : ']' est interdit dans un nom de feuille
+            sheet_name = raw_name.rsplit("]", 1)[-1].strip()
+            if ":" in sheet_name:
+                return match.group(0) # Référence 3D entre apostrophes ('Feuil 1:Feuil3'!A1)
+            target = self.targets.get(sheet_name.lower())
+            if target is None:
+                if missing is not None and sheet_name.lower() not in self.existing:
+                    missing.add(sheet_name)
+                return match.group(0)
+            rewritten += 1
+            return target
+
+        return _SHEET_REFERENCE.sub(replace, formula), rewritten
+
+    def rewrite_sheet(self, ws):
+        """
+        Réécrit en un passage toutes les formules de la feuille 'ws' (feuille
+        openpyxl ou copie de sheet_cloner). Les formules matricielles ne sont
+        pas modifiées. Retourne le rapport de réécriture.
+        """
+        report = {'sheet': ws.title, 'formulas': 0, 'rewritten_formulas': 0, 'rewritten_links': 0}
+        missing = set()
+        for row in ws.iter_rows():
+            for cell in row:
+                if cell.data_type != 'f':
+                    continue
+                formula = cell.value
+                if not isinstance(formula, str):
+                    continue
+                report['formulas'] += 1
+                new_formula, rewritten = self.rewrite_formula(formula, missing)
+                if rewritten and new_formula != formula:
+                    cell.value = new_formula
+                    report['rewritten_formulas'] += 1
+                report['rewritten_links'] += rewritten
+        report['missing_targets'] = sorted(missing)
+        return report
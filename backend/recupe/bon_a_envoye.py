@@ -1,12 +1,10 @@
 from flask import Flask, request, send_file, jsonify
 # from numpy import array_str # Removing this conflicting import
 import openpyxl
-from openpyxl.utils.cell import get_column_letter
 from openpyxl.utils.exceptions import InvalidFileException
 import os
-import re
 import io
-from copy import copy # Pour copier les styles
+import logging
 import math # Pour math.trunc
 from flask_cors import CORS # S'assurer que l'import est présent
 import sys
@@ -17,8 +15,11 @@ if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
 
 # Import des modules du répertoire backend
+from app_logging import configure_logging, debug_enabled, install_request_logging
 from covnumletter import conv_number_letter as cl_conv_number_letter
 from combineArm import process_armature_csvs
+from style_transfer import StyleTransfer
+from recap_links import RecapLinkRewriter
 
 # Import des modules EstimBatiment
 estim_batiment_dir = os.path.join(backend_dir, 'EstimBatiment')
@@ -29,8 +30,11 @@ from data_reader import get_qt_data, get_open_data, get_simple_block_data, get_f
 from calculation_engine import parse_calcul_sheet_and_process_blocks, process_menuiserie_block, process_simple_block, process_formula_block, write_recap_block
 
 # --- Flask App Setup ---
+configure_logging() # LOG_LEVEL, LOG_FORMAT, LOG_DEBUG_SAMPLE_RATE
+logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app) # Décommentez si vous avez des appels cross-origin et que vous voulez les gérer
+install_request_logging(app)
 
 # --- Fonctions Utilitaires Excel Python ---
 def trouver_nom_feuille_original(nom_saisi, noms_feuilles_sources_dict):
@@ -45,24 +49,17 @@ def est_une_feuille_recap(nom_feuille_original):
     recap_keywords = ["recap", "récap", "summary", "synthese", "synthèse"]
     specific_recap_names = ["recapitulatif", "récapitulatif"]
     is_recap = any(keyword in nom_lower for keyword in recap_keywords) or nom_lower in specific_recap_names
-    print(f"  Vérif Recap pour '{nom_feuille_original}' (normalisé: '{nom_lower}'): {is_recap}")
+    logger.debug("Vérif Recap pour '%s' (normalisé: '%s'): %s", nom_feuille_original, nom_lower, is_recap)
     return is_recap
 
-def add_quotes_if_necessary(sheet_name):
-    if re.search(r"[\s!@#$%^&*()+={}\[\]:;\"'<>,.?/\\|-]", sheet_name) or \
-       sheet_name.lower() in ['true', 'false'] or \
-       (sheet_name and sheet_name[0].isdigit()):
-        return f"'{sheet_name.replace('\'', '\'\'')}'"
-    return sheet_name
-
 # --- Fonctions de Traitement de Feuilles Excel Python ---
 def nettoyer_total_en_lettres(ws_copie, ws_original_source_values):
     """Similaire à la fonction VBA NettoyerTotalEnLettres."""
-    print(f"  Nettoyage du total en lettres pour la feuille '{ws_copie.title}'...")
+    logger.debug("Nettoyage du total en lettres pour la feuille '%s'...", ws_copie.title)
     prefixe = "Arrêter le présent devis estimatif à la somme de :"
     
     if ws_copie.max_row == 0:
-        print("    DEBUG: Feuille vide, pas de nettoyage de total.")
+        logger.debug("Feuille vide, pas de nettoyage de total.")
         return
 
     ligne_total_general = None
@@ -73,7 +70,7 @@ def nettoyer_total_en_lettres(ws_copie, ws_original_source_values):
             if "TOTAL GENERAL" in cell_a.value.upper():
                 ligne_total_general = row
                 valeur_cell_A_total_general = cell_a.value
-                print(f"    DEBUG: Ligne 'TOTAL GENERAL' TROUVÉE. Row: {row}, Contenu: '{valeur_cell_A_total_general}'")
+                logger.debug("Ligne 'TOTAL GENERAL' TROUVÉE. Row: %s, Contenu: '%s'", row, valeur_cell_A_total_general)
                 break
     
     if ligne_total_general:
@@ -81,22 +78,22 @@ def nettoyer_total_en_lettres(ws_copie, ws_original_source_values):
         cell_f_total_formule_mode = ws_copie[cell_f_total_coord] # From the sheet with formulas
         cell_f_total_valeur_mode = ws_original_source_values[cell_f_total_coord] # From the sheet with values
 
-        print(f"    DEBUG: Cellule du total (col F): {cell_f_total_coord}")
-        print(f"      Valeur (depuis feuille formules ws_copie): '{cell_f_total_formule_mode.value}', Type: {cell_f_total_formule_mode.data_type}")
-        print(f"      Valeur (depuis feuille valeurs ws_original_source_values): '{cell_f_total_valeur_mode.value}', Type: {cell_f_total_valeur_mode.data_type}")
+        logger.debug("Cellule du total (col F): %s", cell_f_total_coord)
+        logger.debug("Valeur (depuis feuille formules ws_copie): '%s', Type: %s", cell_f_total_formule_mode.value, cell_f_total_formule_mode.data_type)
+        logger.debug("Valeur (depuis feuille valeurs ws_original_source_values): '%s', Type: %s", cell_f_total_valeur_mode.value, cell_f_total_valeur_mode.data_type)
 
         montant_total = None
         # Prioriser la valeur de la feuille chargée avec data_only=True pour les formules
         if cell_f_total_formule_mode.data_type == 'f':
-            print(f"    DEBUG: {cell_f_total_coord} est une formule ('{cell_f_total_formule_mode.value}'). Utilisation de la valeur de ws_original_source_values.")
+            logger.debug("%s est une formule ('%s'). Utilisation de la valeur de ws_original_source_values.", cell_f_total_coord, cell_f_total_formule_mode.value)
             montant_total = cell_f_total_valeur_mode.value
         else:
             # Si ce n'est pas une formule, la valeur de ws_copie devrait être correcte
             montant_total = cell_f_total_formule_mode.value
-            print(f"    DEBUG: {cell_f_total_coord} n'est pas une formule. Utilisation de la valeur de ws_copie: {montant_total}")
+            logger.debug("%s n'est pas une formule. Utilisation de la valeur de ws_copie: %s", cell_f_total_coord, montant_total)
 
         if isinstance(montant_total, (int, float)) and montant_total > 0:
-            print(f"    DEBUG: Montant total final utilisé pour conversion: {montant_total}")
+            logger.debug("Montant total final utilisé pour conversion: %s", montant_total)
             
             texte_total_lettres = cl_conv_number_letter(montant_total, devise=1, langue=0)
             texte_final = f"{prefixe} {texte_total_lettres}"
@@ -104,91 +101,36 @@ def nettoyer_total_en_lettres(ws_copie, ws_original_source_values):
             cell_a_suivante = ws_copie[f"A{ligne_suivante}"]
             cell_a_suivante.value = texte_final
             
-            print(f"    DEBUG: Texte en lettres ('{texte_total_lettres}') inséré ligne {ligne_suivante} col A avec préfixe.")
+            logger.debug("Texte en lettres ('%s') inséré ligne %s col A avec préfixe.", texte_total_lettres, ligne_suivante)
         elif montant_total is None and cell_f_total_formule_mode.data_type == 'f':
-            print(f"    AVERTISSEMENT: Montant total dans {cell_f_total_coord} (formule: '{cell_f_total_formule_mode.value}') n'a pas pu être résolu en nombre depuis la feuille des valeurs ('{cell_f_total_valeur_mode.value}'). Conversion ignorée.")
+            logger.warning("Montant total dans %s (formule: '%s') n'a pas pu être résolu en nombre depuis la feuille des valeurs ('%s'). Conversion ignorée.", cell_f_total_coord, cell_f_total_formule_mode.value, cell_f_total_valeur_mode.value)
         else:
-            print(f"    AVERTISSEMENT: Valeur montant invalide ou nulle dans {cell_f_total_coord}: '{montant_total}'. Conversion ignorée.")
+            logger.warning("Valeur montant invalide ou nulle dans %s: '%s'. Conversion ignorée.", cell_f_total_coord, montant_total)
     else:
-        print("    DEBUG: Aucune ligne 'TOTAL GENERAL' trouvée dans la colonne A.")
+        logger.debug("Aucune ligne 'TOTAL GENERAL' trouvée dans la colonne A.")
 
-    print(f"  Fin nettoyage total en lettres pour '{ws_copie.title}'.")
+    logger.debug("Fin nettoyage total en lettres pour '%s'.", ws_copie.title)
 
 def modifier_liens_externes_feuille_recap(ws_recap, wb_cible):
-    print(f"--- Début ModifierLiensExternesFeuilleRecap pour '{ws_recap.title}' ---")
-    
-    # Analyser plusieurs colonnes : F et la dernière colonne
-    colonnes_a_analyser = []
-    
-    # Toujours analyser la colonne F
-    colonnes_a_analyser.append(6)  # F = colonne 6
-    
-    # Analyser aussi la dernière colonne si elle existe et est différente de F
-    if ws_recap.max_column > 0 and ws_recap.max_column != 6:
-        colonnes_a_analyser.append(ws_recap.max_column)
-    
-    if not colonnes_a_analyser:
-        print(f"    Aucune colonne à analyser pour '{ws_recap.title}'. Arrêt.")
-        print(f"--- Fin ModifierLiensExternesFeuilleRecap pour '{ws_recap.title}' ---")
-        return
-    
-    for col_num in colonnes_a_analyser:
-        col_letter = get_column_letter(col_num)
-        print(f"    Analyse des formules dans la colonne {col_letter} de '{ws_recap.title}'")
-
-        for r in range(1, ws_recap.max_row + 1):
-            cell = ws_recap.cell(row=r, column=col_num)
-            if cell.data_type == 'f':
-                formula_string = str(cell.value)
-                print(f"      Analyse cellule {cell.coordinate} | Formule Originale: {formula_string}")
-                
-                # Traiter les liens externes complexes avec fichier externe [nom_fichier]
-                match_externe = re.match(r"=(.*?)\[([^\]]+)\](.*?([^\!']+?)|\'?([^\!']+?)\'?)\!(.+)", formula_string, re.IGNORECASE)
-                if match_externe:
-                    prefix, external_file, _, _, external_sheet_raw, cell_ref = match_externe.groups()
-                    external_sheet_clean = external_sheet_raw.strip("'").replace("''", "'").strip()
-                    print(f"        Lien externe: Fichier='{external_file}', Feuille='{external_sheet_clean}', Cellule='{cell_ref}'")
-                    target_copied_sheet_name = f"{external_sheet_clean}_copie"
-                    print(f"          Cible attendue: '{target_copied_sheet_name}'")
-                    if target_copied_sheet_name in wb_cible.sheetnames:
-                        print(f"            Cible '{target_copied_sheet_name}' existe.")
-                        new_formula = f"={prefix}{add_quotes_if_necessary(target_copied_sheet_name)}!{cell_ref}"
-                        if formula_string.lower() != new_formula.lower():
-                            cell.value = new_formula
-                            print(f"              MODIFIÉ: '{new_formula}'")
-                        else: print("              Aucune modification nécessaire.")
-                    else: print(f"            ATTENTION: Cible '{target_copied_sheet_name}' N'EXISTE PAS.")
-                else:
-                    # Traiter les liens internes simples =NomFeuille!Cellule
-                    match_interne = re.match(r"=([^!\[]+)!(.+)", formula_string, re.IGNORECASE)
-                    if match_interne:
-                        sheet_name_raw, cell_ref = match_interne.groups()
-                        sheet_name_clean = sheet_name_raw.strip("'").replace("''", "'").strip()
-                        print(f"        Lien interne: Feuille='{sheet_name_clean}', Cellule='{cell_ref}'")
-                        target_copied_sheet_name = f"{sheet_name_clean}_copie"
-                        print(f"          Cible attendue: '{target_copied_sheet_name}'")
-                        if target_copied_sheet_name in wb_cible.sheetnames:
-                            print(f"            Cible '{target_copied_sheet_name}' existe.")
-                            new_formula = f"={add_quotes_if_necessary(target_copied_sheet_name)}!{cell_ref}"
-                            if formula_string.lower() != new_formula.lower():
-                                cell.value = new_formula
-                                print(f"              MODIFIÉ: '{new_formula}'")
-                            else: print("              Aucune modification nécessaire.")
-                        else: print(f"            ATTENTION: Cible '{target_copied_sheet_name}' N'EXISTE PAS.")
-                    # else: print("        Pas un lien reconnu.") # commenter pour moins de verbosité
-    
-    print(f"--- Fin ModifierLiensExternesFeuilleRecap pour '{ws_recap.title}' ---")
-
-def copier_feuille_manuellement(ws_source, wb_destination, nouveau_nom_feuille):
+    # Toutes les formules de la feuille, en un passage : voir recap_links
+    rapport = RecapLinkRewriter(wb_cible.sheetnames).rewrite_sheet(ws_recap)
+    logger.debug("Liens de '%s': %s", ws_recap.title, rapport)
+    if rapport['missing_targets']:
+        logger.warning("Feuille récap '%s': feuilles référencées sans copie: %s", ws_recap.title, ", ".join(rapport['missing_targets']))
+    return rapport
+
+def copier_feuille_manuellement(ws_source, wb_destination, nouveau_nom_feuille, style_transfer=None):
     if nouveau_nom_feuille in wb_destination.sheetnames:
         del wb_destination[nouveau_nom_feuille]
     ws_destination = wb_destination.create_sheet(title=nouveau_nom_feuille)
+    # Styles convertis une fois par combinaison (voir style_transfer), partagés entre les feuilles d'un même classeur
+    if style_transfer is None:
+        style_transfer = StyleTransfer(ws_source.parent, wb_destination)
     for row in ws_source.iter_rows():
         for cell in row:
             new_cell = ws_destination.cell(row=cell.row, column=cell.column, value=cell.value)
             if cell.has_style:
-                new_cell.font, new_cell.border, new_cell.fill = copy(cell.font), copy(cell.border), copy(cell.fill)
-                new_cell.number_format, new_cell.protection, new_cell.alignment = cell.number_format, copy(cell.protection), copy(cell.alignment)
+                style_transfer.copy_style(cell, new_cell)
     for col_letter, dim in ws_source.column_dimensions.items(): ws_destination.column_dimensions[col_letter].width = dim.width
     for row_num, dim in ws_source.row_dimensions.items(): ws_destination.row_dimensions[row_num].height = dim.height
     for merged_range_str in ws_source.merged_cells.ranges: ws_destination.merge_cells(str(merged_range_str)) # Convertir MergedCellRange en string
@@ -200,28 +142,29 @@ def traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str
         # Ouvrir le fichier deux fois : une pour les formules, une pour les valeurs
         wb_source = openpyxl.load_workbook(io.BytesIO(bytes_fichier_source), data_only=False)
         wb_source_values = openpyxl.load_workbook(io.BytesIO(bytes_fichier_source), data_only=True)
-        print(f"Fichier source chargé en mémoire (formules et valeurs).")
+        logger.debug("Fichier source chargé en mémoire (formules et valeurs).")
     except InvalidFileException:
-        print("Fichier Excel invalide ou corrompu.")
+        logger.warning("Fichier Excel invalide ou corrompu.")
         return None
     except Exception as e:
-        print(f"Impossible de charger le fichier source depuis les bytes: {e}")
+        logger.error("Impossible de charger le fichier source depuis les bytes: %s", e)
         return None
 
     noms_feuilles_sources_dict = {name.strip().lower(): name.strip() for name in wb_source.sheetnames}
 
     if not noms_feuilles_a_traiter_str:
-        print("Erreur critique: Noms de feuilles à traiter non fournis.")
+        logger.error("Erreur critique: Noms de feuilles à traiter non fournis.")
         return None # Dans une app web, la sélection de feuilles doit être explicite
         
     l_array_str = [s.strip() for s in noms_feuilles_a_traiter_str.replace(";", ",").split(",") if s.strip()]
     if not l_array_str:
-        print("Aucun nom de feuille valide n'a été fourni pour traitement.")
+        logger.warning("Aucun nom de feuille valide n'a été fourni pour traitement.")
         return None
         
     wb_destination = openpyxl.Workbook()
     default_sheet_name = wb_destination.sheetnames[0] # Généralement "Sheet"
     sheet_to_delete_if_unused = default_sheet_name if default_sheet_name.lower() in ["sheet", "feuil1"] else None
+    style_transfer = StyleTransfer(wb_source, wb_destination)
     
     first_sheet_processed = False
     processed_sheet_names_in_dest = []
@@ -233,8 +176,8 @@ def traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str
             ws_original_source_values = wb_source_values[nom_feuille_source_original]
             nom_feuille_copie_dest = f"{nom_feuille_source_original.strip()}_copie"
             
-            print(f"Copie de la feuille '{ws_original_source.title}' vers '{nom_feuille_copie_dest}'.")
-            ws_copie_dest = copier_feuille_manuellement(ws_original_source, wb_destination, nom_feuille_copie_dest)
+            logger.debug("Copie de la feuille '%s' vers '%s'.", ws_original_source.title, nom_feuille_copie_dest)
+            ws_copie_dest = copier_feuille_manuellement(ws_original_source, wb_destination, nom_feuille_copie_dest, style_transfer)
             
             processed_sheet_names_in_dest.append(nom_feuille_copie_dest)
 
@@ -242,16 +185,17 @@ def traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str
                sheet_to_delete_if_unused in wb_destination.sheetnames and \
                nom_feuille_copie_dest != sheet_to_delete_if_unused:
                 del wb_destination[sheet_to_delete_if_unused]
-                print(f"Feuille par défaut '{sheet_to_delete_if_unused}' supprimée.")
+                logger.debug("Feuille par défaut '%s' supprimée.", sheet_to_delete_if_unused)
                 sheet_to_delete_if_unused = None 
             first_sheet_processed = True
             
-            print(f"  Traitement de la feuille copiée: '{ws_copie_dest.title}'")
+            logger.debug("Traitement de la feuille copiée: '%s'", ws_copie_dest.title)
             
             # 1. Conversion des colonnes D et E en valeurs (AVANT suppression des colonnes G-J)
-            print(f"    Conversion des formules en valeurs pour colonnes D et E...")
+            logger.debug("Conversion des formules en valeurs pour colonnes D et E...")
+            debug = debug_enabled(logger)
             for col_letter_idx_str in ["D", "E"]:
-                print(f"      Traitement colonne {col_letter_idx_str}...")
+                logger.debug("Traitement colonne %s...", col_letter_idx_str)
                 for row in range(1, ws_copie_dest.max_row + 1):
                     cell = ws_copie_dest[f"{col_letter_idx_str}{row}"]
                     if cell.data_type == 'f':  # Si c'est une formule
@@ -260,14 +204,14 @@ def traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str
                             valeur_calculee = ws_original_source_values[f"{col_letter_idx_str}{row}"].value
                             if valeur_calculee is not None:
                                 cell.value = valeur_calculee  # Remplacer la formule par la valeur
-                                print(f"        {cell.coordinate}: Formule convertie en valeur = {valeur_calculee}")
-                            else:
-                                print(f"        {cell.coordinate}: Valeur calculée = None, formule conservée")
+                                if debug: logger.debug("%s: Formule convertie en valeur = %s", cell.coordinate, valeur_calculee)
+                            elif debug:
+                                logger.debug("%s: Valeur calculée = None, formule conservée", cell.coordinate)
                         except Exception as e_val:
-                            print(f"        Erreur conversion {cell.coordinate}: {e_val}")
+                            logger.warning("Erreur conversion %s: %s", cell.coordinate, e_val)
                     elif cell.value is not None:
                         # Si ce n'est pas une formule mais a une valeur, la garder
-                        print(f"        {cell.coordinate}: Valeur déjà présente = {cell.value}")
+                        if debug: logger.debug("%s: Valeur déjà présente = %s", cell.coordinate, cell.value)
 
             # 1.5. La colonne F garde ses formules intactes
             # Les formules seront recalculées automatiquement par Excel à l'ouverture
@@ -276,26 +220,26 @@ def traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str
             nettoyer_total_en_lettres(ws_copie_dest, ws_original_source_values)
 
             # 3. Supprimer colonnes G à J (APRÈS conversion D et E)
-            print(f"    Suppression des colonnes G à J pour {ws_copie_dest.title}...")
+            logger.debug("Suppression des colonnes G à J pour %s...", ws_copie_dest.title)
             ws_copie_dest.delete_cols(7, 4) # G=7, 4 colonnes (G,H,I,J)
 
             # 4. Vérifier si c'est un récap et modifier les liens
             nom_original_pour_recap = nom_feuille_source_original.strip()
             if est_une_feuille_recap(nom_original_pour_recap):
-                print(f"  Feuille '{ws_copie_dest.title}' identifiée comme récap. Modification des liens...")
+                logger.debug("Feuille '%s' identifiée comme récap. Modification des liens...", ws_copie_dest.title)
                 modifier_liens_externes_feuille_recap(ws_copie_dest, wb_destination)
             
-            print(f"  Traitement terminé pour '{ws_copie_dest.title}'.")
+            logger.debug("Traitement terminé pour '%s'.", ws_copie_dest.title)
         else:
-            print(f"ATTENTION: La feuille saisie '{nom_feuille_saisi}' n'a pas été trouvée.")
+            logger.warning("La feuille saisie '%s' n'a pas été trouvée.", nom_feuille_saisi)
 
     # Nettoyage final de la feuille par défaut
     if sheet_to_delete_if_unused and sheet_to_delete_if_unused in wb_destination.sheetnames and not processed_sheet_names_in_dest:
         del wb_destination[sheet_to_delete_if_unused]
-        print(f"Nettoyage final: feuille par défaut '{sheet_to_delete_if_unused}' supprimée car aucune feuille n'a été traitée.")
+        logger.debug("Nettoyage final: feuille par défaut '%s' supprimée car aucune feuille n'a été traitée.", sheet_to_delete_if_unused)
 
     if not processed_sheet_names_in_dest:
-        print("Aucune feuille n'a été traitée ou copiée.")
+        logger.warning("Aucune feuille n'a été traitée ou copiée.")
         wb_source.close()
         wb_source_values.close()
         return None
@@ -329,10 +273,10 @@ def traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str
         output_io = io.BytesIO()
         wb_destination.save(output_io)
         output_io.seek(0)
-        print(f"Classeur de destination préparé en mémoire ({len(processed_sheet_names_in_dest)} feuilles) avec recalcul automatique renforcé.")
+        logger.info("Classeur de destination préparé en mémoire (%s feuilles) avec recalcul automatique renforcé.", len(processed_sheet_names_in_dest))
         return output_io
     except Exception as e:
-        print(f"Erreur lors de la sauvegarde du fichier de destination en mémoire: {e}")
+        logger.error("Erreur lors de la sauvegarde du fichier de destination en mémoire: %s", e)
         return None
 
 # --- Endpoints Flask ---
@@ -410,7 +354,7 @@ def get_sheet_names_route():
     if not (file.filename.endswith('.xlsx')): # Openpyxl supporte .xlsx
         return jsonify({"error": "Type de fichier invalide. Seul .xlsx est supporté par ce backend."}), 400
     
-    print(f"Fichier reçu pour extraction de noms: {file.filename}")
+    logger.info("Fichier reçu pour extraction de noms: %s", file.filename)
     file_bytes = file.read()
     try:
         workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True)
@@ -423,7 +367,7 @@ def get_sheet_names_route():
     except InvalidFileException:
         return jsonify({"error": "Fichier Excel invalide ou corrompu."}), 400
     except Exception as e:
-        print(f"Erreur lors de l'extraction des noms de feuilles: {e}")
+        logger.error("Erreur lors de l'extraction des noms de feuilles: %s", e)
         return jsonify({"error": "Erreur serveur lors de l'extraction des noms de feuilles."}), 500
 
 
@@ -439,13 +383,13 @@ def process_excel_file_route():
     if not (file.filename.endswith('.xlsx')):
         return jsonify({"error": "Type de fichier invalide. Seul .xlsx est supporté."}), 400
 
-    print(f"Fichier reçu pour traitement: {file.filename}, Feuilles: {sheet_names_str}")
+    logger.info("Fichier reçu pour traitement: %s, Feuilles: %s", file.filename, sheet_names_str)
     file_bytes = file.read()
     
     processed_file_io = traiter_fichier_excel_core(file_bytes, sheet_names_str) 
 
     if processed_file_io:
-        print(f"Envoi du fichier traité '{file.filename}'")
+        logger.info("Envoi du fichier traité '%s'", file.filename)
         return send_file(
             processed_file_io,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -458,33 +402,33 @@ def process_excel_file_route():
 @app.route('/combine-armatures', methods=['POST'])
 def combine_armatures_route():
     if not request.files:
-        print("Aucun fichier n'a été envoyé pour la combinaison d'armatures.")
+        logger.warning("Aucun fichier n'a été envoyé pour la combinaison d'armatures.")
         return jsonify({"error": "Aucun fichier envoyé."}), 400
 
     files_data = []
     # Utiliser getlist pour récupérer TOUS les fichiers avec la même clé
     uploaded_files = request.files.getlist('csv_files')
-    print(f"Nombre de fichiers reçus via getlist('csv_files'): {len(uploaded_files)}")
+    logger.debug("Nombre de fichiers reçus via getlist('csv_files'): %s", len(uploaded_files))
     
     for file in uploaded_files:
         if file and file.filename:
-            print(f"Fichier reçu pour combinaison: {file.filename}")
+            logger.debug("Fichier reçu pour combinaison: %s", file.filename)
             files_data.append({
                 'name': file.filename,
                 'bytes': file.read()
             })
     
     if not files_data:
-        print("La liste des fichiers pour combinaison est vide après traitement initial.")
+        logger.warning("La liste des fichiers pour combinaison est vide après traitement initial.")
         return jsonify({"error": "Aucuns fichiers valides trouvés dans la requête."}), 400
 
-    print(f"{len(files_data)} fichier(s) prêt(s) pour la fonction process_armature_csvs.")
+    logger.debug("%s fichier(s) prêt(s) pour la fonction process_armature_csvs.", len(files_data))
     
     try:
         output_excel_io, output_filename = process_armature_csvs(files_data)
         
         if output_excel_io and output_filename:
-            print(f"Envoi du fichier combiné d'armatures: {output_filename}")
+            logger.info("Envoi du fichier combiné d'armatures: %s", output_filename)
             return send_file(
                 output_excel_io,
                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -492,12 +436,12 @@ def combine_armatures_route():
                 download_name=output_filename
             )
         else:
-            print("process_armature_csvs n'a pas retourné de fichier valide.")
+            logger.warning("process_armature_csvs n'a pas retourné de fichier valide.")
             # output_filename pourrait contenir un message d'erreur ou un nom de fichier d'erreur
             error_message = f"Erreur lors de la combinaison des armatures. Détail: {output_filename if output_filename else 'Inconnu'}"
             return jsonify({"error": error_message}), 500
     except Exception as e:
-        print(f"Exception lors de l'appel à process_armature_csvs ou de l'envoi du fichier: {e}")
+        logger.exception("Exception lors de l'appel à process_armature_csvs ou de l'envoi du fichier: %s", e)
         return jsonify({"error": f"Erreur serveur critique lors de la combinaison des armatures: {str(e)}"}), 500
 
 @app.route('/estim-batiment', methods=['POST'])
@@ -507,36 +451,36 @@ def estim_batiment_route():
     Accepte un fichier Excel avec les feuilles requises et génère un devis détaillé.
     """
     if not request.files:
-        print("Aucun fichier n'a été envoyé pour l'estimation bâtiment.")
+        logger.warning("Aucun fichier n'a été envoyé pour l'estimation bâtiment.")
         return jsonify({"error": "Aucun fichier envoyé."}), 400
 
     if 'excel_file' not in request.files:
-        print("Clé 'excel_file' manquante dans les fichiers envoyés.")
+        logger.warning("Clé 'excel_file' manquante dans les fichiers envoyés.")
         return jsonify({"error": "Fichier Excel requis avec la clé 'excel_file'."}), 400
 
     uploaded_file = request.files['excel_file']
     
     if not uploaded_file or not uploaded_file.filename:
-        print("Fichier Excel vide ou sans nom.")
+        logger.warning("Fichier Excel vide ou sans nom.")
         return jsonify({"error": "Fichier Excel valide requis."}), 400
 
-    print(f"Fichier reçu pour estimation bâtiment: {uploaded_file.filename}")
+    logger.info("Fichier reçu pour estimation bâtiment: %s", uploaded_file.filename)
 
     try:
         # Lire le contenu du fichier
         file_bytes = uploaded_file.read()
         
         if not file_bytes:
-            print("Le fichier reçu est vide.")
+            logger.warning("Le fichier reçu est vide.")
             return jsonify({"error": "Le fichier envoyé est vide."}), 400
 
-        print(f"Taille du fichier reçu: {len(file_bytes)} bytes")
+        logger.debug("Taille du fichier reçu: %s bytes", len(file_bytes))
         
         # Traiter le fichier avec la fonction EstimBatiment
         output_excel_io, output_filename = process_estim_batiment(file_bytes)
         
         if output_excel_io and output_filename:
-            print(f"Envoi du fichier d'estimation: {output_filename}")
+            logger.info("Envoi du fichier d'estimation: %s", output_filename)
             return send_file(
                 output_excel_io,
                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -546,11 +490,11 @@ def estim_batiment_route():
         else:
             # output_filename contient le message d'erreur
             error_message = output_filename if output_filename else "Erreur inconnue lors du traitement"
-            print(f"Erreur lors du traitement EstimBatiment: {error_message}")
+            logger.warning("Erreur lors du traitement EstimBatiment: %s", error_message)
             return jsonify({"error": error_message}), 500
             
     except Exception as e:
-        print(f"Exception lors du traitement EstimBatiment: {e}")
+        logger.exception("Exception lors du traitement EstimBatiment: %s", e)
         return jsonify({"error": f"Erreur serveur critique lors du traitement EstimBatiment: {str(e)}"}), 500
 
 # --- Fonction de traitement EstimBatiment ---
@@ -566,7 +510,7 @@ def process_estim_batiment(excel_file_bytes):
         tuple: (output_excel_io, output_filename) ou (None, error_message)
     """
     try:
-        print("Traitement EstimBatiment - Chargement du classeur...")
+        logger.debug("Traitement EstimBatiment - Chargement du classeur...")
         
         # Charge le classeur une première fois pour accéder aux formules (data_only=False)
         input_wb_formulas = openpyxl.load_workbook(io.BytesIO(excel_file_bytes), data_only=False)
@@ -575,7 +519,7 @@ def process_estim_batiment(excel_file_bytes):
         input_wb_values = openpyxl.load_workbook(io.BytesIO(excel_file_bytes), data_only=True)
 
     except Exception as e:
-        print(f"Erreur lors de l'ouverture du fichier d'estimation: {e}")
+        logger.error("Erreur lors de l'ouverture du fichier d'estimation: %s", e)
         return None, f"Erreur lors de l'ouverture du fichier: {str(e)}"
 
     # --- CORRECTION APPLIQUÉE ICI ---
@@ -589,14 +533,14 @@ def process_estim_batiment(excel_file_bytes):
     
     for sheet_name in required_formula_sheets:
         if sheet_name not in input_wb_formulas.sheetnames:
-            print(f"La feuille '{sheet_name}' est manquante dans le fichier d'entrée (pour les formules).")
+            logger.warning("La feuille '%s' est manquante dans le fichier d'entrée (pour les formules).", sheet_name)
             sheets_formulas[sheet_name] = None
         else:
             sheets_formulas[sheet_name] = input_wb_formulas[sheet_name]
 
     for sheet_name in required_value_sheets:
         if sheet_name not in input_wb_values.sheetnames:
-            print(f"La feuille '{sheet_name}' est manquante dans le fichier d'entrée (pour les valeurs).")
+            logger.warning("La feuille '%s' est manquante dans le fichier d'entrée (pour les valeurs).", sheet_name)
             sheets_values[sheet_name] = None
         else:
             sheets_values[sheet_name] = input_wb_values[sheet_name]
@@ -619,39 +563,39 @@ def process_estim_batiment(excel_file_bytes):
         return None, "La feuille 'calcul' est obligatoire et manquante dans le fichier."
 
     # --- Lecture des données ---
-    print("Lecture des données de la feuille 'qt'...")
+    logger.debug("Lecture des données de la feuille 'qt'...")
     qt_data_dict = get_qt_data(qt_sheet)
     if not qt_data_dict:
-        print("AVERTISSEMENT: Aucune donnée lue depuis la feuille 'qt'.")
+        logger.warning("Aucune donnée lue depuis la feuille 'qt'.")
     
     open_data_list = []
     if open_sheet:
-        print("Lecture des données de la feuille 'open'...")
+        logger.debug("Lecture des données de la feuille 'open'...")
         open_data_list = get_open_data(open_sheet)
 
     electricite_data_list = []
     if electricite_sheet:
-        print("Lecture des données de la feuille 'Electricite'...")
+        logger.debug("Lecture des données de la feuille 'Electricite'...")
         electricite_data_list = get_simple_block_data(electricite_sheet)
 
     plomberie_data_list = []
     if plomberie_sheet:
-        print("Lecture des données de la feuille 'Plomberie'...")
+        logger.debug("Lecture des données de la feuille 'Plomberie'...")
         plomberie_data_list = get_simple_block_data(plomberie_sheet)
 
     peinture_data_list = []
     if peinture_sheet:
-        print("Lecture des données de la feuille 'Peinture'...")
+        logger.debug("Lecture des données de la feuille 'Peinture'...")
         peinture_data_list = get_formula_block_data(peinture_sheet)
 
     revetement_data_list = []
     if revetement_sheet:
-        print("Lecture des données de la feuille 'Revetement'...")
+        logger.debug("Lecture des données de la feuille 'Revetement'...")
         revetement_data_list = get_formula_block_data(revetement_sheet)
 
     toiture_data_list = []
     if toiture_sheet:
-        print("Lecture des données de la feuille 'Toiture'...")
+        logger.debug("Lecture des données de la feuille 'Toiture'...")
         toiture_data_list = get_formula_block_data(toiture_sheet)
 
     # --- Configuration du classeur de sortie ---
@@ -668,42 +612,42 @@ def process_estim_batiment(excel_file_bytes):
     # --- Traitement et écriture des blocs ---
     current_excel_row = 1 
 
-    print("Analyse de la feuille 'calcul' et génération des tableaux...")
+    logger.debug("Analyse de la feuille 'calcul' et génération des tableaux...")
     current_excel_row = parse_calcul_sheet_and_process_blocks(calcul_sheet, qt_data_dict, main_output_sheet, recap_entries)
 
     # Bloc IV: Menuiserie
     if open_data_list:
-        print("Traitement du bloc IV: Menuiserie...")
+        logger.debug("Traitement du bloc IV: Menuiserie...")
         current_excel_row = process_menuiserie_block(open_data_list, main_output_sheet, current_excel_row, recap_entries)
 
     # Bloc V: Electricité
     if electricite_data_list:
-        print("Traitement du bloc V: Electricité...")
+        logger.debug("Traitement du bloc V: Electricité...")
         current_excel_row = process_simple_block(electricite_data_list, main_output_sheet, current_excel_row, "V", "ELECTRICITE", 1, recap_entries)
 
     # Bloc VI: Plomberie
     if plomberie_data_list:
-        print("Traitement du bloc VI: Plomberie...")
+        logger.debug("Traitement du bloc VI: Plomberie...")
         current_excel_row = process_simple_block(plomberie_data_list, main_output_sheet, current_excel_row, "VI", "PLOMBERIE SANITAIRE", 1, recap_entries)
 
     # Bloc VII: Revetement
     if revetement_data_list:
-        print("Traitement du bloc VII: Revetement...")
+        logger.debug("Traitement du bloc VII: Revetement...")
         current_excel_row = process_formula_block(revetement_data_list, qt_data_dict, main_output_sheet, current_excel_row, "VII", "REVETEMENT", 1, recap_entries)
 
     # Bloc VIII: Peinture
     if peinture_data_list:
-        print("Traitement du bloc VIII: Peinture...")
+        logger.debug("Traitement du bloc VIII: Peinture...")
         current_excel_row = process_formula_block(peinture_data_list, qt_data_dict, main_output_sheet, current_excel_row, "VIII", "PEINTURE", 1, recap_entries)
 
     # Bloc IX: Toiture
     if toiture_data_list:
-        print("Traitement du bloc IX: Toiture...")
+        logger.debug("Traitement du bloc IX: Toiture...")
         current_excel_row = process_formula_block(toiture_data_list, qt_data_dict, main_output_sheet, current_excel_row, "IX", "TOITURE", 1, recap_entries)
 
     # --- Ajout du récapitulatif ---
     if recap_entries:
-        print("Génération du bloc RÉCAPITULATIF...")
+        logger.debug("Génération du bloc RÉCAPITULATIF...")
         current_excel_row = write_recap_block(main_output_sheet, current_excel_row, recap_entries)
 
     # --- Vérification finale et sauvegarde ---
@@ -718,15 +662,15 @@ def process_estim_batiment(excel_file_bytes):
         output_io = io.BytesIO()
         output_wb.save(output_io)
         output_io.seek(0)
-        print("Fichier d'estimation généré avec succès.")
+        logger.info("Fichier d'estimation généré avec succès.")
         return output_io, output_filename
     except Exception as e:
-        print(f"Erreur lors de la sauvegarde du fichier d'estimation: {e}")
+        logger.error("Erreur lors de la sauvegarde du fichier d'estimation: %s", e)
         return None, f"Erreur lors de la sauvegarde: {str(e)}"
 
 # --- Lancement de l'application ---
 if __name__ == '__main__':
-    print("Démarrage du serveur Flask pour traitement Excel...")
+    logger.info("Démarrage du serveur Flask pour traitement Excel...")
     # Configuration pour déploiement (Heroku, etc.)
     import os
     port = int(os.environ.get('PORT', 5000))
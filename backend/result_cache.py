@@ -0,0 +1,289 @@
+# result_cache.py
+"""
+Cache des fichiers générés, indexé par le contenu des fichiers envoyés.
+
+La clé est le SHA-256 de la version des traitements (CACHE_KEY_VERSION), des
+octets reçus et des paramètres de la requête (ex. 'sheet_names'). Deux niveaux :
+    - mémoire : LRU bornée en nombre d'entrées et en octets ;
+    - disque (optionnel) : un fichier par entrée, supprimé après TTL ou, les plus
+      anciennes d'abord, au-delà d'une taille totale. Le répertoire n'est parcouru
+      qu'une fois par intervalle, ou dès que la taille estimée dépasse la limite.
+
+Configuration par variables d'environnement :
+    RESULT_CACHE_MAX_ENTRIES    (défaut 64, 0 désactive le cache)
+    RESULT_CACHE_MAX_BYTES      (défaut 256 Mo)
+    RESULT_CACHE_DIR            (niveau disque désactivé si absent)
+    RESULT_CACHE_TTL            (secondes, défaut 86400)
+    RESULT_CACHE_DISK_MAX_BYTES (taille totale du niveau disque, défaut 1 Go)
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import send_file
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_DISK_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_DISK_SWEEP_INTERVAL = 300 # Secondes entre deux parcours du répertoire disque
+DISK_SWEEP_TARGET = 0.9 # Un dépassement ramène le disque à 90 % de sa limite
+# À incrémenter dès qu'un traitement change le fichier produit (code ou format de
+# sortie) : les entrées des versions précédentes ne sont alors plus jamais servies
+CACHE_KEY_VERSION = 1
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Cache LRU en mémoire de résultats (octets + nom de fichier), avec un niveau
+    disque optionnel. Utilisable depuis plusieurs threads.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 disk_dir=None, ttl_seconds=DEFAULT_TTL_SECONDS, disk_max_bytes=DEFAULT_DISK_MAX_BYTES,
+                 disk_sweep_interval=DEFAULT_DISK_SWEEP_INTERVAL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_sweep_interval = disk_sweep_interval
+        self._entries = OrderedDict() # key -> (data, filename)
+        self._size = 0
+        self._disk_bytes = 0 # Estimation, recalculée à chaque parcours du répertoire
+        self._last_disk_sweep = None # Le premier enregistrement parcourt le répertoire existant
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0,
+                          'disk_evictions': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+            disk_dir=os.environ.get('RESULT_CACHE_DIR') or None,
+            ttl_seconds=int(os.environ.get('RESULT_CACHE_TTL', DEFAULT_TTL_SECONDS)),
+            disk_max_bytes=int(os.environ.get('RESULT_CACHE_DISK_MAX_BYTES', DEFAULT_DISK_MAX_BYTES)),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(namespace, payloads, params=None):
+        """
+        SHA-256 de la version des traitements, de l'endpoint, des octets envoyés
+        (dans l'ordre) et des paramètres. Chaque octet est préfixé de sa longueur
+        pour que deux découpages différents ne donnent jamais la même clé.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_KEY_VERSION}\0{namespace}\0".encode('utf-8'))
+        for payload in payloads:
+            digest.update(len(payload).to_bytes(8, 'big'))
+            digest.update(payload)
+        digest.update(json.dumps(params or {}, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Retourne (data, filename) ou None. Une entrée trouvée sur disque remonte en mémoire."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+            self._store_memory(key, entry)
+        return entry
+
+    def put(self, key, data, filename):
+        """Enregistre un résultat dans les deux niveaux."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters['stores'] += 1
+            self._store_memory(key, (data, filename))
+        self._write_disk(key, data, filename)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'hits': stats['memory_hits'] + stats['disk_hits'],
+                'memory_entries': len(self._entries),
+                'memory_bytes': self._size,
+                'disk_enabled': bool(self.disk_dir),
+                'disk_bytes': self._disk_bytes,
+            })
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    # --- Niveau mémoire (appelé avec self._lock) ---
+
+    def _store_memory(self, key, entry):
+        data = entry[0]
+        if len(data) > self.max_bytes:
+            return # Trop gros pour la mémoire : seul le disque le garde
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous[0])
+        self._entries[key] = entry
+        self._size += len(data)
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            _, (evicted_data, _) = self._entries.popitem(last=False)
+            self._size -= len(evicted_data)
+            self._counters['evictions'] += 1
+
+    # --- Niveau disque ---
+
+    def _disk_paths(self, key):
+        return os.path.join(self.disk_dir, f"{key}.bin"), os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        data_path, meta_path = self._disk_paths(key)
+        try:
+            if time.time() - os.path.getmtime(meta_path) > self.ttl_seconds:
+                self._remove_disk(key)
+                with self._lock:
+                    self._counters['expired'] += 1
+                return None
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                filename = json.load(f)['filename']
+            with open(data_path, 'rb') as f:
+                return f.read(), filename
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key, data, filename):
+        if not self.disk_dir or len(data) > self.disk_max_bytes:
+            return
+        data_path, meta_path = self._disk_paths(key)
+        meta = json.dumps({'filename': filename}).encode('utf-8')
+        tmp_path = None
+        try:
+            # Écriture atomique : les données d'abord, puis les métadonnées qui valident l'entrée
+            for path, content in ((data_path, data), (meta_path, meta)):
+                fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+                tmp_path = None
+        except OSError as e:
+            logger.warning("Écriture disque impossible pour %s: %s", key, e)
+            if tmp_path is not None:
+                self._remove_file(tmp_path)
+            self._remove_disk(key) # Pas de données orphelines sans leurs métadonnées
+            return
+
+        now = time.time()
+        with self._lock:
+            self._disk_bytes += len(data) + len(meta)
+            sweep = (self._last_disk_sweep is None or now - self._last_disk_sweep >= self.disk_sweep_interval
+                     or self._disk_bytes > self.disk_max_bytes)
+            if sweep:
+                self._last_disk_sweep = now
+        if sweep:
+            self._sweep_disk()
+
+    def _remove_disk(self, key):
+        for path in self._disk_paths(key):
+            self._remove_file(path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _sweep_disk(self):
+        """
+        Supprime les entrées disque plus anciennes que le TTL (et les fichiers
+        temporaires abandonnés), puis les plus anciennes entrées tant que la
+        taille totale dépasse la limite.
+        """
+        now = time.time()
+        try:
+            names = os.listdir(self.disk_dir)
+        except OSError:
+            return
+        entries, expired = [], 0 # entries : (date d'écriture, clé, octets)
+        for name in names:
+            path = os.path.join(self.disk_dir, name)
+            try:
+                meta_stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.tmp'):
+                if now - meta_stat.st_mtime > self.ttl_seconds:
+                    self._remove_file(path)
+                continue
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            if now - meta_stat.st_mtime > self.ttl_seconds:
+                self._remove_disk(key)
+                expired += 1
+                continue
+            try:
+                data_size = os.path.getsize(self._disk_paths(key)[0])
+            except OSError:
+                data_size = 0
+            entries.append((meta_stat.st_mtime, key, meta_stat.st_size + data_size))
+
+        total = sum(size for _, _, size in entries)
+        evicted = 0
+        if total > self.disk_max_bytes:
+            target = self.disk_max_bytes * DISK_SWEEP_TARGET
+            for _, key, size in sorted(entries):
+                if total <= target:
+                    break
+                self._remove_disk(key)
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._counters['expired'] += expired
+            self._counters['disk_evictions'] += evicted
+
+
+def xlsx_response(data, filename, cache_status):
+    """Réponse Flask d'un fichier XLSX avec l'en-tête X-Cache (HIT ou MISS)."""
+    response = send_file(
+        io.BytesIO(data),
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=filename
+    )
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+# Instance partagée par les routes
+result_cache = ResultCache.from_env()
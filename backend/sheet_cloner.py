@@ -0,0 +1,733 @@
+# sheet_cloner.py
+"""
+Copie de feuilles d'un classeur XLSX au niveau du paquet (zip), sans openpyxl.
+
+Les parties XML des feuilles choisies sont recopiées dans le classeur de
+destination avec la table des styles (styles.xml et le thème) et le
+sous-ensemble des chaînes partagées qu'elles utilisent : les indices de style
+des cellules restent valides et aucune cellule n'est reconstruite. Les
+modifications sont ensuite appliquées directement au XML :
+- freeze_formulas : formules remplacées par leur valeur en cache (data_only),
+- ws[coordonnée].value = ... : écriture d'une cellule,
+- delete_cols : comme Worksheet.delete_cols() d'openpyxl, les cellules sont
+  décalées mais formules, fusions et largeurs de colonnes restent inchangées.
+
+Les feuilles copiées exposent le sous-ensemble de l'API Worksheet d'openpyxl
+utilisé par le traitement /process-excel (max_row, max_column, ws["A1"],
+ws.cell(), .value, .data_type). Les éléments qui dépendent des relations de
+la feuille (dessins, commentaires, tableaux, liens hypertexte externes...) ne
+sont pas copiés, comme avec la copie cellule par cellule ; pas plus que la
+protection, les volets figés, les filtres, les mises en forme conditionnelles
+et les validations de données, dont delete_cols ne décalerait pas les plages.
+
+Usage :
+    cloner = SheetCloner(excel_file_bytes)
+    ws = cloner.copy_sheet("Bordereau", "Bordereau_copie")
+    ws.freeze_formulas(["D", "E"])
+    ws.delete_cols(7, 4)
+    cloner.save(output_io)
+"""
+import copy
+import io
+import posixpath
+import zipfile
+from xml.etree.ElementTree import fromstring
+
+from lxml import etree
+from openpyxl.formula.translate import Translator
+from openpyxl.utils.cell import column_index_from_string, coordinate_to_tuple, get_column_letter, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904
+from openpyxl.worksheet.formula import ArrayFormula
+
+from workbook_reader import (
+    SHEET_MAIN_NS, REL_NS, PKG_REL_NS, ROW_TAG, CELL_TAG, VALUE_TAG, FORMULA_TAG, INLINE_STRING_TAG, TEXT_TAG,
+    SI_TAG, MERGE_CELL_TAG, SHEET_DATA_TAG, DIMENSION_TAG, find_workbook_part, read_date_styles, read_rels,
+    _cast_number, _resolve_target, _text_content,
+)
+
+MC_NS = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+WORKSHEET_TAG = f"{{{SHEET_MAIN_NS}}}worksheet"
+SHEET_VIEW_TAG = f"{{{SHEET_MAIN_NS}}}sheetView"
+PAGE_SETUP_TAG = f"{{{SHEET_MAIN_NS}}}pageSetup"
+EXT_LIST_TAG = f"{{{SHEET_MAIN_NS}}}extLst"
+ALTERNATE_CONTENT_TAG = f"{{{MC_NS}}}AlternateContent"
+PANE_TAG = f"{{{SHEET_MAIN_NS}}}pane"
+SELECTION_TAG = f"{{{SHEET_MAIN_NS}}}selection"
+EXT_TAG = f"{{{SHEET_MAIN_NS}}}ext"
+# Éléments à plages que delete_cols ne décale pas et que la copie cellule par
+# cellule (openpyxl) ne reprend pas : protection, filtres, mises en forme
+# conditionnelles, validations de données
+_UNSHIFTED_FEATURES = tuple(f"{{{SHEET_MAIN_NS}}}{name}" for name in (
+    "sheetProtection", "protectedRanges", "autoFilter", "sortState", "conditionalFormatting", "dataValidations"))
+# Mêmes fonctionnalités dans extLst (extensions x14 d'Excel)
+_UNSHIFTED_EXTENSIONS = {"conditionalFormattings", "dataValidations"}
+# Conteneurs qui ne peuvent pas rester vides une fois leurs éléments à relation retirés
+_NON_EMPTY_CONTAINERS = {f"{{{SHEET_MAIN_NS}}}{name}" for name in ("hyperlinks", "oleObjects", "controls", "tableParts", "extLst")}
+
+_CT = "application/vnd.openxmlformats-officedocument"
+WORKBOOK_CONTENT_TYPE = f"{_CT}.spreadsheetml.sheet.main+xml"
+WORKSHEET_CONTENT_TYPE = f"{_CT}.spreadsheetml.worksheet+xml"
+STYLES_CONTENT_TYPE = f"{_CT}.spreadsheetml.styles+xml"
+SHARED_STRINGS_CONTENT_TYPE = f"{_CT}.spreadsheetml.sharedStrings+xml"
+THEME_CONTENT_TYPE = f"{_CT}.theme+xml"
+RELS_CONTENT_TYPE = "application/vnd.openxmlformats-package.relationships+xml"
+OFFICE_DOCUMENT_REL = f"{REL_NS}/officeDocument"
+
+# Pas d'entités externes ; les feuilles de plusieurs dizaines de Mo restent lisibles
+_XML_PARSER = etree.XMLParser(resolve_entities=False, huge_tree=True)
+_DIGITS = "0123456789"
+_XPATH_NS = {"m": SHEET_MAIN_NS, "r": REL_NS}
+# Type de donnée openpyxl (cell.data_type) selon l'attribut t d'une cellule
+_DATA_TYPES = {"s": "s", "inlineStr": "s", "str": "s", "b": "b", "e": "e", "d": "d"}
+
+
+class SheetCloneError(Exception):
+    """Classeur que la copie au niveau du paquet ne sait pas traiter (l'appelant peut passer par openpyxl)."""
+
+
+def _to_xml(root):
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+def _relationships(rels):
+    root = etree.Element(f"{{{PKG_REL_NS}}}Relationships", nsmap={None: PKG_REL_NS})
+    for rel_id, rel_type, target in rels:
+        etree.SubElement(root, f"{{{PKG_REL_NS}}}Relationship", Id=rel_id, Type=rel_type, Target=target)
+    return _to_xml(root)
+
+
+class SheetCloner:
+    """
+    Classeur de destination construit à partir des feuilles d'un classeur source.
+
+    Attributes:
+        source_sheetnames (list): feuilles de calcul du classeur source.
+        sheetnames (list): feuilles déjà copiées, dans l'ordre du classeur de destination.
+    """
+
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        try:
+            self._archive = zipfile.ZipFile(source)
+            self._read_package()
+        except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError, SyntaxError) as e:
+            raise SheetCloneError(f"Paquet XLSX illisible: {e}") from e
+        self._sheets = []
+        self._source_strings = None # <si> du classeur source, lus à la première chaîne partagée
+        self._strings = [] # <si> du classeur de destination
+        self._string_index = {} # indice source -> indice destination
+        self._text_index = {} # texte écrit -> indice destination
+        self._date_styles = None
+
+    def _read_package(self):
+        part_names = set(self._archive.namelist())
+        workbook_part = find_workbook_part(self._archive)
+        workbook_dir = posixpath.dirname(workbook_part)
+        workbook_rels = read_rels(self._archive, workbook_part)
+
+        root = fromstring(self._archive.read(workbook_part))
+        if root.tag != f"{{{SHEET_MAIN_NS}}}workbook":
+            raise SheetCloneError(f"Format de classeur non pris en charge: {root.tag}")
+        properties = root.find(f"{{{SHEET_MAIN_NS}}}workbookPr")
+        self._date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+
+        self._sheet_parts = {}
+        for sheet in root.iter(f"{{{SHEET_MAIN_NS}}}sheet"):
+            rel = workbook_rels.get(sheet.get(f"{{{REL_NS}}}id"))
+            if rel and rel[0].endswith("/worksheet"):
+                self._sheet_parts[sheet.get("name")] = _resolve_target(workbook_dir, rel[1])
+        self.source_sheetnames = list(self._sheet_parts)
+
+        self._shared_strings_part = self._styles_part = self._theme_part = None
+        for rel_type, target in workbook_rels.values():
+            part = _resolve_target(workbook_dir, target)
+            if part not in part_names:
+                continue
+            if rel_type.endswith("/sharedStrings"):
+                self._shared_strings_part = part
+            elif rel_type.endswith("/styles"):
+                self._styles_part = part
+            elif rel_type.endswith("/theme") and not read_rels(self._archive, part):
+                # Un thème qui renvoie à d'autres parties (images) n'est pas copié : Excel prend le thème par défaut
+                self._theme_part = part
+
+    @property
+    def sheetnames(self):
+        return [sheet.title for sheet in self._sheets]
+
+    def copy_sheet(self, source_name, title):
+        """
+        Copie la feuille 'source_name' sous le nom 'title' et la renvoie
+        (ClonedSheet). Une feuille de destination de même nom est remplacée.
+        """
+        part = self._sheet_parts.get(source_name)
+        if part is None:
+            raise KeyError(f"Worksheet {source_name} does not exist.")
+        try:
+            root = etree.fromstring(self._archive.read(part), _XML_PARSER)
+        except (KeyError, etree.XMLSyntaxError) as e:
+            raise SheetCloneError(f"Feuille '{source_name}' illisible: {e}") from e
+        if root.tag != WORKSHEET_TAG or root.find(SHEET_DATA_TAG) is None:
+            raise SheetCloneError(f"Feuille '{source_name}' au format non pris en charge: {root.tag}")
+
+        self._sheets = [sheet for sheet in self._sheets if sheet.title != title]
+        sheet = ClonedSheet(self, title, root)
+        self._sheets.append(sheet)
+        return sheet
+
+    def save(self, target):
+        """Écrit le classeur de destination dans 'target' (chemin ou fichier binaire)."""
+        if not self._sheets:
+            raise ValueError("Aucune feuille copiée.")
+        overrides = [("/xl/workbook.xml", WORKBOOK_CONTENT_TYPE)]
+        workbook_rels = []
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as archive:
+            for number, sheet in enumerate(self._sheets, 1):
+                archive.writestr(f"xl/worksheets/sheet{number}.xml", sheet._to_xml(selected=number == 1))
+                workbook_rels.append((f"rId{number}", f"{REL_NS}/worksheet", f"worksheets/sheet{number}.xml"))
+                overrides.append((f"/xl/worksheets/sheet{number}.xml", WORKSHEET_CONTENT_TYPE))
+
+            # Styles et thème recopiés tels quels : les attributs s des cellules restent valides
+            copied_parts = [(self._styles_part, "styles.xml", "styles", STYLES_CONTENT_TYPE),
+                            (self._theme_part, "theme/theme1.xml", "theme", THEME_CONTENT_TYPE)]
+            for source_part, part_name, rel_name, content_type in copied_parts:
+                if source_part:
+                    archive.writestr(f"xl/{part_name}", self._archive.read(source_part))
+                    workbook_rels.append((f"rId{len(workbook_rels) + 1}", f"{REL_NS}/{rel_name}", part_name))
+                    overrides.append((f"/xl/{part_name}", content_type))
+            if self._strings:
+                archive.writestr("xl/sharedStrings.xml", self._shared_strings_xml())
+                workbook_rels.append((f"rId{len(workbook_rels) + 1}", f"{REL_NS}/sharedStrings", "sharedStrings.xml"))
+                overrides.append(("/xl/sharedStrings.xml", SHARED_STRINGS_CONTENT_TYPE))
+
+            archive.writestr("xl/workbook.xml", self._workbook_xml())
+            archive.writestr("xl/_rels/workbook.xml.rels", _relationships(workbook_rels))
+            archive.writestr("_rels/.rels", _relationships([("rId1", OFFICE_DOCUMENT_REL, "xl/workbook.xml")]))
+            archive.writestr("[Content_Types].xml", self._content_types_xml(overrides))
+
+    # --- Parties générées ---
+
+    def _workbook_xml(self):
+        ns = SHEET_MAIN_NS
+        root = etree.Element(f"{{{ns}}}workbook", nsmap={None: ns, "r": REL_NS})
+        properties = etree.SubElement(root, f"{{{ns}}}workbookPr")
+        if self._date1904:
+            properties.set("date1904", "1")
+        book_views = etree.SubElement(root, f"{{{ns}}}bookViews")
+        etree.SubElement(book_views, f"{{{ns}}}workbookView", activeTab="0")
+        sheets = etree.SubElement(root, f"{{{ns}}}sheets")
+        for number, sheet in enumerate(self._sheets, 1):
+            entry = etree.SubElement(sheets, f"{{{ns}}}sheet", name=sheet.title, sheetId=str(number))
+            entry.set(f"{{{REL_NS}}}id", f"rId{number}")
+        # Comme un classeur écrit par openpyxl : Excel recalcule les formules à l'ouverture
+        etree.SubElement(root, f"{{{ns}}}calcPr", calcId="124519", fullCalcOnLoad="1")
+        return _to_xml(root)
+
+    def _shared_strings_xml(self):
+        root = etree.Element(f"{{{SHEET_MAIN_NS}}}sst", nsmap={None: SHEET_MAIN_NS}, uniqueCount=str(len(self._strings)))
+        root.extend(self._strings)
+        return _to_xml(root)
+
+    @staticmethod
+    def _content_types_xml(overrides):
+        root = etree.Element(f"{{{CONTENT_TYPES_NS}}}Types", nsmap={None: CONTENT_TYPES_NS})
+        etree.SubElement(root, f"{{{CONTENT_TYPES_NS}}}Default", Extension="rels", ContentType=RELS_CONTENT_TYPE)
+        etree.SubElement(root, f"{{{CONTENT_TYPES_NS}}}Default", Extension="xml", ContentType="application/xml")
+        for part_name, content_type in overrides:
+            etree.SubElement(root, f"{{{CONTENT_TYPES_NS}}}Override", PartName=part_name, ContentType=content_type)
+        return _to_xml(root)
+
+    # --- Chaînes partagées et styles ---
+
+    def _copied_string(self, source_index):
+        """Indice dans le classeur de destination de la chaîne partagée 'source_index' du classeur source."""
+        index = self._string_index.get(source_index)
+        if index is None:
+            if self._source_strings is None:
+                self._source_strings = self._read_source_strings()
+            try:
+                string_item = self._source_strings[source_index]
+            except IndexError:
+                raise SheetCloneError(f"Chaîne partagée {source_index} absente du classeur source.") from None
+            index = self._string_index[source_index] = len(self._strings)
+            self._strings.append(copy.deepcopy(string_item))
+        return index
+
+    def _added_string(self, text):
+        """Indice d'un nouveau texte dans les chaînes partagées du classeur de destination."""
+        index = self._text_index.get(text)
+        if index is None:
+            string_item = etree.Element(SI_TAG)
+            text_node = etree.SubElement(string_item, TEXT_TAG)
+            text_node.text = text
+            if text != text.strip():
+                text_node.set(XML_SPACE, "preserve")
+            index = self._text_index[text] = len(self._strings)
+            self._strings.append(string_item)
+        return index
+
+    def _string_text(self, index):
+        return _text_content(self._strings[index]).replace("x005F_", "")
+
+    def _read_source_strings(self):
+        if not self._shared_strings_part:
+            return []
+        root = etree.fromstring(self._archive.read(self._shared_strings_part), _XML_PARSER)
+        return root.findall(SI_TAG)
+
+    @property
+    def date_styles(self):
+        """(styles date, styles durée) : indices des cellXfs dont le format est une date ou une durée."""
+        if self._date_styles is None:
+            if self._styles_part:
+                self._date_styles = read_date_styles(fromstring(self._archive.read(self._styles_part)))
+            else:
+                self._date_styles = (set(), set())
+        return self._date_styles
+
+    @property
+    def epoch(self):
+        return CALENDAR_MAC_1904 if self._date1904 else CALENDAR_WINDOWS_1900
+
+
+class ClonedCell:
+    """Cellule d'une feuille copiée : row, column, value et data_type, comme une cellule openpyxl."""
+    __slots__ = ("_sheet", "row", "column", "_cached")
+
+    def __init__(self, sheet, row, column, cached=False):
+        self._sheet = sheet
+        self.row = row
+        self.column = column
+        self._cached = cached
+
+    @property
+    def coordinate(self):
+        return f"{get_column_letter(self.column)}{self.row}"
+
+    @property
+    def value(self):
+        return self._sheet._read_value(self.row, self.column, self._cached)
+
+    @value.setter
+    def value(self, value):
+        if self._cached:
+            raise AttributeError("La vue des valeurs en cache est en lecture seule.")
+        self._sheet._write_value(self.row, self.column, value)
+
+    @property
+    def data_type(self):
+        return self._sheet._data_type(self.row, self.column, self._cached)
+
+
+class CachedValues:
+    """Vue des valeurs en cache d'une feuille copiée (équivalent d'une feuille chargée avec data_only=True)."""
+
+    def __init__(self, sheet):
+        self._sheet = sheet
+        self.title = sheet.title
+
+    def __getitem__(self, coordinate):
+        return ClonedCell(self._sheet, *coordinate_to_tuple(coordinate), cached=True)
+
+    def cell(self, row, column):
+        return ClonedCell(self._sheet, row, column, cached=True)
+
+
+class ClonedSheet:
+    """
+    Feuille copiée dans le classeur de destination, modifiée directement dans
+    son XML. ws["A1"] et ws.cell() renvoient la vue formules (data_only=False),
+    ws.cached_values la vue des valeurs en cache.
+    """
+
+    def __init__(self, package, title, root):
+        self._package = package
+        self.title = title
+        self._root = root
+        self._sheet_data = root.find(SHEET_DATA_TAG)
+        merged_ranges = [range_boundaries(merge.get("ref")) for merge in root.iter(MERGE_CELL_TAG) if merge.get("ref")]
+        # Cellules couvertes par une fusion, hors celle en haut à gauche (MergedCell d'openpyxl)
+        self._merged_hidden = {
+            (row_idx, col_idx)
+            for min_c, min_r, max_c, max_r in merged_ranges
+            for row_idx in range(min_r, max_r + 1)
+            for col_idx in range(min_c, max_c + 1)
+            if (row_idx, col_idx) != (min_r, min_c)
+        }
+        self._drop_relationship_references()
+        self._drop_unshifted_features()
+        self._index_cells()
+        self._clear_merged_hidden()
+        # Étendue de la feuille, fusions comprises, comme max_row / max_column d'openpyxl
+        self._max_row = max([row for row, cells in self._cells.items() if cells] + [r for _, _, _, r in merged_ranges], default=1)
+        self._max_column = max([max(cells) for cells in self._cells.values() if cells] + [c for _, _, c, _ in merged_ranges], default=1)
+
+    def _index_cells(self):
+        """
+        Indexe les lignes et cellules ({ligne: {colonne: <c>}}) et les groupes de
+        formules partagées ; les indices de chaînes partagées sont renumérotés
+        vers le classeur de destination.
+        """
+        self._rows = {}
+        self._cells = {}
+        row_idx = 0
+        for row_element in self._sheet_data.iterchildren(ROW_TAG):
+            r = row_element.get("r")
+            row_idx = int(r) if r else row_idx + 1
+            if not r:
+                row_element.set("r", str(row_idx))
+            self._rows[row_idx] = row_element
+            cells = self._cells[row_idx] = {}
+            col = 0
+            for element in row_element.iterchildren(CELL_TAG):
+                coordinate = element.get("r")
+                if coordinate:
+                    col = column_index_from_string(coordinate.rstrip(_DIGITS))
+                else:
+                    col += 1
+                    element.set("r", f"{get_column_letter(col)}{row_idx}")
+                cells[col] = element
+
+        package = self._package
+        for value in self._sheet_data.xpath("m:row/m:c[@t='s']/m:v", namespaces=_XPATH_NS):
+            if value.text:
+                value.text = str(package._copied_string(int(value.text)))
+
+        self._shared_masters = {} # si -> cellule portant le texte de la formule partagée
+        self._shared_cells = {} # si -> cellules du groupe
+        self._translators = {}
+        for formula in self._sheet_data.xpath("m:row/m:c/m:f[@t='shared']", namespaces=_XPATH_NS):
+            element, si = formula.getparent(), formula.get("si")
+            self._shared_cells.setdefault(si, []).append(element)
+            if formula.text and si not in self._shared_masters:
+                self._shared_masters[si] = element
+
+    def _clear_merged_hidden(self):
+        """Vide les cellules couvertes par une fusion, comme openpyxl : seul leur style reste."""
+        for row_idx, col_idx in self._merged_hidden:
+            element = self._element(row_idx, col_idx)
+            if element is not None and len(element):
+                self._write_value(row_idx, col_idx, None)
+
+    def _drop_relationship_references(self):
+        """
+        Retire les éléments qui renvoient aux relations de la feuille source
+        (dessins, commentaires, tableaux, liens hypertexte externes...), qui ne
+        sont pas copiées. Les paramètres d'impression gardent leur mise en page.
+        """
+        rel_prefix = f"{{{REL_NS}}}"
+        # sheetData, de loin la plus grosse partie, ne contient aucune relation
+        for element in self._root.xpath("/*/*[not(self::m:sheetData)]/descendant-or-self::*[@r:*]", namespaces=_XPATH_NS):
+            rel_attributes = [name for name in element.attrib if name.startswith(rel_prefix)]
+            if element.tag == PAGE_SETUP_TAG:
+                for name in rel_attributes:
+                    del element.attrib[name]
+                continue
+            removed = element
+            for ancestor in element.iterancestors():
+                if ancestor.tag == ALTERNATE_CONTENT_TAG:
+                    removed = ancestor
+                    break
+                parent = ancestor.getparent()
+                if parent is not None and parent.tag == EXT_LIST_TAG:
+                    removed = ancestor
+                    break
+            if removed.getroottree().getroot() is not self._root:
+                continue # Déjà retiré avec un ancêtre
+            parent = removed.getparent()
+            parent.remove(removed)
+            while parent.tag in _NON_EMPTY_CONTAINERS and len(parent) == 0 and parent.getparent() is not None:
+                grandparent = parent.getparent()
+                grandparent.remove(parent)
+                parent = grandparent
+
+    def _drop_unshifted_features(self):
+        """
+        Retire protection, volets figés, filtres automatiques, mises en forme
+        conditionnelles et validations de données : leurs plages ne suivraient
+        pas delete_cols et la copie openpyxl ne les reprend pas non plus.
+        """
+        root = self._root
+        for element in list(root.iterchildren(*_UNSHIFTED_FEATURES)):
+            root.remove(element)
+        for sheet_view in root.iter(SHEET_VIEW_TAG):
+            for pane in list(sheet_view.iterchildren(PANE_TAG)):
+                sheet_view.remove(pane)
+            # Sélections propres à un volet : sans volet, elles n'ont plus de sens
+            for selection in list(sheet_view.iterchildren(SELECTION_TAG)):
+                if selection.get("pane"):
+                    sheet_view.remove(selection)
+        for ext_list in list(root.iterchildren(EXT_LIST_TAG)):
+            for ext in list(ext_list.iterchildren(EXT_TAG)):
+                if any(isinstance(child.tag, str) and etree.QName(child).localname in _UNSHIFTED_EXTENSIONS for child in ext):
+                    ext_list.remove(ext)
+            if len(ext_list) == 0:
+                root.remove(ext_list)
+
+    # --- API Worksheet (sous-ensemble) ---
+
+    @property
+    def max_row(self):
+        return self._max_row
+
+    @property
+    def max_column(self):
+        return self._max_column
+
+    def __getitem__(self, coordinate):
+        return ClonedCell(self, *coordinate_to_tuple(coordinate))
+
+    def cell(self, row, column):
+        return ClonedCell(self, row, column)
+
+    def iter_rows(self, min_row=None, max_row=None, min_col=None, max_col=None, values_only=False):
+        """
+        Lignes de la plage, en tuples de cellules (ou de valeurs avec
+        values_only), comme Worksheet.iter_rows ; aucune cellule n'est créée.
+        """
+        columns = range(min_col or 1, (max_col or self._max_column) + 1)
+        for row in range(min_row or 1, (max_row or self._max_row) + 1):
+            if values_only:
+                yield tuple(self._read_value(row, col, False) for col in columns)
+            else:
+                yield tuple(ClonedCell(self, row, col) for col in columns)
+
+    @property
+    def cached_values(self):
+        return CachedValues(self)
+
+    def freeze_formulas(self, columns, match_column_a=None):
+        """
+        Remplace les formules des colonnes 'columns' (lettres) par leur valeur en
+        cache, comme ws[c].value = ws_valeurs[c].value avec openpyxl ; une formule
+        sans valeur en cache laisse la cellule vide. Le même parcours cherche la
+        première ligne dont la valeur en A (vue formules, après gel) vérifie
+        match_column_a(valeur). Retourne (nombre de cellules figées, cette ligne
+        ou None).
+        """
+        col_indexes = {column_index_from_string(column) for column in columns}
+        frozen = 0
+        matched_row = None
+        for row_idx, cells in self._cells.items():
+            for col in col_indexes:
+                element = cells.get(col)
+                if element is None:
+                    continue
+                formula = element.find(FORMULA_TAG)
+                if formula is None:
+                    continue
+                if formula.get("t") == "shared":
+                    si = formula.get("si")
+                    if not self._shared_group_within(si, col_indexes):
+                        self._unshare(si)
+                    elif self._shared_masters.get(si) is element:
+                        # Groupe entièrement figé : ses autres cellules le seront aussi
+                        del self._shared_masters[si]
+                element.remove(formula)
+                value = element.find(VALUE_TAG)
+                if value is None or value.text is None:
+                    element.attrib.pop("t", None)
+                    if value is not None:
+                        element.remove(value)
+                elif element.get("t") == "str":
+                    element.set("t", "s")
+                    value.text = str(self._package._added_string(value.text))
+                frozen += 1
+            if (match_column_a is not None and 1 in cells and (matched_row is None or row_idx < matched_row)
+                    and match_column_a(self._read_value(row_idx, 1, cached=False))):
+                matched_row = row_idx
+        return frozen, matched_row
+
+    def delete_cols(self, idx, amount=1):
+        """
+        Supprime 'amount' colonnes à partir de 'idx', comme openpyxl : les
+        cellules suivantes sont décalées vers la gauche, les formules, fusions
+        et largeurs de colonnes ne sont pas modifiées.
+        """
+        last = idx + amount - 1
+        self._merged_hidden = {(row_idx, col_idx if col_idx < idx else col_idx - amount)
+                               for row_idx, col_idx in self._merged_hidden if not idx <= col_idx <= last}
+        if self._max_column >= idx:
+            self._max_column = max(self._max_column - amount, idx - 1, 1)
+        # Un groupe de formules partagées à cheval sur les colonnes supprimées devient des formules simples
+        for si, master in list(self._shared_masters.items()):
+            min_c, _, max_c, _ = range_boundaries(master.find(FORMULA_TAG).get("ref") or master.get("r"))
+            if max_c >= idx and min_c <= last and not (min_c >= idx and max_c <= last):
+                self._unshare(si)
+
+        # Plages des formules matricielles et partagées décalées avec leur cellule
+        for formula in self._sheet_data.xpath("m:row/m:c/m:f[@ref]", namespaces=_XPATH_NS):
+            min_c, min_r, max_c, max_r = range_boundaries(formula.get("ref"))
+            if min_c > last:
+                formula.set("ref", f"{get_column_letter(min_c - amount)}{min_r}:{get_column_letter(max_c - amount)}{max_r}")
+
+        for row_idx, cells in self._cells.items():
+            if not cells or max(cells) < idx:
+                continue
+            row_element = self._rows[row_idx]
+            kept = {}
+            for col, element in cells.items():
+                if col < idx:
+                    kept[col] = element
+                elif col > last:
+                    element.set("r", f"{get_column_letter(col - amount)}{row_idx}")
+                    kept[col - amount] = element
+                else:
+                    row_element.remove(element)
+            self._cells[row_idx] = kept
+            row_element.attrib.pop("spans", None)
+        self._translators.clear()
+
+    # --- Lecture et écriture des cellules ---
+
+    def _element(self, row, col):
+        cells = self._cells.get(row)
+        return cells.get(col) if cells else None
+
+    def _read_value(self, row, col, cached):
+        element = self._element(row, col)
+        if element is None or (row, col) in self._merged_hidden:
+            return None
+        formula = element.find(FORMULA_TAG)
+        if formula is not None and not cached:
+            if formula.get("t") == "array":
+                return ArrayFormula(ref=formula.get("ref"), text="=" + (formula.text or ""))
+            return self._formula_text(element, formula)
+
+        data_type = element.get("t", "n")
+        if data_type == "inlineStr":
+            node = element.find(INLINE_STRING_TAG)
+            return _text_content(node) if node is not None else None
+        raw = element.findtext(VALUE_TAG) or None
+        if raw is None:
+            return None
+        if data_type == "n":
+            value = _cast_number(raw)
+            date_formats, timedelta_formats = self._package.date_styles
+            style_id = int(element.get("s", 0))
+            if style_id in date_formats:
+                try:
+                    value = from_excel(value, self._package.epoch, timedelta=style_id in timedelta_formats)
+                except (OverflowError, ValueError):
+                    value = "#VALUE!"
+            return value
+        if data_type == "s":
+            return self._package._string_text(int(raw))
+        if data_type == "b":
+            return bool(int(raw))
+        if data_type == "d":
+            return from_ISO8601(raw)
+        return raw
+
+    def _data_type(self, row, col, cached):
+        element = self._element(row, col)
+        if element is None or (row, col) in self._merged_hidden:
+            return "n"
+        if not cached and element.find(FORMULA_TAG) is not None:
+            return "f"
+        return _DATA_TYPES.get(element.get("t"), "n")
+
+    def _write_value(self, row, col, value):
+        element = self._element(row, col)
+        if element is None:
+            element = self._create_cell(row, col)
+        formula = element.find(FORMULA_TAG)
+        if formula is not None and formula.get("t") == "shared":
+            self._unshare(formula.get("si"))
+        for child in list(element):
+            element.remove(child)
+        element.attrib.pop("t", None)
+        if value is None:
+            return
+        if isinstance(value, bool):
+            element.set("t", "b")
+            etree.SubElement(element, VALUE_TAG).text = "1" if value else "0"
+        elif isinstance(value, (int, float)):
+            etree.SubElement(element, VALUE_TAG).text = repr(value)
+        elif isinstance(value, str):
+            if len(value) > 1 and value.startswith("="):
+                etree.SubElement(element, FORMULA_TAG).text = value[1:]
+            else:
+                element.set("t", "s")
+                etree.SubElement(element, VALUE_TAG).text = str(self._package._added_string(value))
+        else:
+            raise TypeError(f"Type de valeur non pris en charge: {type(value).__name__}")
+
+    def _create_cell(self, row, col):
+        """Ajoute une cellule vide (et sa ligne au besoin) à sa place dans sheetData."""
+        row_element = self._rows.get(row)
+        if row_element is None:
+            row_element = etree.SubElement(self._sheet_data, ROW_TAG, r=str(row))
+            following = min((row_idx for row_idx in self._rows if row_idx > row), default=None)
+            if following is not None:
+                self._rows[following].addprevious(row_element)
+            self._rows[row] = row_element
+            self._cells[row] = {}
+        cells = self._cells[row]
+        element = etree.SubElement(row_element, CELL_TAG, r=f"{get_column_letter(col)}{row}")
+        following = min((col_idx for col_idx in cells if col_idx > col), default=None)
+        if following is not None:
+            cells[following].addprevious(element)
+        cells[col] = element
+        row_element.attrib.pop("spans", None)
+        self._max_row, self._max_column = max(self._max_row, row), max(self._max_column, col)
+        return element
+
+    # --- Formules partagées ---
+
+    def _formula_text(self, element, formula):
+        """Texte '=...' de la formule d'une cellule ; celle d'une cellule dépendante d'un groupe partagé est traduite."""
+        if formula.get("t") == "shared":
+            si = formula.get("si")
+            master = self._shared_masters.get(si)
+            if master is not None and master is not element:
+                translator = self._translators.get(si)
+                if translator is None:
+                    translator = self._translators[si] = Translator("=" + master.find(FORMULA_TAG).text, master.get("r"))
+                return translator.translate_formula(element.get("r"))
+        return "=" + (formula.text or "")
+
+    def _shared_group_within(self, si, col_indexes):
+        master = self._shared_masters.get(si)
+        if master is None:
+            return True
+        min_c, _, max_c, _ = range_boundaries(master.find(FORMULA_TAG).get("ref") or master.get("r"))
+        return all(col in col_indexes for col in range(min_c, max_c + 1))
+
+    def _unshare(self, si):
+        """Remplace les formules du groupe partagé 'si' par des formules simples (texte traduit pour chaque cellule)."""
+        members = self._shared_cells.pop(si, [])
+        texts = [(element, self._formula_text(element, element.find(FORMULA_TAG))) for element in members
+                 if element.find(FORMULA_TAG) is not None and element.find(FORMULA_TAG).get("si") == si]
+        self._shared_masters.pop(si, None)
+        self._translators.pop(si, None)
+        for element, text in texts:
+            formula = element.find(FORMULA_TAG)
+            formula.text = text[1:]
+            for attribute in ("t", "si", "ref"):
+                formula.attrib.pop(attribute, None)
+
+    # --- Écriture ---
+
+    def _to_xml(self, selected):
+        """XML de la feuille, avec sa dimension recalculée ; seule la première feuille est sélectionnée."""
+        dimension = self._root.find(DIMENSION_TAG)
+        if dimension is not None:
+            rows = [row for row, cells in self._cells.items() if cells]
+            if rows:
+                min_col = min(min(cells) for cells in self._cells.values() if cells)
+                max_col = max(max(cells) for cells in self._cells.values() if cells)
+                start, end = f"{get_column_letter(min_col)}{min(rows)}", f"{get_column_letter(max_col)}{max(rows)}"
+                dimension.set("ref", start if start == end else f"{start}:{end}")
+            else:
+                dimension.set("ref", "A1")
+        for view in self._root.iter(SHEET_VIEW_TAG):
+            if selected:
+                view.set("tabSelected", "1")
+            else:
+                view.attrib.pop("tabSelected", None)
+        return _to_xml(self._root)
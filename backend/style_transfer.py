@@ -0,0 +1,60 @@
+# style_transfer.py
+"""
+Transfert des styles de cellules d'un classeur openpyxl vers un autre.
+
+Une cellule openpyxl porte son style sous forme d'identifiants (StyleArray)
+dans les listes du classeur : police, remplissage, bordure, format de nombre,
+protection et alignement. Copier police, bordure... objet par objet oblige
+openpyxl à les hacher de nouveau dans le classeur de destination pour chaque
+cellule. Ici, chaque combinaison d'identifiants source est convertie une seule
+fois en StyleArray de destination, puis réutilisée.
+"""
+from copy import copy
+
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS, BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+
+
+class StyleTransfer:
+    """
+    Cache des styles convertis pour une paire (classeur source, classeur de
+    destination). Le résultat est celui de la copie de font, border, fill,
+    number_format, protection et alignment ; le style nommé, quotePrefix et
+    pivotButton ne sont pas repris.
+    """
+
+    def __init__(self, wb_source, wb_destination):
+        self.wb_source = wb_source
+        self.wb_destination = wb_destination
+        self._styles = {} # tuple(StyleArray source) -> StyleArray de destination
+
+    def __len__(self):
+        return len(self._styles)
+
+    def copy_style(self, source_cell, target_cell):
+        """Donne à 'target_cell' le style de 'source_cell' (qui doit avoir un style)."""
+        key = tuple(source_cell._style)
+        style = self._styles.get(key)
+        if style is None:
+            style = self._styles[key] = self._convert(source_cell._style)
+        # Copie : openpyxl modifie le StyleArray de la cellule sur place
+        target_cell._style = copy(style)
+
+    def _convert(self, style):
+        source, destination = self.wb_source, self.wb_destination
+        if style.numFmtId < BUILTIN_FORMATS_MAX_SIZE:
+            number_format = BUILTIN_FORMATS.get(style.numFmtId, "General")
+        else:
+            number_format = source._number_formats[style.numFmtId - BUILTIN_FORMATS_MAX_SIZE]
+        if number_format in BUILTIN_FORMATS_REVERSE:
+            num_fmt_id = BUILTIN_FORMATS_REVERSE[number_format]
+        else:
+            num_fmt_id = destination._number_formats.add(number_format) + BUILTIN_FORMATS_MAX_SIZE
+        converted = StyleArray()
+        converted.fontId = destination._fonts.add(copy(source._fonts[style.fontId]))
+        converted.fillId = destination._fills.add(copy(source._fills[style.fillId]))
+        converted.borderId = destination._borders.add(copy(source._borders[style.borderId]))
+        converted.numFmtId = num_fmt_id
+        converted.protectionId = destination._protections.add(copy(source._protections[style.protectionId]))
+        converted.alignmentId = destination._alignments.add(copy(source._alignments[style.alignmentId]))
+        return converted
@@ -1,17 +1,30 @@
 # utility_routes.py
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 import openpyxl
 import io
-import re
-from copy import copy
-from openpyxl.utils.exceptions import InvalidFileException
-from openpyxl.utils.cell import get_column_letter
+import logging
+import os
+import zipfile
+from xml.etree.ElementTree import ParseError
+from openpyxl.utils.cell import column_index_from_string, get_column_letter
 
 # Import des fonctions de conversion de nombre en lettre
 from covnumletter import conv_number_letter as cl_conv_number_letter
+from result_cache import result_cache, xlsx_response
+from metrics import operation_trace
+from app_logging import capture_log_context
+from sheet_cloner import SheetCloner, SheetCloneError
+from workbook_reader import read_sheet_metadata
+from style_transfer import StyleTransfer
+from recap_links import RecapLinkRewriter
+from excel_batch import BATCH_MAX_FILES, BatchItem, stream_batch_zip
 
 # --- Blueprint Setup ---
 utility_bp = Blueprint('utility', __name__)
+logger = logging.getLogger(__name__)
+
+# Copie des feuilles : 'package' (XML du paquet XLSX, voir sheet_cloner) ou 'openpyxl' (cellule par cellule)
+COPY_ENGINE = os.environ.get('EXCEL_COPY_ENGINE', 'package').strip().lower()
 
 # --- Helper Functions (from bon_a_envoye.py) ---
 
@@ -25,34 +38,60 @@ def est_une_feuille_recap(nom_feuille_original):
     specific_recap_names = ["recapitulatif", "récapitulatif"]
     return any(keyword in nom_lower for keyword in recap_keywords) or nom_lower in specific_recap_names
 
-def add_quotes_if_necessary(sheet_name):
-    if re.search(r"[\s!@#$%^&*()+={}\[\]:;\"'<>,.?/\\|-]", sheet_name):
-        return f"'{sheet_name.replace('\'', '\'\'')}'"
-    return sheet_name
-
-def copier_feuille_manuellement(ws_source, wb_destination, nouveau_nom_feuille):
+def copier_feuille_manuellement(ws_source, wb_destination, nouveau_nom_feuille, style_transfer=None):
     if nouveau_nom_feuille in wb_destination.sheetnames:
         del wb_destination[nouveau_nom_feuille]
     ws_destination = wb_destination.create_sheet(title=nouveau_nom_feuille)
+    # Styles convertis une fois par combinaison (voir style_transfer), partagés entre les feuilles d'un même classeur
+    if style_transfer is None:
+        style_transfer = StyleTransfer(ws_source.parent, wb_destination)
     for row in ws_source.iter_rows():
         for cell in row:
             new_cell = ws_destination.cell(row=cell.row, column=cell.column, value=cell.value)
             if cell.has_style:
-                new_cell.font, new_cell.border, new_cell.fill = copy(cell.font), copy(cell.border), copy(cell.fill)
-                new_cell.number_format, new_cell.protection, new_cell.alignment = cell.number_format, copy(cell.protection), copy(cell.alignment)
+                style_transfer.copy_style(cell, new_cell)
     for col_letter, dim in ws_source.column_dimensions.items(): ws_destination.column_dimensions[col_letter].width = dim.width
     for row_num, dim in ws_source.row_dimensions.items(): ws_destination.row_dimensions[row_num].height = dim.height
     for merged_range_str in ws_source.merged_cells.ranges: ws_destination.merge_cells(str(merged_range_str))
     return ws_destination
 
-def nettoyer_total_en_lettres(ws_copie, ws_original_source_values):
-    prefixe = "Arrêter le présent devis estimatif à la somme de :"
+def est_ligne_total_general(valeur_a):
+    return bool(valeur_a) and isinstance(valeur_a, str) and "TOTAL GENERAL" in valeur_a.upper()
+
+def trouver_ligne_total_general(ws):
+    """Première ligne dont la cellule A contient "TOTAL GENERAL", ou None."""
+    for row, (valeur_a,) in enumerate(ws.iter_rows(min_col=1, max_col=1, values_only=True), start=1):
+        if est_ligne_total_general(valeur_a):
+            return row
+    return None
+
+def figer_colonnes_en_valeurs(ws_copie, ws_original_source_values, colonnes):
+    """
+    Remplace les formules des colonnes 'colonnes' de ws_copie par les valeurs
+    de ws_original_source_values, en un seul parcours des deux feuilles, ligne
+    par ligne. Le même parcours repère la ligne "TOTAL GENERAL" (colonne A),
+    retournée (ou None) pour ecrire_total_en_lettres().
+    """
+    indices = [column_index_from_string(col) for col in colonnes]
+    premiere_col, derniere_col = min(indices), max(indices)
+    max_row = ws_copie.max_row
+    lignes_copie = ws_copie.iter_rows(min_row=1, max_row=max_row, min_col=1, max_col=derniere_col)
+    lignes_valeurs = ws_original_source_values.iter_rows(min_row=1, max_row=max_row, min_col=premiere_col, max_col=derniere_col)
     ligne_total_general = None
-    for row in range(1, ws_copie.max_row + 1):
-        cell_a = ws_copie[f"A{row}"]
-        if cell_a.value and isinstance(cell_a.value, str) and "TOTAL GENERAL" in cell_a.value.upper():
+    for row, (cellules, valeurs) in enumerate(zip(lignes_copie, lignes_valeurs), start=1):
+        for col in indices:
+            cell = cellules[col - 1]
+            if cell.data_type == 'f':
+                cell.value = valeurs[col - premiere_col].value
+        if ligne_total_general is None and est_ligne_total_general(cellules[0].value):
             ligne_total_general = row
-            break
+    return ligne_total_general
+
+def nettoyer_total_en_lettres(ws_copie, ws_original_source_values):
+    ecrire_total_en_lettres(ws_copie, ws_original_source_values, trouver_ligne_total_general(ws_copie))
+
+def ecrire_total_en_lettres(ws_copie, ws_original_source_values, ligne_total_general):
+    prefixe = "Arrêter le présent devis estimatif à la somme de :"
     if ligne_total_general:
         cell_f_total_coord = f"F{ligne_total_general}"
         montant_total = ws_original_source_values[cell_f_total_coord].value
@@ -61,25 +100,77 @@ def nettoyer_total_en_lettres(ws_copie, ws_original_source_values):
             ws_copie[f"A{ligne_total_general + 1}"].value = f"{prefixe} {texte_total_lettres}"
 
 def modifier_liens_externes_feuille_recap(ws_recap, wb_cible):
-    for col_num in [6, ws_recap.max_column] if ws_recap.max_column != 6 else [6]:
-        for r in range(1, ws_recap.max_row + 1):
-            cell = ws_recap.cell(row=r, column=col_num)
-            if cell.data_type == 'f':
-                formula = str(cell.value)
-                match = re.match(r"=.*?['\[]([^\]']+)['\]]([^!]+)!(.+)", formula, re.IGNORECASE) or \
-                        re.match(r"=([^!\[]+)!(.+)", formula, re.IGNORECASE)
-                if match:
-                    groups = match.groups()
-                    sheet_name_raw = groups[-2].strip("'")
-                    cell_ref = groups[-1]
-                    target_sheet = f"{sheet_name_raw}_copie"
-                    if target_sheet in wb_cible.sheetnames:
-                        cell.value = f"={add_quotes_if_necessary(target_sheet)}!{cell_ref}"
+    """
+    Fait pointer toutes les références de la feuille récap vers les copies des
+    feuilles (voir recap_links). Retourne le rapport de réécriture.
+    """
+    rapport = RecapLinkRewriter(wb_cible.sheetnames).rewrite_sheet(ws_recap)
+    logger.debug("Liens de '%s': %s", ws_recap.title, rapport)
+    if rapport['missing_targets']:
+        logger.warning("Feuille récap '%s': feuilles référencées sans copie: %s", ws_recap.title, ", ".join(rapport['missing_targets']))
+    return rapport
+
+def cle_cache_process_excel(file_bytes, sheet_names_str):
+    """
+    Clé de cache d'un traitement /process-excel (route, job ou lot) : contenu du
+    fichier + feuilles demandées, normalisées comme dans traiter_fichier_excel_core.
+    """
+    noms_normalises = [s.strip().lower() for s in sheet_names_str.split(',') if s.strip()]
+    return result_cache.make_key('process-excel', [file_bytes], {'sheet_names': noms_normalises})
 
 def traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str):
+    # Durées des étapes load, write et save mesurées (voir metrics)
+    with operation_trace('process-excel') as trace:
+        if COPY_ENGINE != 'openpyxl':
+            try:
+                return _traiter_paquet_excel(bytes_fichier_source, noms_feuilles_a_traiter_str, trace)
+            except SheetCloneError as e:
+                logger.warning("Copie des feuilles au niveau du paquet impossible (%s), copie avec openpyxl", e)
+        return _traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str, trace)
+
+def _traiter_paquet_excel(bytes_fichier_source, noms_feuilles_a_traiter_str, trace):
+    """
+    Même traitement que _traiter_fichier_excel_core, mais les feuilles sont
+    copiées avec leur XML (styles compris) et modifiées sur place : pas de
+    copie cellule par cellule. Lève SheetCloneError si le classeur ne s'y prête pas.
+    """
+    with trace.span('load', bytes=len(bytes_fichier_source)):
+        cloner = SheetCloner(bytes_fichier_source)
+
+    noms_feuilles_sources_dict = {name.strip().lower(): name.strip() for name in cloner.source_sheetnames}
+    l_array_str = [s.strip() for s in noms_feuilles_a_traiter_str.split(',') if s.strip()]
+
+    for nom_feuille_saisi in l_array_str:
+        nom_feuille_source_original = trouver_nom_feuille_original(nom_feuille_saisi, noms_feuilles_sources_dict)
+        if nom_feuille_source_original:
+            with trace.span('write') as stage:
+                nom_feuille_copie_dest = f"{nom_feuille_source_original.strip()}_copie"
+                ws_copie_dest = cloner.copy_sheet(nom_feuille_source_original, nom_feuille_copie_dest)
+                stage.add(rows=ws_copie_dest.max_row, cells=ws_copie_dest.max_row * ws_copie_dest.max_column)
+
+                # Gel de D et E et recherche de la ligne "TOTAL GENERAL" en un seul parcours
+                _, ligne_total_general = ws_copie_dest.freeze_formulas(["D", "E"], est_ligne_total_general)
+                ecrire_total_en_lettres(ws_copie_dest, ws_copie_dest.cached_values, ligne_total_general)
+                ws_copie_dest.delete_cols(7, 4)
+
+                if est_une_feuille_recap(nom_feuille_source_original):
+                    modifier_liens_externes_feuille_recap(ws_copie_dest, cloner)
+
+    if not cloner.sheetnames:
+        return None, "Aucune feuille valide n'a été traitée."
+
+    with trace.span('save') as stage:
+        output_io = io.BytesIO()
+        cloner.save(output_io)
+        output_io.seek(0)
+        stage.add(bytes=output_io.getbuffer().nbytes)
+    return output_io, "fichier_traite.xlsx"
+
+def _traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str, trace):
     try:
-        wb_source = openpyxl.load_workbook(io.BytesIO(bytes_fichier_source), data_only=False)
-        wb_source_values = openpyxl.load_workbook(io.BytesIO(bytes_fichier_source), data_only=True)
+        with trace.span('load', bytes=len(bytes_fichier_source)):
+            wb_source = openpyxl.load_workbook(io.BytesIO(bytes_fichier_source), data_only=False)
+            wb_source_values = openpyxl.load_workbook(io.BytesIO(bytes_fichier_source), data_only=True)
     except Exception as e:
         return None, f"Impossible de charger le fichier source: {e}"
 
@@ -89,33 +180,34 @@ def traiter_fichier_excel_core(bytes_fichier_source, noms_feuilles_a_traiter_str
     wb_destination = openpyxl.Workbook()
     if "Sheet" in wb_destination.sheetnames:
         wb_destination.remove(wb_destination["Sheet"])
+    style_transfer = StyleTransfer(wb_source, wb_destination)
 
     for nom_feuille_saisi in l_array_str:
         nom_feuille_source_original = trouver_nom_feuille_original(nom_feuille_saisi, noms_feuilles_sources_dict)
         if nom_feuille_source_original:
-            ws_original_source = wb_source[nom_feuille_source_original]
-            ws_original_source_values = wb_source_values[nom_feuille_source_original]
-            nom_feuille_copie_dest = f"{nom_feuille_source_original.strip()}_copie"
-            
-            ws_copie_dest = copier_feuille_manuellement(ws_original_source, wb_destination, nom_feuille_copie_dest)
-            
-            for col in ["D", "E"]:
-                for row in range(1, ws_copie_dest.max_row + 1):
-                    if ws_copie_dest[f"{col}{row}"].data_type == 'f':
-                        ws_copie_dest[f"{col}{row}"].value = ws_original_source_values[f"{col}{row}"].value
-            
-            nettoyer_total_en_lettres(ws_copie_dest, ws_original_source_values)
-            ws_copie_dest.delete_cols(7, 4)
-            
-            if est_une_feuille_recap(nom_feuille_source_original):
-                modifier_liens_externes_feuille_recap(ws_copie_dest, wb_destination)
+            with trace.span('write') as stage:
+                ws_original_source = wb_source[nom_feuille_source_original]
+                ws_original_source_values = wb_source_values[nom_feuille_source_original]
+                nom_feuille_copie_dest = f"{nom_feuille_source_original.strip()}_copie"
+                
+                ws_copie_dest = copier_feuille_manuellement(ws_original_source, wb_destination, nom_feuille_copie_dest, style_transfer)
+                stage.add(rows=ws_original_source.max_row, cells=ws_original_source.max_row * ws_original_source.max_column)
+                
+                ligne_total_general = figer_colonnes_en_valeurs(ws_copie_dest, ws_original_source_values, ["D", "E"])
+                ecrire_total_en_lettres(ws_copie_dest, ws_original_source_values, ligne_total_general)
+                ws_copie_dest.delete_cols(7, 4)
+                
+                if est_une_feuille_recap(nom_feuille_source_original):
+                    modifier_liens_externes_feuille_recap(ws_copie_dest, wb_destination)
 
     if not wb_destination.sheetnames:
         return None, "Aucune feuille valide n'a été traitée."
 
-    output_io = io.BytesIO()
-    wb_destination.save(output_io)
-    output_io.seek(0)
+    with trace.span('save') as stage:
+        output_io = io.BytesIO()
+        wb_destination.save(output_io)
+        output_io.seek(0)
+        stage.add(bytes=output_io.getbuffer().nbytes)
     return output_io, "fichier_traite.xlsx"
 
 # --- Routes ---
@@ -129,12 +221,16 @@ def get_sheet_names_route():
         return jsonify({"error": "Aucun fichier sélectionné"}), 400
     
     try:
-        workbook = openpyxl.load_workbook(io.BytesIO(file.read()), read_only=True)
-        return jsonify({"sheet_names": workbook.sheetnames}), 200
-    except InvalidFileException:
+        # Seuls workbook.xml et l'en-tête de chaque feuille sont lus (voir workbook_reader)
+        sheets = read_sheet_metadata(file.read())
+    except (zipfile.BadZipFile, KeyError, ParseError):
         return jsonify({"error": "Fichier Excel invalide ou corrompu."}), 400
     except Exception as e:
         return jsonify({"error": f"Erreur serveur: {str(e)}"}), 500
+    for sheet in sheets:
+        sheet['hidden'] = sheet['state'] != 'visible'
+        sheet['est_une_feuille_recap'] = est_une_feuille_recap(sheet['name'])
+    return jsonify({"sheet_names": [sheet['name'] for sheet in sheets], "sheets": sheets}), 200
 
 @utility_bp.route('/process-excel', methods=['POST'])
 def process_excel_file_route():
@@ -146,14 +242,51 @@ def process_excel_file_route():
     if not sheet_names_str:
         return jsonify({"error": "Noms de feuilles à traiter non fournis ('sheet_names')"}), 400
 
-    processed_file_io, output_filename_or_error = traiter_fichier_excel_core(file.read(), sheet_names_str) 
+    file_bytes = file.read()
+    cache_key = cle_cache_process_excel(file_bytes, sheet_names_str)
+    cached = result_cache.get(cache_key)
+    if cached:
+        return xlsx_response(cached[0], cached[1], 'HIT')
+
+    processed_file_io, output_filename_or_error = traiter_fichier_excel_core(file_bytes, sheet_names_str) 
 
     if processed_file_io:
-        return send_file(
-            processed_file_io,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=output_filename_or_error
-        )
+        output_bytes = processed_file_io.getvalue()
+        result_cache.put(cache_key, output_bytes, output_filename_or_error)
+        return xlsx_response(output_bytes, output_filename_or_error, 'MISS')
     else:
         return jsonify({"error": output_filename_or_error or "Erreur serveur lors du traitement."}), 500
+
+@utility_bp.route('/process-excel-batch', methods=['POST'])
+def process_excel_batch_route():
+    """
+    Traite plusieurs classeurs en une requête et renvoie une archive ZIP envoyée
+    au fil des classeurs terminés (voir excel_batch).
+
+    Form-data:
+        excel_file: un champ par classeur.
+        sheet_names: un champ par classeur, dans le même ordre (ou un seul, commun à tous).
+    """
+    files = [f for f in request.files.getlist('excel_file') if f and f.filename]
+    if not files:
+        return jsonify({"error": "Aucun fichier ('excel_file') envoyé"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"Trop de classeurs dans le lot ({len(files)}, {BATCH_MAX_FILES} au plus)."}), 400
+    sheet_names_list = request.form.getlist('sheet_names')
+    if len(sheet_names_list) == 1:
+        sheet_names_list = sheet_names_list * len(files)
+    if len(sheet_names_list) != len(files):
+        return jsonify({"error": f"{len(files)} fichiers mais {len(sheet_names_list)} champs 'sheet_names' : un par fichier ou un seul pour tous."}), 400
+    if not all(s.strip() for s in sheet_names_list):
+        return jsonify({"error": "Noms de feuilles à traiter non fournis ('sheet_names')"}), 400
+
+    items = []
+    for file, sheet_names_str in zip(files, sheet_names_list):
+        file_bytes = file.read()
+        items.append(BatchItem(file.filename, file_bytes, sheet_names_str, cle_cache_process_excel(file_bytes, sheet_names_str)))
+
+    # Capturé ici : le ZIP est produit après la fin de la vue, identifiant de requête déjà retiré
+    log_context = capture_log_context()
+    response = Response(stream_with_context(stream_batch_zip(items, traiter_fichier_excel_core, log_context)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename="fichiers_traites.zip"'
+    return response
@@ -0,0 +1,435 @@
+# workbook_reader.py
+"""
+Lecture d'un classeur XLSX en une seule passe, avec deux vues par feuille :
+- la vue "formules" (équivalente à openpyxl.load_workbook(data_only=False)),
+- la vue "valeurs" (équivalente à openpyxl.load_workbook(data_only=True)).
+
+Chaque cellule est décodée une seule fois et conserve à la fois le texte de sa
+formule et la valeur mise en cache par Excel. Seules les feuilles effectivement
+demandées sont décompressées (via workbook.xml et ses relations) et lues en flux ;
+la table des chaînes partagées n'est chargée qu'à la première cellule qui en a besoin. Les vues exposent le sous-ensemble
+de l'API Worksheet d'openpyxl utilisé par les lecteurs EstimBatiment
+(title, max_row, max_column, ws[ligne], iter_rows).
+"""
+import io
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse, fromstring
+
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904
+from openpyxl.worksheet.formula import ArrayFormula
+
+SHEET_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+ROW_TAG = f"{{{SHEET_MAIN_NS}}}row"
+CELL_TAG = f"{{{SHEET_MAIN_NS}}}c"
+VALUE_TAG = f"{{{SHEET_MAIN_NS}}}v"
+FORMULA_TAG = f"{{{SHEET_MAIN_NS}}}f"
+INLINE_STRING_TAG = f"{{{SHEET_MAIN_NS}}}is"
+TEXT_TAG = f"{{{SHEET_MAIN_NS}}}t"
+RUN_TAG = f"{{{SHEET_MAIN_NS}}}r"
+SI_TAG = f"{{{SHEET_MAIN_NS}}}si"
+MERGE_CELL_TAG = f"{{{SHEET_MAIN_NS}}}mergeCell"
+SHEET_DATA_TAG = f"{{{SHEET_MAIN_NS}}}sheetData"
+DIMENSION_TAG = f"{{{SHEET_MAIN_NS}}}dimension"
+
+# Valeur (formule, valeur en cache) d'une cellule absente
+_EMPTY = (None, None)
+
+
+def _cast_number(value):
+    """Convertit un nombre stocké en texte en int ou float (même règle qu'openpyxl)."""
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _text_content(node):
+    """Concatène le texte brut d'un élément <si> ou <is> (hors annotations phonétiques)."""
+    snippets = []
+    plain = node.find(TEXT_TAG)
+    if plain is not None:
+        snippets.append(plain.text or "")
+    for run in node.findall(RUN_TAG):
+        run_text = run.find(TEXT_TAG)
+        if run_text is not None:
+            snippets.append(run_text.text or "")
+    return "".join(snippets)
+
+
+def read_date_styles(styles_root):
+    """Indices des styles de cellule (cellXfs) de styles.xml dont le format est une date ou une durée."""
+    date_formats, timedelta_formats = set(), set()
+    custom_formats = {int(fmt.get("numFmtId")): fmt.get("formatCode")
+                      for fmt in styles_root.iter(f"{{{SHEET_MAIN_NS}}}numFmt")}
+    cell_xfs = styles_root.find(f"{{{SHEET_MAIN_NS}}}cellXfs")
+    if cell_xfs is None:
+        return date_formats, timedelta_formats
+    for idx, xf in enumerate(cell_xfs.findall(f"{{{SHEET_MAIN_NS}}}xf")):
+        num_fmt_id = int(xf.get("numFmtId", 0))
+        fmt = custom_formats.get(num_fmt_id) or BUILTIN_FORMATS.get(num_fmt_id)
+        if fmt is None:
+            continue
+        if is_date_format(fmt):
+            date_formats.add(idx)
+        if is_timedelta_format(fmt):
+            timedelta_formats.add(idx)
+    return date_formats, timedelta_formats
+
+
+def _resolve_target(base_dir, target):
+    """Résout la cible d'une relation par rapport au dossier de la partie source."""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+def find_workbook_part(archive):
+    """Chemin de la partie classeur (xl/workbook.xml) d'un paquet, d'après _rels/.rels."""
+    try:
+        root = fromstring(archive.read("_rels/.rels"))
+    except KeyError:
+        return "xl/workbook.xml"
+    for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        if rel.get("Type", "").endswith("/officeDocument"):
+            return _resolve_target("", rel.get("Target"))
+    return "xl/workbook.xml"
+
+
+def read_rels(archive, part):
+    """Renvoie {rId: (type, cible)} pour les relations d'une partie du paquet."""
+    rels_part = posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+    try:
+        root = fromstring(archive.read(rels_part))
+    except KeyError:
+        return {}
+    return {rel.get("Id"): (rel.get("Type", ""), rel.get("Target", ""))
+            for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship")}
+
+
+def read_sheet_metadata(source):
+    """
+    Feuilles d'un classeur, dans l'ordre des onglets, sans lire leurs données :
+    [{'name', 'type', 'state', 'dimension'}]. 'type' vaut 'worksheet',
+    'chartsheet'... ; 'state' vaut 'visible', 'hidden' ou 'veryHidden' ;
+    'dimension' est la plage <dimension> déclarée en tête de la feuille (None
+    si absente). Seuls workbook.xml, ses relations et le début de chaque
+    feuille sont lus : la durée ne dépend pas de la taille des feuilles.
+    Lève zipfile.BadZipFile, KeyError ou ParseError si le paquet est invalide.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with zipfile.ZipFile(source) as archive:
+        workbook_part = find_workbook_part(archive)
+        workbook_dir = posixpath.dirname(workbook_part)
+        workbook_rels = read_rels(archive, workbook_part)
+        root = fromstring(archive.read(workbook_part))
+        sheets = []
+        for sheet in root.iter(f"{{{SHEET_MAIN_NS}}}sheet"):
+            rel_type, target = workbook_rels.get(sheet.get(f"{{{REL_NS}}}id"), ("", ""))
+            sheet_type = posixpath.basename(rel_type) or None
+            dimension = None
+            if sheet_type == "worksheet" and target:
+                dimension = _read_dimension(archive, _resolve_target(workbook_dir, target))
+            sheets.append({
+                "name": sheet.get("name"),
+                "type": sheet_type,
+                "state": sheet.get("state", "visible"),
+                "dimension": dimension,
+            })
+    return sheets
+
+
+def _read_dimension(archive, part):
+    """Plage de l'élément <dimension> d'une feuille ; la lecture s'arrête au début de <sheetData>."""
+    try:
+        source = archive.open(part)
+    except KeyError:
+        return None
+    with source:
+        for _, node in iterparse(source, events=("start",)):
+            if node.tag == DIMENSION_TAG:
+                return node.get("ref")
+            if node.tag == SHEET_DATA_TAG:
+                break
+    return None
+
+
+class SheetCell:
+    """Cellule minimale exposant row, column et value, comme une cellule openpyxl."""
+    __slots__ = ("row", "column", "value")
+
+    def __init__(self, row, column, value):
+        self.row = row
+        self.column = column
+        self.value = value
+
+
+class SheetView:
+    """
+    Vue en lecture seule d'une feuille décodée, côté formules ou côté valeurs.
+    """
+
+    def __init__(self, sheet_data, data_only):
+        self._data = sheet_data
+        self._index = 1 if data_only else 0
+        self.title = sheet_data.title
+
+    @property
+    def max_row(self):
+        return self._data.max_row
+
+    @property
+    def max_column(self):
+        return self._data.max_column
+
+    def __getitem__(self, row_idx):
+        if not isinstance(row_idx, int):
+            raise TypeError("Seul l'accès par numéro de ligne (ws[ligne]) est pris en charge.")
+        return next(self.iter_rows(min_row=row_idx, max_row=row_idx, min_col=1, max_col=self.max_column))
+
+    def iter_rows(self, min_row=None, max_row=None, min_col=None, max_col=None, values_only=False):
+        if not self._data.rows and not any([min_row, max_row, min_col, max_col]):
+            return iter(())
+        return self._iter_rows(min_row or 1, max_row or self.max_row,
+                               min_col or 1, max_col or self.max_column, values_only)
+
+    def _iter_rows(self, min_row, max_row, min_col, max_col, values_only):
+        idx = self._index
+        columns = range(min_col, max_col + 1)
+        rows = self._data.rows
+        for row_idx in range(min_row, max_row + 1):
+            row_cells = rows.get(row_idx, {})
+            if values_only:
+                yield tuple(row_cells.get(col, _EMPTY)[idx] for col in columns)
+            else:
+                yield tuple(SheetCell(row_idx, col, row_cells.get(col, _EMPTY)[idx]) for col in columns)
+
+
+class _SheetData:
+    """Contenu décodé d'une feuille : {ligne: {colonne: (formule, valeur en cache)}}."""
+
+    def __init__(self, title):
+        self.title = title
+        self.rows = {}
+        self.max_row = 1
+        self.max_column = 1
+
+
+class DualViewWorkbook:
+    """
+    Classeur XLSX lu en une seule passe, feuille par feuille à la demande.
+
+    Usage :
+        wb = DualViewWorkbook(excel_file_bytes)
+        ws_formules = wb.formula_sheet("calcul")
+        ws_valeurs = wb.value_sheet("qt")
+    """
+
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        self._archive = zipfile.ZipFile(source)
+        self._part_names = set(self._archive.namelist())
+        workbook_part = find_workbook_part(self._archive)
+        workbook_dir = posixpath.dirname(workbook_part)
+        workbook_rels = read_rels(self._archive, workbook_part)
+        self._sheet_parts = self._read_sheet_parts(workbook_part, workbook_dir, workbook_rels)
+        self.sheetnames = list(self._sheet_parts)
+
+        self._shared_strings_part = self._styles_part = None
+        for rel_type, target in workbook_rels.values():
+            if rel_type.endswith("/sharedStrings"):
+                self._shared_strings_part = _resolve_target(workbook_dir, target)
+            elif rel_type.endswith("/styles"):
+                self._styles_part = _resolve_target(workbook_dir, target)
+
+        # Chargés à la première utilisation seulement
+        self._shared_strings = None
+        self._date_formats = self._timedelta_formats = None
+        self._sheets = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Ferme l'archive. Les vues déjà obtenues restent utilisables."""
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def formula_sheet(self, name):
+        """Vue de la feuille où les cellules formules renvoient '=...' (data_only=False)."""
+        return SheetView(self._get_sheet(name), data_only=False)
+
+    def value_sheet(self, name):
+        """Vue de la feuille où les cellules formules renvoient la valeur en cache (data_only=True)."""
+        return SheetView(self._get_sheet(name), data_only=True)
+
+    def _get_sheet(self, name):
+        """Décompresse et décode la feuille demandée au premier accès uniquement."""
+        if name not in self._sheets:
+            if name not in self._sheet_parts:
+                raise KeyError(f"Worksheet {name} does not exist.")
+            self._sheets[name] = self._read_sheet(name, self._sheet_parts[name])
+        return self._sheets[name]
+
+    def _get_shared_strings(self):
+        if self._shared_strings is None:
+            self._shared_strings = self._read_shared_strings(self._shared_strings_part)
+        return self._shared_strings
+
+    def _get_date_styles(self):
+        if self._date_formats is None:
+            self._date_formats, self._timedelta_formats = self._read_date_styles(self._styles_part)
+        return self._date_formats, self._timedelta_formats
+
+    # --- Lecture du paquet ---
+
+    def _read_xml(self, part):
+        return fromstring(self._archive.read(part))
+
+    def _read_sheet_parts(self, workbook_part, workbook_dir, workbook_rels):
+        root = self._read_xml(workbook_part)
+        properties = root.find(f"{{{SHEET_MAIN_NS}}}workbookPr")
+        date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        self._epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        sheet_parts = {}
+        for sheet in root.iter(f"{{{SHEET_MAIN_NS}}}sheet"):
+            rel = workbook_rels.get(sheet.get(f"{{{REL_NS}}}id"))
+            if rel and rel[0].endswith("/worksheet"):
+                sheet_parts[sheet.get("name")] = _resolve_target(workbook_dir, rel[1])
+        return sheet_parts
+
+    def _read_shared_strings(self, part):
+        if not part or part not in self._part_names:
+            return []
+        strings = []
+        with self._archive.open(part) as source:
+            for _, node in iterparse(source):
+                if node.tag == SI_TAG:
+                    strings.append(_text_content(node).replace("x005F_", ""))
+                    node.clear()
+        return strings
+
+    def _read_date_styles(self, part):
+        if not part or part not in self._part_names:
+            return set(), set()
+        return read_date_styles(self._read_xml(part))
+
+    # --- Lecture d'une feuille ---
+
+    def _read_sheet(self, name, part):
+        sheet = _SheetData(name)
+        rows = sheet.rows
+        shared_formulae = {}
+        merged_ranges = []
+        row_counter = 0
+        max_row = max_col = 0
+        date_styles = self._get_date_styles()
+
+        sheet_data = None
+        with self._archive.open(part) as source:
+            for event, element in iterparse(source, events=("start", "end")):
+                if event == "start":
+                    if element.tag == SHEET_DATA_TAG:
+                        sheet_data = element
+                    continue
+                if element.tag == ROW_TAG:
+                    r = element.get("r")
+                    row_counter = int(float(r)) if r else row_counter + 1
+                    col_counter = 0
+                    row_cells = {}
+                    for cell in element.iter(CELL_TAG):
+                        coordinate = cell.get("r")
+                        if coordinate:
+                            row_idx, col_counter = coordinate_to_tuple(coordinate)
+                        else:
+                            col_counter += 1
+                            row_idx = row_counter
+                        row_cells[col_counter] = self._parse_cell(cell, coordinate, shared_formulae, date_styles)
+                        max_col = max(max_col, col_counter)
+                    if row_cells:
+                        rows[row_counter] = row_cells
+                        max_row = max(max_row, row_counter)
+                    # Détacher la ligne traitée pour que la mémoire ne dépende pas de la taille de la feuille
+                    element.clear()
+                    if sheet_data is not None:
+                        sheet_data.remove(element)
+                elif element.tag == MERGE_CELL_TAG:
+                    merged_ranges.append(element.get("ref"))
+
+        # openpyxl vide toutes les cellules d'une plage fusionnée sauf celle en haut à gauche
+        for ref in merged_ranges:
+            min_c, min_r, max_c, max_r = range_boundaries(ref)
+            for row_idx in range(min_r, max_r + 1):
+                row_cells = rows.setdefault(row_idx, {})
+                for col_idx in range(min_c, max_c + 1):
+                    if (row_idx, col_idx) != (min_r, min_c):
+                        row_cells[col_idx] = _EMPTY
+            max_row, max_col = max(max_row, max_r), max(max_col, max_c)
+
+        sheet.max_row = max_row or 1
+        sheet.max_column = max_col or 1
+        return sheet
+
+    def _parse_cell(self, element, coordinate, shared_formulae, date_styles):
+        """Décode une cellule <c> et renvoie (valeur vue formules, valeur en cache)."""
+        data_type = element.get("t", "n")
+        style_id = int(element.get("s", 0))
+
+        value = None
+        date_formats, timedelta_formats = date_styles
+        if data_type == "inlineStr":
+            child = element.find(INLINE_STRING_TAG)
+            if child is not None:
+                value = _text_content(child)
+        else:
+            raw = element.findtext(VALUE_TAG) or None
+            if raw is not None:
+                if data_type == "n":
+                    value = _cast_number(raw)
+                    if style_id in date_formats:
+                        try:
+                            value = from_excel(value, self._epoch, timedelta=style_id in timedelta_formats)
+                        except (OverflowError, ValueError):
+                            value = "#VALUE!"
+                elif data_type == "s":
+                    value = self._get_shared_strings()[int(raw)]
+                elif data_type == "b":
+                    value = bool(int(raw))
+                elif data_type == "d":
+                    value = from_ISO8601(raw)
+                else:
+                    value = raw
+
+        formula = element.find(FORMULA_TAG)
+        if formula is None:
+            return (value, value)
+        return (self._parse_formula(formula, coordinate, shared_formulae), value)
+
+    @staticmethod
+    def _parse_formula(formula, coordinate, shared_formulae):
+        formula_type = formula.get("t")
+        text = "="
+        if formula.text is not None:
+            text += formula.text
+
+        if formula_type == "array":
+            return ArrayFormula(ref=formula.get("ref"), text=text)
+        if formula_type == "shared":
+            idx = formula.get("si")
+            if idx in shared_formulae:
+                return shared_formulae[idx].translate_formula(coordinate)
+            if text != "=":
+                shared_formulae[idx] = Translator(text, coordinate)
+        return text
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test différentiel de l'évaluateur vectorisé (EstimBatiment/batch_evaluator) :
+pour chaque formule et chaque table 'qt', BatchQuantities.get doit rendre la
+même quantité, les mêmes erreurs et les mêmes notices DEBUG que evaluate_formula.
+"""
+
+import logging
+import math
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from EstimBatiment.batch_evaluator import BatchQuantities, QtMatrix  # noqa: E402
+from EstimBatiment.calculation_engine import evaluate_formula  # noqa: E402
+from EstimBatiment.data_reader import get_qt_data, get_qt_data_from_mapping  # noqa: E402
+from estim_engine import _load_estimate_sheets, _read_block_data  # noqa: E402
+
+ESTIM_TYPE_PATH = os.path.join(BACKEND_DIR, "EstimBatiment", "EstimType.xlsx")
+
+SYNTHETIC_FORMULAS = [
+    "A[x]*2", "A[x]+A[y]", "A[y]+1", "A[y]/A[y]", "A[x]/A[z]", "A[x]/(A[z]-A[z])", "1/0", "A[x]/0*0",
+    "2,5*A[x]", "(A[x]+1)*(A[z]-3)", "-A[x]", "--A[x]", "((((A[x]))))", "a[X]+A[x]",
+    "MISSING[x]", "A[w]", "A[y]+MISSING[x]", "MISSING[x]+A[y]", "A[w]+MISSING[x]", "A[y]+A[w]",
+    "B[x]", "B[x]*0", "A[y]+B[x]", "C[x]+1",
+    "A[x] ^ 2", "A[x]*", "(A[x]", "A[x])", "*", "2 3",
+    "(" * 3000 + "1" + ")" * 3000,
+    "", "   ", 12, 3.5, None,
+]
+SYNTHETIC_QT_VARIANTS = [
+    {"a": {"x": 2.0, "y": None, "z": 0.0}, "b": {"x": float("inf")}, "c": {"x": "texte"}},
+    {"a": {"x": -4.5, "y": 3.0, "z": 5.0}, "b": {"x": 1.0}},
+    {"a": {"x": 1e308, "w": 1.0, "z": 0.0}, "missing": {"x": None}},
+    {},
+]
+
+
+def _estim_type_case():
+    with open(ESTIM_TYPE_PATH, "rb") as f:
+        sheets_formulas, sheets_values, _, error_message = _load_estimate_sheets(f.read())
+    assert error_message is None
+    block_data = _read_block_data(sheets_formulas, sheets_values)
+    formulas = [row[3] for row in sheets_formulas["calcul"].iter_rows(values_only=True) if len(row) > 3]
+    for name in ("Revetement", "Peinture", "Toiture"):
+        formulas.extend(item.get("formula_or_qty", 0.0) for item in block_data[name])
+    qt_data = get_qt_data(sheets_values["qt"])
+    # Même modèle avec des valeurs retirées ou mises à zéro, pour les cas d'erreur
+    altered = {item: {header: (None if index % 3 == 0 else 0.0 if index % 3 == 1 else value)
+                      for index, (header, value) in enumerate(values.items())}
+               for item, values in list(qt_data.items())[::2]}
+    return formulas, [qt_data, get_qt_data_from_mapping(altered)]
+
+
+def _error_key(error):
+    return (error.kind, error.position, error.formula, error.item_description)
+
+
+def _missing_value_notices(records):
+    return [record.getMessage() for record in records if "Missing value" in record.getMessage()]
+
+
+@pytest.mark.parametrize("case", ["synthetic", "EstimType.xlsx"])
+def test_batch_matches_scalar_evaluation(case, caplog):
+    if case == "synthetic":
+        formulas = SYNTHETIC_FORMULAS
+        tables = [get_qt_data_from_mapping(qt) for qt in SYNTHETIC_QT_VARIANTS]
+    else:
+        formulas, tables = _estim_type_case()
+    assert formulas and any(isinstance(formula, str) and "[" in formula for formula in formulas)
+
+    with caplog.at_level(logging.DEBUG, logger="EstimBatiment"):
+        variants = BatchQuantities.evaluate(formulas, QtMatrix(tables))
+    assert len(variants) == len(tables)
+
+    for table, quantities in zip(tables, variants):
+        for index, formula in enumerate(formulas):
+            description = f"item {index}"
+            scalar_errors, batch_errors = [], []
+            caplog.clear()
+            with caplog.at_level(logging.DEBUG, logger="EstimBatiment"):
+                expected = evaluate_formula(formula, table, description, scalar_errors)
+                scalar_notices = _missing_value_notices(caplog.records)
+                caplog.clear()
+                actual = quantities.get(formula, description, batch_errors)
+                batch_notices = _missing_value_notices(caplog.records)
+
+            if expected is None:
+                assert actual is None, formula
+            else:
+                assert actual is not None and (actual == expected or math.isclose(actual, expected, rel_tol=1e-12)), formula
+            assert [_error_key(error) for error in batch_errors] == [_error_key(error) for error in scalar_errors], formula
+            assert batch_notices == scalar_notices, formula
+            assert all(error.kind != "missing_value" for error in batch_errors)
+
+
+def test_missing_values_are_not_errors():
+    table = get_qt_data_from_mapping({"a": {"x": None}})
+    quantities = BatchQuantities.evaluate(["A[x]+1"], QtMatrix([table]))[0]
+    errors = []
+    assert quantities.get("A[x]+1", "item", errors) == 1.0
+    assert errors == []
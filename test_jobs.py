@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests de la file des jobs (backend/jobs.py) et des routes /jobs : rétention
+des jobs terminés, échec de soumission, court-circuit du cache et codes
+d'erreur de /jobs/<id> et /jobs/<id>/result.
+"""
+
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import job_routes  # noqa: E402
+from app import app  # noqa: E402
+from jobs import DONE, FAILED, JobQueue, JobQueueFull  # noqa: E402
+from result_cache import result_cache  # noqa: E402
+
+WAIT_SECONDS = 10
+
+
+def _produce(data, filename="resultat.xlsx"):
+    return io.BytesIO(data), filename
+
+
+def _fail(message):
+    return None, message
+
+
+def _raise():
+    raise RuntimeError("plantage")
+
+
+def _must_not_run():
+    raise AssertionError("le traitement ne doit pas être lancé")
+
+
+def _wait(queue, job):
+    deadline = time.time() + WAIT_SECONDS
+    while not job.finished:
+        assert time.time() < deadline, "job non terminé"
+        time.sleep(0.01)
+    return queue.get(job.id)
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = JobQueue(executor="thread", max_workers=1, max_pending=2, max_finished=3,
+                     max_result_bytes=1000, ttl_seconds=60)
+    monkeypatch.setattr(job_routes, "job_queue", queue)
+    result_cache.clear()
+    yield queue
+    queue.shutdown()
+    result_cache.clear()
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+# --- Rétention ---
+
+def test_finished_jobs_evicted_by_count(queue):
+    submitted = [_wait(queue, queue.submit("test", _produce, (b"x",))) for _ in range(5)]
+    assert [queue.get(job.id) for job in submitted[:2]] == [None, None]
+    assert all(queue.get(job.id) is job for job in submitted[2:])
+    stats = queue.stats()
+    assert (stats["finished"], stats["evicted"], stats["result_bytes"]) == (3, 2, 3)
+
+
+def test_finished_jobs_evicted_by_result_bytes(queue):
+    first = _wait(queue, queue.submit("test", _produce, (b"a" * 600,)))
+    second = _wait(queue, queue.submit("test", _produce, (b"b" * 600,)))
+    assert queue.get(first.id) is None
+    assert queue.get(second.id) is second
+    assert queue.stats()["result_bytes"] == 600
+    # Le dernier job terminé est gardé même s'il dépasse seul la limite
+    third = _wait(queue, queue.submit("test", _produce, (b"c" * 2000,)))
+    assert queue.get(second.id) is None
+    assert queue.get(third.id) is third
+    assert queue.stats()["result_bytes"] == 2000
+
+
+def test_finished_jobs_expire_after_ttl(queue):
+    old = _wait(queue, queue.submit("test", _produce, (b"old",)))
+    recent = _wait(queue, queue.submit("test", _fail, ("erreur",)))
+    old.finished_at -= queue.ttl_seconds + 1
+    assert queue.get(old.id) is None
+    assert queue.get(recent.id) is recent
+    recent.finished_at -= queue.ttl_seconds + 1
+    with queue._lock:
+        queue._evict_expired()
+    stats = queue.stats()
+    assert (stats["finished"], stats["evicted"], stats["result_bytes"]) == (0, 2, 0)
+
+
+def test_pending_limit_rejects_jobs(queue):
+    release = threading.Event()
+    blocked = [queue.submit("test", release.wait, ()) for _ in range(queue.max_pending)]
+    with pytest.raises(JobQueueFull):
+        queue.submit("test", _produce, (b"x",))
+    assert queue.stats()["rejected"] == 1
+    release.set()
+    for job in blocked:
+        _wait(queue, job)
+
+
+# --- Échec de soumission ---
+
+def test_broken_pool_is_replaced_once(queue, monkeypatch):
+    _wait(queue, queue.submit("test", _produce, (b"x",)))
+    broken_executor = queue._executor
+    submit = queue._submit
+    calls = []
+
+    def submit_once_broken(job, func, args):
+        calls.append(job.id)
+        if len(calls) == 1:
+            raise BrokenProcessPool("processus du pool arrêté")
+        return submit(job, func, args)
+
+    monkeypatch.setattr(queue, "_submit", submit_once_broken)
+    job = _wait(queue, queue.submit("test", _produce, (b"y",)))
+    assert len(calls) == 2
+    assert job.status == DONE and job.result == b"y"
+    assert queue._executor is not None and queue._executor is not broken_executor
+
+
+def test_job_failed_when_submit_fails(queue, monkeypatch):
+    def always_broken(job, func, args):
+        raise BrokenProcessPool("processus du pool arrêté")
+
+    monkeypatch.setattr(queue, "_submit", always_broken)
+    job = queue.submit("test", _produce, (b"x",))
+    assert job.status == FAILED
+    assert job.error.startswith("Erreur serveur critique:")
+    assert job.started_at == job.created_at and job.finished_at is not None
+    stats = queue.stats()
+    assert (stats["failed"], stats["pending"]) == (1, 0)
+
+
+# --- Cache ---
+
+def test_cache_hit_finishes_job_without_running_it(queue, client):
+    key = result_cache.make_key("test-jobs", [b"source"])
+    result_cache.put(key, b"contenu en cache", "cache.xlsx")
+    job = queue.submit("test", _must_not_run, (), key)
+    assert (job.status, job.cache_status, job.result) == (DONE, "HIT", b"contenu en cache")
+    assert job.future is None
+
+    response = client.get(f"/jobs/{job.id}/result")
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.get_data() == b"contenu en cache"
+
+
+def test_successful_job_result_is_cached(queue):
+    key = result_cache.make_key("test-jobs", [b"autre source"])
+    job = _wait(queue, queue.submit("test", _produce, (b"produit",), key))
+    assert job.cache_status == "MISS"
+    assert result_cache.get(key) == (b"produit", "resultat.xlsx")
+
+
+# --- Routes ---
+
+def test_unknown_job_is_404(queue, client):
+    assert client.get("/jobs/inconnu").status_code == 404
+    assert client.get("/jobs/inconnu/result").status_code == 404
+
+
+def test_result_of_unfinished_job_is_409(queue, client):
+    release = threading.Event()
+    job = queue.submit("test", release.wait, ())
+    try:
+        response = client.get(f"/jobs/{job.id}/result")
+        assert response.status_code == 409
+        assert response.get_json()["status"] in ("queued", "running")
+        assert client.get(f"/jobs/{job.id}").status_code == 200
+    finally:
+        release.set()
+        _wait(queue, job)
+
+
+@pytest.mark.parametrize("func, args, error", [
+    (_fail, ("Feuille introuvable",), "Feuille introuvable"),
+    (_raise, (), "Erreur serveur critique: plantage"),
+])
+def test_failed_job_result_is_500(queue, client, func, args, error):
+    job = _wait(queue, queue.submit("test", func, args))
+    status = client.get(f"/jobs/{job.id}")
+    assert status.status_code == 200
+    assert (status.get_json()["status"], status.get_json()["error"]) == (FAILED, error)
+    response = client.get(f"/jobs/{job.id}/result")
+    assert response.status_code == 500
+    assert response.get_json() == {"error": error, "status": FAILED}
+
+
+def test_done_job_status_and_result(queue, client):
+    job = _wait(queue, queue.submit("test", _produce, (b"classeur",)))
+    status = client.get(f"/jobs/{job.id}").get_json()
+    assert (status["status"], status["size"], status["filename"]) == (DONE, 8, "resultat.xlsx")
+    response = client.get(status["result_url"])
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.get_data() == b"classeur"
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de /process-excel-batch : l'archive ZIP est produite après la fin de la
+vue, mais ses journaux (pool compris) gardent l'identifiant de la requête.
+"""
+
+import io
+import json
+import logging
+import os
+import sys
+import zipfile
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import app_logging  # noqa: E402
+import excel_batch  # noqa: E402
+from app import app  # noqa: E402
+from result_cache import result_cache  # noqa: E402
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+REQUEST_ID = "batch-test-0001"
+
+
+class _RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.addFilter(app_logging._ContextFilter())
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _workbook(total):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Bordereau"
+    ws.append(["Désignation", "U", "Qté", "PU", "Montant", "Total"])
+    ws.append(["TOTAL GENERAL", None, None, None, None, total])
+    bio = io.BytesIO()
+    wb.save(bio)
+    return bio.getvalue()
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    result_cache.clear()
+    with app.test_client() as client:
+        yield client
+    result_cache.clear()
+
+
+@pytest.fixture
+def records():
+    handler = _RecordingHandler()
+    root = logging.getLogger()
+    previous_level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    yield handler.records
+    root.removeHandler(handler)
+    root.setLevel(previous_level)
+
+
+def test_batch_logs_keep_request_id(client, records, monkeypatch):
+    monkeypatch.setattr(excel_batch, "BATCH_EXECUTOR", "thread")
+    response = client.post("/process-excel-batch", data={
+        "excel_file": [
+            (io.BytesIO(_workbook(1000)), "Devis1.xlsx", XLSX_MIME),
+            (io.BytesIO(_workbook(2000)), "Devis2.xlsx", XLSX_MIME),
+            (io.BytesIO(b"pas un classeur"), "Casse.xlsx", XLSX_MIME),
+        ],
+        "sheet_names": "Bordereau",
+    }, headers={app_logging.REQUEST_ID_HEADER: REQUEST_ID}, content_type="multipart/form-data")
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.get_data())) as archive:
+        report = json.loads(archive.read(excel_batch.REPORT_NAME))
+    assert (report["processed"], report["failed"]) == (2, 1)
+
+    batch_records = [record for record in records if record.name in ("excel_batch", "utility_routes")]
+    assert {record.name for record in batch_records} == {"excel_batch", "utility_routes"}
+    assert {record.request_id for record in batch_records} == {REQUEST_ID}
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test différentiel de /process-excel : les moteurs de copie 'package' et
+'openpyxl' (EXCEL_COPY_ENGINE) doivent produire le même classeur, y compris
+pour une feuille stylée avec protection, volets figés, filtre automatique,
+mises en forme conditionnelles et validations de données.
+"""
+
+import io
+import os
+import sys
+import zipfile
+
+import openpyxl
+import pytest
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.worksheet.datavalidation import DataValidation
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import utility_routes  # noqa: E402
+from app import app  # noqa: E402
+from result_cache import result_cache  # noqa: E402
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+DROPPED_TAGS = ("<sheetProtection", "<conditionalFormatting", "<dataValidations", "<pane", "<autoFilter")
+
+
+def _source_workbook():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Bordereau"
+    ws.append(["Désignation", "U", "Qté", "PU", "Montant", "Total", "G", "H", "I", "J", "K"])
+    for row in range(2, 12):
+        ws.append([f"Poste {row}", "m3", row, 1000 * row, row * 2, f"=C{row}*D{row}", row, row + 1, row + 2, row + 3, "fin"])
+    ws.append(["TOTAL GENERAL", None, None, None, None, "=SUM(F2:F11)"])
+    ws.append([None])
+    for row in ws.iter_rows(min_row=1, max_row=3):
+        for cell in row:
+            cell.font = Font(bold=True, color="FF0000")
+            cell.fill = PatternFill("solid", fgColor="FFFF00")
+            cell.border = Border(bottom=Side("thin"))
+            cell.alignment = Alignment(horizontal="center", wrap_text=True)
+    ws["D2"].number_format = "#,##0"
+    ws.merge_cells("A13:F13")
+    ws.column_dimensions["A"].width = 40
+    ws.column_dimensions["K"].width = 25
+
+    ws.protection.sheet = True
+    ws.freeze_panes = "B2"
+    ws.auto_filter.ref = "A1:K11"
+    ws.conditional_formatting.add("H2:K11", CellIsRule(operator="greaterThan", formula=["5"], fill=PatternFill("solid", fgColor="00FF00")))
+    validation = DataValidation(type="list", formula1='"m3,m2,u"')
+    validation.add("B2:B11")
+    validation.add("J2:J11")
+    ws.add_data_validation(validation)
+
+    recap = wb.create_sheet("Recap")
+    recap["A1"] = "Total"
+    recap["B1"] = "=Bordereau!F12"
+    bio = io.BytesIO()
+    wb.save(bio)
+    return bio.getvalue()
+
+
+def _process(client, monkeypatch, engine, source):
+    monkeypatch.setattr(utility_routes, "COPY_ENGINE", engine)
+    result_cache.clear()
+    response = client.post("/process-excel", data={
+        "excel_file": (io.BytesIO(source), "source.xlsx", XLSX_MIME),
+        "sheet_names": "Bordereau, Recap",
+    }, content_type="multipart/form-data")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_data()
+
+
+def _snapshot(data):
+    wb = openpyxl.load_workbook(io.BytesIO(data))
+    snapshot = {}
+    for ws in wb:
+        cells = {}
+        for row in ws.iter_rows():
+            for cell in row:
+                style = (repr(cell.font), repr(cell.fill), repr(cell.border), cell.number_format, repr(cell.alignment)) if cell.has_style else None
+                cells[cell.coordinate] = (cell.value, style)
+        snapshot[ws.title] = {
+            "cells": {coordinate: value for coordinate, value in cells.items() if value[0] is not None},
+            "merges": sorted(map(str, ws.merged_cells.ranges)),
+            "widths": {key: dim.width for key, dim in ws.column_dimensions.items() if dim.width not in (None, 13)},
+            "protected": ws.protection.sheet,
+            "freeze_panes": ws.freeze_panes,
+            "auto_filter": ws.auto_filter.ref,
+            "conditional_formatting": [str(rng.sqref) for rng in ws.conditional_formatting],
+            "data_validations": [str(dv.sqref) for dv in ws.data_validations.dataValidation],
+        }
+    return snapshot
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+    result_cache.clear()
+
+
+def test_package_and_openpyxl_engines_match(client, monkeypatch):
+    source = _source_workbook()
+    package_output = _process(client, monkeypatch, "package", source)
+    openpyxl_output = _process(client, monkeypatch, "openpyxl", source)
+
+    package_snapshot = _snapshot(package_output)
+    assert package_snapshot == _snapshot(openpyxl_output)
+    bordereau = package_snapshot["Bordereau_copie"]
+    assert bordereau["protected"] is False
+    assert bordereau["freeze_panes"] is None
+    assert bordereau["auto_filter"] is None
+    assert bordereau["conditional_formatting"] == []
+    assert bordereau["data_validations"] == []
+
+
+def test_package_engine_drops_unshifted_sheet_features(client, monkeypatch):
+    output = _process(client, monkeypatch, "package", _source_workbook())
+    with zipfile.ZipFile(io.BytesIO(output)) as archive:
+        sheets = [archive.read(name).decode("utf-8") for name in archive.namelist() if name.startswith("xl/worksheets/sheet")]
+    assert sheets
+    for xml in sheets:
+        for tag in DROPPED_TAGS:
+            assert tag not in xml
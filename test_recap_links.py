@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cas de réécriture des liens des feuilles récap (backend/recap_links.py).
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from recap_links import RecapLinkRewriter  # noqa: E402
+
+SHEET_NAMES = ["Bordereau_copie", "Gros oeuvre_copie", "Recap_copie", "1Lot_copie"]
+
+
+@pytest.mark.parametrize("formula, expected, rewritten", [
+    ("=Bordereau!F5", "=Bordereau_copie!F5", 1),
+    ("='Bordereau'!F7", "=Bordereau_copie!F7", 1),
+    ("=[1]Bordereau!F3", "=Bordereau_copie!F3", 1),
+    ("='[1]Bordereau'!$F$9", "=Bordereau_copie!$F$9", 1),
+    ("='C:\\dir\\[Devis.xlsx]Gros oeuvre'!F1", "='Gros oeuvre_copie'!F1", 1),
+    ("=bordereau!F5+'Gros oeuvre'!F9*2", "=Bordereau_copie!F5+'Gros oeuvre_copie'!F9*2", 2),
+    ("=SUM(Bordereau!F1:F5)-Recap!F2", "=SUM(Bordereau_copie!F1:F5)-Recap_copie!F2", 2),
+    ("=SUM(Bordereau!F1:Bordereau!F3)", "=SUM(Bordereau_copie!F1:Bordereau_copie!F3)", 2),
+    ("=SUM(Bordereau!$F$1:Bordereau!F3)", "=SUM(Bordereau_copie!$F$1:Bordereau_copie!F3)", 2),
+    ("='1Lot'!A1", "='1Lot_copie'!A1", 1),
+    ('=IF(A1="x!y",Bordereau!F1,"Bordereau!F2")', '=IF(A1="x!y",Bordereau_copie!F1,"Bordereau!F2")', 1),
+    # Références 3D laissées telles quelles
+    ("=SUM(Feuil1:Bordereau!A1)", "=SUM(Feuil1:Bordereau!A1)", 0),
+    ("=SUM('Feuil 1:Bordereau'!A1)", "=SUM('Feuil 1:Bordereau'!A1)", 0),
+    ("=SUM([1]Feuil1:Feuil3!A1)+Bordereau!A1", "=SUM([1]Feuil1:Feuil3!A1)+Bordereau_copie!A1", 1),
+    ("=SUM(A1:A2)", "=SUM(A1:A2)", 0),
+    ("=Bordereau_copie!F1", "=Bordereau_copie!F1", 0),
+])
+def test_rewrite_formula(formula, expected, rewritten):
+    missing = set()
+    assert RecapLinkRewriter(SHEET_NAMES).rewrite_formula(formula, missing) == (expected, rewritten)
+    assert missing == set()
+
+
+def test_missing_targets_are_reported():
+    missing = set()
+    formula, rewritten = RecapLinkRewriter(SHEET_NAMES).rewrite_formula("=Autre!A1+Bordereau!A2", missing)
+    assert (formula, rewritten) == ("=Autre!A1+Bordereau_copie!A2", 1)
+    assert missing == {"Autre"}
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests du cache des résultats (backend/result_cache.py) : LRU mémoire, clé
+versionnée, expiration et limite de taille du niveau disque.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import result_cache as result_cache_module  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+
+
+def _disk_files(directory):
+    return sorted(os.listdir(directory))
+
+
+def _age(cache, key, seconds):
+    """Recule la date d'écriture d'une entrée disque."""
+    for path in cache._disk_paths(key):
+        mtime = os.path.getmtime(path) - seconds
+        os.utime(path, (mtime, mtime))
+
+
+def test_memory_lru_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2, max_bytes=10)
+    cache.put("a", b"1234", "a.xlsx")
+    cache.put("b", b"1234", "b.xlsx")
+    assert cache.get("a") == (b"1234", "a.xlsx") # 'a' devient la plus récente
+    cache.put("c", b"1234", "c.xlsx")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+    cache.put("d", b"12345678", "d.xlsx") # 12 octets au total : 'a' et 'c' partent
+    assert [cache.get(key) for key in ("a", "c")] == [None, None]
+    cache.put("e", b"x" * 11, "e.xlsx") # Trop gros pour la mémoire
+    assert cache.get("e") is None and cache.get("d") is not None
+    stats = cache.stats()
+    assert (stats["memory_entries"], stats["memory_bytes"], stats["evictions"]) == (1, 8, 3)
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResultCache(max_entries=0, disk_dir=str(tmp_path))
+    cache.put("a", b"data", "a.xlsx")
+    assert cache.get("a") is None
+    assert _disk_files(tmp_path) == []
+
+
+def test_key_depends_on_version_payload_split_and_params(monkeypatch):
+    key = ResultCache.make_key("process-excel", [b"ab", b"c"], {"sheet_names": ["A"]})
+    assert key == ResultCache.make_key("process-excel", [b"ab", b"c"], {"sheet_names": ["A"]})
+    assert key != ResultCache.make_key("process-excel", [b"a", b"bc"], {"sheet_names": ["A"]})
+    assert key != ResultCache.make_key("process-excel", [b"ab", b"c"], {"sheet_names": ["B"]})
+    assert key != ResultCache.make_key("estim-batiment", [b"ab", b"c"], {"sheet_names": ["A"]})
+    monkeypatch.setattr(result_cache_module, "CACHE_KEY_VERSION", result_cache_module.CACHE_KEY_VERSION + 1)
+    assert key != ResultCache.make_key("process-excel", [b"ab", b"c"], {"sheet_names": ["A"]})
+
+
+def test_disk_round_trip(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path))
+    cache.put("cle", b"contenu", "Résultat.xlsx")
+    assert _disk_files(tmp_path) == ["cle.bin", "cle.json"]
+
+    restarted = ResultCache(disk_dir=str(tmp_path)) # Mémoire vide, comme après un redémarrage
+    assert restarted.get("cle") == (b"contenu", "Résultat.xlsx")
+    assert restarted.get("cle") == (b"contenu", "Résultat.xlsx")
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_disk_entry_expires_after_ttl(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), ttl_seconds=60)
+    cache.put("ancienne", b"1", "a.xlsx")
+    _age(cache, "ancienne", 120)
+    cache.clear()
+    assert cache.get("ancienne") is None
+    assert _disk_files(tmp_path) == []
+    assert cache.stats()["expired"] == 1
+
+
+def test_disk_sweep_removes_expired_entries_and_stale_temp_files(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), ttl_seconds=60, disk_sweep_interval=0)
+    cache.put("ancienne", b"1", "a.xlsx")
+    _age(cache, "ancienne", 120)
+    stale_tmp = tmp_path / "abandon.tmp"
+    stale_tmp.write_bytes(b"partiel")
+    os.utime(stale_tmp, (time.time() - 120, time.time() - 120))
+    cache.put("recente", b"2", "r.xlsx")
+    assert _disk_files(tmp_path) == ["recente.bin", "recente.json"]
+    assert cache.stats()["expired"] == 1
+
+
+def test_disk_sweep_is_throttled(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), ttl_seconds=60)
+    cache.put("premiere", b"1", "a.xlsx") # Premier enregistrement : parcours du répertoire
+    _age(cache, "premiere", 120)
+    cache.put("seconde", b"2", "b.xlsx") # Intervalle non écoulé : pas de parcours
+    assert "premiere.json" in _disk_files(tmp_path)
+    cache._last_disk_sweep -= cache.disk_sweep_interval
+    cache.put("troisieme", b"3", "c.xlsx")
+    assert "premiere.json" not in _disk_files(tmp_path)
+
+
+def test_disk_size_limit_evicts_oldest_entries(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), disk_max_bytes=300)
+    for index, key in enumerate(("k1", "k2", "k3")):
+        cache.put(key, bytes(60), f"{key}.xlsx")
+        _age(cache, key, 30 - index) # Dates d'écriture distinctes
+    assert cache.stats()["disk_evictions"] == 0
+    cache.put("k4", bytes(60), "k4.xlsx") # Dépasse la limite : parcours immédiat
+    assert _disk_files(tmp_path) == ["k2.bin", "k2.json", "k3.bin", "k3.json", "k4.bin", "k4.json"]
+    stats = cache.stats()
+    assert stats["disk_evictions"] == 1
+    assert 0 < stats["disk_bytes"] <= 300 * result_cache_module.DISK_SWEEP_TARGET
+
+    cache.put("enorme", bytes(400), "enorme.xlsx") # Plus grand que la limite : mémoire seulement
+    assert "enorme.json" not in _disk_files(tmp_path)
+    assert cache.get("enorme") == (bytes(400), "enorme.xlsx")
+
+
+def test_failed_disk_write_leaves_no_files(tmp_path, monkeypatch):
+    cache = ResultCache(disk_dir=str(tmp_path))
+    replace = os.replace
+
+    def fail_on_meta(src, dst):
+        if dst.endswith(".json"):
+            raise OSError("disque plein")
+        replace(src, dst)
+
+    monkeypatch.setattr(result_cache_module.os, "replace", fail_on_meta)
+    cache.put("cle", b"contenu", "a.xlsx")
+    assert _disk_files(tmp_path) == []
+    assert cache.get("cle") == (b"contenu", "a.xlsx") # Toujours servie par la mémoire
+
+
+@pytest.mark.parametrize("variable, attribute, value", [
+    ("RESULT_CACHE_DISK_MAX_BYTES", "disk_max_bytes", 1234),
+    ("RESULT_CACHE_TTL", "ttl_seconds", 42),
+])
+def test_from_env(monkeypatch, variable, attribute, value):
+    monkeypatch.setenv(variable, str(value))
+    assert getattr(ResultCache.from_env(), attribute) == value